@@ -0,0 +1,179 @@
+import os
+import time
+import random
+import sqlite3
+import argparse
+
+from database_manager import DatabaseManager
+from knowledge_graph import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
+from hypothesis_generator import HypothesisGenerator
+
+# Benchmarks for the system's performance-sensitive parts.
+# Each benchmark builds its own synthetic data so it can be
+# run without the real concept database or image sets.
+
+# ===== DATABASE =====
+
+# Make a synthetic concept database with the given number of
+# predicates spread over the given number of concepts.
+# Does nothing if the database file already exists.
+def make_synthetic_concept_database(db_path, predicate_count, concept_count):
+    if os.path.exists(db_path):
+        print("Using existing synthetic database " + db_path)
+        return
+    print("Building synthetic database with " + str(predicate_count) +
+          " predicates over " + str(concept_count) + " concepts")
+    relationships = ['IsA', 'PartOf', 'HasA', 'Causes', 'UsedFor',
+                     'CapableOf', 'AtLocation', 'Desires']
+    rng = random.Random(5)
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE concepts (name TEXT, queried INTEGER)")
+    cursor.execute("CREATE TABLE predicates (name TEXT, source TEXT, " +
+                   "relationship TEXT, target TEXT, weight REAL)")
+    cursor.executemany("INSERT INTO concepts VALUES (?, ?)",
+                       (('concept_' + str(i), 1) for i in range(concept_count)))
+    def predicate_rows():
+        for i in range(predicate_count):
+            source = 'concept_' + str(rng.randrange(concept_count))
+            target = 'concept_' + str(rng.randrange(concept_count))
+            yield (source, source, rng.choice(relationships), target, rng.random())
+    cursor.executemany("INSERT INTO predicates VALUES (?, ?, ?, ?, ?)",
+                       predicate_rows())
+    # Index the lookup columns so the benchmark measures statement
+    # preparation rather than full table scans.
+    cursor.execute("CREATE INDEX idx_predicates_source ON predicates (source)")
+    cursor.execute("CREATE INDEX idx_predicates_target ON predicates (target)")
+    cursor.execute("CREATE INDEX idx_concepts_name ON concepts (name)")
+    connection.commit()
+    connection.close()
+# end make_synthetic_concept_database
+
+# Compare the per-query latency of predicate lookups built by string
+# concatenation (every query is new text sqlite has to parse) with the
+# parameterized, cached statements of the DatabaseManager query API.
+def benchmark_select_queries(db_path, predicate_count, concept_count, query_count):
+    make_synthetic_concept_database(db_path, predicate_count, concept_count)
+    rng = random.Random(7)
+    names = ['concept_' + str(rng.randrange(concept_count))
+             for i in range(query_count)]
+
+    # String-built SQL, the way select_row used to build it.
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    start_time = time.perf_counter()
+    for name in names:
+        cursor.execute("SELECT name, source, relationship, target, weight" +
+                       " FROM predicates WHERE source = '" + name + "';")
+        cursor.fetchall()
+    string_built_time = time.perf_counter() - start_time
+    connection.close()
+
+    # One parameterized, cached statement per name.
+    database_manager = DatabaseManager(db_path, use_pool=True, pool_size=1)
+    start_time = time.perf_counter()
+    database_manager.select_many('predicates', ['source'],
+                                 [(name,) for name in names])
+    parameterized_time = time.perf_counter() - start_time
+
+    # Chunked IN (...) lookups through the query API.
+    start_time = time.perf_counter()
+    database_manager.select_predicates_by_source(names)
+    batched_time = time.perf_counter() - start_time
+    database_manager.close_all_connections()
+
+    print("Predicate lookups by source, " + str(query_count) + " queries:")
+    print("  string-built SQL: " +
+          str(round(string_built_time / query_count * 1e6, 2)) + " us/query")
+    print("  parameterized:    " +
+          str(round(parameterized_time / query_count * 1e6, 2)) + " us/query")
+    print("  batched IN lists: " +
+          str(round(batched_time / query_count * 1e6, 2)) + " us/name")
+# end benchmark_select_queries
+
+# ===== END DATABASE =====
+
+# ===== HYPOTHESIS GENERATION =====
+
+# Make a synthetic knowledge graph of object nodes, each with an
+# 'is_concept' edge to one of the given number of concept nodes.
+def make_synthetic_knowledge_graph(object_count, concept_count):
+    rng = random.Random(11)
+    knowledge_graph = KnowledgeGraph()
+    concept_nodes = list()
+    for i in range(concept_count):
+        concept_node = KnowledgeGraphNode('concept_' + str(i), len(knowledge_graph.nodes),
+                                          'concept_' + str(i), 'concept',
+                                          None, 1, None, True)
+        knowledge_graph.nodes[concept_node.node_id] = concept_node
+        concept_nodes.append(concept_node)
+    # end for
+    for i in range(object_count):
+        object_node = KnowledgeGraphNode('object_' + str(i), len(knowledge_graph.nodes),
+                                         'object_' + str(i), 'object',
+                                         str(i % 3), 1, [0, 0, 1, 1], True)
+        knowledge_graph.nodes[object_node.node_id] = object_node
+        object_node.add_edge(KnowledgeGraphEdge(object_node, 'is_concept',
+                                                rng.choice(concept_nodes)))
+    # end for
+    return knowledge_graph
+# end make_synthetic_knowledge_graph
+
+# Compare the referential first pass checking every pair of nodes
+# with the first pass using the is_concept index.
+def benchmark_referential_first_pass(object_count, concept_count):
+    knowledge_graph = make_synthetic_knowledge_graph(object_count, concept_count)
+
+    generator = HypothesisGenerator(None)
+    start_time = time.perf_counter()
+    pairwise_hypotheses = generator.referential_hypothesis_first_pass_pairwise(knowledge_graph)
+    pairwise_time = time.perf_counter() - start_time
+
+    generator = HypothesisGenerator(None)
+    start_time = time.perf_counter()
+    indexed_hypotheses = generator.referential_hypothesis_first_pass(knowledge_graph)
+    indexed_time = time.perf_counter() - start_time
+
+    # Both should make exactly the same hypotheses.
+    def describe(hypotheses):
+        return [(h.hypothesis_id, h.source_node.node_id, h.target_node.node_id)
+                for h in hypotheses]
+    same_output = describe(pairwise_hypotheses) == describe(indexed_hypotheses)
+
+    print("Referential first pass, " + str(object_count) + " objects, " +
+          str(len(indexed_hypotheses)) + " hypotheses:")
+    print("  every pair:    " + str(round(pairwise_time, 3)) + " s")
+    print("  concept index: " + str(round(indexed_time, 3)) + " s")
+    print("  same output:   " + str(same_output))
+# end benchmark_referential_first_pass
+
+# ===== END HYPOTHESIS GENERATION =====
+
+def main():
+    parser = argparse.ArgumentParser()
+    # Which benchmark to run.
+    parser.add_argument('benchmark', choices=['select_queries',
+                                              'referential_first_pass'])
+    # Where to build (or find) the synthetic database.
+    parser.add_argument('--db_path', default='benchmark_concept_data.db')
+    parser.add_argument('--predicate_count', type=int, default=1000000)
+    parser.add_argument('--concept_count', type=int, default=100000)
+    parser.add_argument('--query_count', type=int, default=20000)
+    # The size of the synthetic knowledge graph for the
+    # hypothesis generation benchmarks.
+    parser.add_argument('--object_count', type=int, default=5000)
+    parser.add_argument('--kg_concept_count', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.benchmark == 'select_queries':
+        benchmark_select_queries(args.db_path,
+                                 args.predicate_count,
+                                 args.concept_count,
+                                 args.query_count)
+    elif args.benchmark == 'referential_first_pass':
+        benchmark_referential_first_pass(args.object_count,
+                                         args.kg_concept_count)
+# end main
+
+if __name__ == '__main__':
+    main()
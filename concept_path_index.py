@@ -0,0 +1,144 @@
+from constants import Constants as const
+
+# An index of the shortest concept paths out of each concept node,
+# up to a maximum length.
+# For each source concept node, a breadth-first search truncated at
+# the maximum length is run once and its search tree is kept, so
+# every path query from that source afterwards is a lookup.
+# The knowledge graph's concept edges must not change once a search
+# tree has been built from them.
+class ConceptPathIndex:
+    # The search trees, keyed by a tuple of:
+    #   the source node's ID,
+    #   the coherence type whose relationships paths can follow,
+    #   the most concept edges a path can have, or -1 for no limit.
+    # Each search tree is a dictionary keyed by the ID of each node
+    # reachable from the source, whose value is the edge the search
+    # first reached it by, or None for the source node itself.
+    search_trees = dict()
+
+    # Statistics on how much the index is used.
+    trees_built = 0
+    lookups = 0
+
+    def __init__(self):
+        self.search_trees = dict()
+        self.trees_built = 0
+        self.lookups = 0
+    # end __init__
+
+    # Build the search trees out of the concept node of every scene
+    # graph node in the given knowledge graph.
+    def build(self, kg_in, coherence_type, max_path_length=-1):
+        for kg_node in kg_in.nodes.values():
+            is_concept_edge = kg_node.get_first_edge('is_concept')
+            if is_concept_edge == None:
+                continue
+            self.get_search_tree(is_concept_edge.target_node,
+                                 coherence_type,
+                                 max_path_length)
+        # end for
+        print("Built concept path index with " + str(self.trees_built) + " search trees")
+    # end build
+
+    # Get the search tree out of a source node, building it if it
+    # hasn't been built yet.
+    def get_search_tree(self, source_node, coherence_type, max_path_length=-1):
+        max_cn_edge_count = get_max_cn_edge_count(max_path_length)
+        key = (source_node.node_id, coherence_type, max_cn_edge_count)
+        if not key in self.search_trees:
+            self.search_trees[key] = self.make_search_tree(source_node,
+                                                           coherence_type,
+                                                           max_cn_edge_count)
+            self.trees_built += 1
+        return self.search_trees[key]
+    # end get_search_tree
+
+    # Run a breadth-first search out of the source node along concept
+    # edges, going through each node's edges in order and stopping
+    # max_cn_edge_count edges away from the source.
+    # Each node keeps the first edge it was reached by, so the path
+    # back through the tree to any node is, of all the shortest paths
+    # to it, the one that comes first in edge order.
+    def make_search_tree(self, source_node, coherence_type, max_cn_edge_count):
+        search_tree = dict()
+        search_tree[source_node.node_id] = None
+        current_level = [source_node]
+        distance = 0
+        while (len(current_level) > 0
+               and (max_cn_edge_count == -1 or distance < max_cn_edge_count)):
+            next_level = list()
+            for current_node in current_level:
+                for next_edge in current_node.edges:
+                    next_node = next_edge.target_node
+                    if (next_node.node_id in search_tree
+                        or not is_concept_path_edge(next_edge, coherence_type)):
+                        continue
+                    search_tree[next_node.node_id] = next_edge
+                    next_level.append(next_node)
+                # end for
+            # end for
+            current_level = next_level
+            distance += 1
+        # end while
+        return search_tree
+    # end make_search_tree
+
+    # Whether concept_node_2 can be reached from the source node
+    # within the maximum path length.
+    def is_reachable(self, source_node, concept_node_2,
+                     coherence_type, max_path_length=-1):
+        search_tree = self.get_search_tree(source_node, coherence_type, max_path_length)
+        return concept_node_2.node_id in search_tree
+    # end is_reachable
+
+    # Get the shortest concept path from the initial edge's target
+    # to concept_node_2, in the same form as
+    # HypothesisGenerator.concept_path_loop: the initial edge, then
+    # the concept edges, then the terminating edge, if there is one.
+    # Returns an empty list if there is no path.
+    def get_path(self, initial_edge, terminating_edge, concept_node_2,
+                 coherence_type, max_path_length=-1):
+        self.lookups += 1
+        concept_path = list()
+        search_tree = self.get_search_tree(initial_edge.target_node,
+                                           coherence_type,
+                                           max_path_length)
+        if not concept_node_2.node_id in search_tree:
+            return concept_path
+        # Walk back through the tree from concept_node_2 to the source.
+        concept_edges = list()
+        tree_edge = search_tree[concept_node_2.node_id]
+        while not tree_edge == None:
+            concept_edges.append(tree_edge)
+            tree_edge = search_tree[tree_edge.source_node.node_id]
+        # end while
+        concept_edges.reverse()
+
+        concept_path.append(initial_edge)
+        concept_path.extend(concept_edges)
+        if not terminating_edge == None:
+            concept_path.append(terminating_edge)
+        return concept_path
+    # end get_path
+# end class ConceptPathIndex
+
+# Get the most concept edges a path of the given length can have,
+# or -1 if there is no limit.
+# The path's length includes its initial edge, so it can have at
+# most one fewer concept edge.
+def get_max_cn_edge_count(max_path_length):
+    if int(max_path_length) == -1:
+        return -1
+    return int(max_path_length) - 1
+# end get_max_cn_edge_count
+
+# Whether a concept path can go through an edge. It has to be a
+# concept edge and, if a coherence type is given, its relationship
+# has to be one of the coherence type's relationships.
+def is_concept_path_edge(edge, coherence_type):
+    if not edge.cn_edge:
+        return False
+    return (coherence_type == ""
+            or edge.relationship in const.coherence_to_cn_rel[coherence_type])
+# end is_concept_path_edge
@@ -0,0 +1,290 @@
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# A token bucket rate limiter for asyncio tasks.
+# The bucket holds up to capacity tokens and refills at a steady
+# rate. Each request takes one token, waiting for the bucket to
+# refill if it is empty.
+class TokenBucket:
+    # How many tokens the bucket gains per second.
+    rate = 2.0
+    # The most tokens the bucket can hold.
+    capacity = 1.0
+    # How many tokens the bucket holds right now.
+    tokens = 1.0
+    # When the bucket was last refilled, from time.monotonic.
+    last_refill_time = 0
+
+    def __init__(self, requests_per_minute=120, capacity=None):
+        self.rate = requests_per_minute / 60.0
+        # By default, allow a burst of up to a tenth of a minute's
+        # requests.
+        if capacity == None:
+            capacity = max(1.0, requests_per_minute / 10.0)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill_time = time.monotonic()
+        # Made by reset_lock, so it belongs to the running loop.
+        self.lock = None
+    # end __init__
+
+    # Make a new lock for the running event loop.
+    # An asyncio lock can only be used from the loop it was first
+    # used in, so this has to be called at the start of each run of
+    # an event loop that uses the bucket. The tokens carry over.
+    def reset_lock(self):
+        self.lock = asyncio.Lock()
+    # end reset_lock
+
+    # Add the tokens earned since the last refill.
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_refill_time) * self.rate)
+        self.last_refill_time = now
+    # end refill
+
+    # Wait until there is a token, then take it.
+    async def acquire(self):
+        if self.lock == None:
+            self.reset_lock()
+        # Take tokens one waiter at a time so they are handed out
+        # in the order they were asked for.
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            # end while
+            self.tokens -= 1
+        # end async with
+    # end acquire
+# end class TokenBucket
+
+
+# Fetches many concepts' edges from the ConceptNet API at once and
+# stores them in the concepts database.
+# Requests for every concept and relationship run concurrently on a
+# pool of threads, each with its own HTTP session, and are paced by a
+# token bucket so they stay within the API's rate limit. Failed
+# requests are retried after the wait the API asks for in its
+# Retry-After header, or with exponential backoff if it doesn't
+# ask for one.
+class ConceptNetFetcher:
+    # The querier whose database, api url, and URI parsing to use.
+    querier = None
+
+    # The shared rate limiter.
+    token_bucket = None
+
+    # The most requests in flight at once.
+    max_concurrency = 8
+    # How many times to retry a failed request.
+    max_retries = 5
+    # Seconds to wait before the first retry. Each retry after
+    # waits twice as long as the one before.
+    base_backoff = 1.0
+
+    # Count the total number of requests made.
+    request_count = 0
+
+    def __init__(self, querier_in, requests_per_minute=120,
+                 max_concurrency=8, max_retries=5, base_backoff=1.0):
+        self.querier = querier_in
+        self.token_bucket = TokenBucket(requests_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.request_count = 0
+        # Each thread's HTTP session. requests doesn't promise a
+        # session is safe to share between threads.
+        self.thread_sessions = threading.local()
+        # Every session made, so they can be closed after each run.
+        self.sessions = list()
+        self.sessions_lock = threading.Lock()
+    # end __init__
+
+    # Get the HTTP session for the current thread, making one if it
+    # doesn't have one yet.
+    def get_session(self):
+        session = getattr(self.thread_sessions, 'session', None)
+        if session == None:
+            session = requests.Session()
+            self.thread_sessions.session = session
+            with self.sessions_lock:
+                self.sessions.append(session)
+        # end if
+        return session
+    # end get_session
+
+    # Send a GET request with the current thread's session.
+    def get(self, query_uri):
+        return self.get_session().get(query_uri)
+    # end get
+
+    # Close every session made so far.
+    def close_sessions(self):
+        with self.sessions_lock:
+            for session in self.sessions:
+                session.close()
+            # end for
+            self.sessions = list()
+        # end with
+        self.thread_sessions = threading.local()
+    # end close_sessions
+
+    # Fetch the edges of each of the given concepts for every valid
+    # relationship and store them in the database.
+    # Concepts whose requests all succeeded are marked as queried.
+    # Returns the list of concepts that could not be fetched.
+    def fetch_concepts(self, concept_words):
+        concept_words = list(dict.fromkeys([self.querier.CleanWord(concept_word)
+                                            for concept_word in concept_words]))
+        if len(concept_words) == 0:
+            return list()
+        print("Fetching " + str(len(concept_words)) + " concepts from ConceptNet")
+        start_time = time.perf_counter()
+        edges_by_concept = asyncio.run(self.fetch_all(concept_words))
+        failed_words = list()
+        for concept_word in concept_words:
+            edges = edges_by_concept[concept_word]
+            if edges == None:
+                failed_words.append(concept_word)
+                continue
+            self.store_edges(concept_word, edges)
+        # end for
+        print("Fetched " + str(len(concept_words) - len(failed_words)) + " concepts with " +
+              str(self.request_count) + " total requests in " +
+              str(round(time.perf_counter() - start_time, 1)) + "s")
+        if len(failed_words) > 0:
+            print("Could not fetch concepts: " + str(failed_words))
+        return failed_words
+    # end fetch_concepts
+
+    # Fetch every concept's edges concurrently.
+    # Returns a dictionary keyed by concept word whose values are
+    # lists of edges, or None for concepts with a failed request.
+    async def fetch_all(self, concept_words):
+        # Each fetch runs its own event loop, so the token bucket
+        # needs a lock for this one.
+        self.token_bucket.reset_lock()
+        # Requests are blocking, so run them on a pool of threads.
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            results = await asyncio.gather(*[self.fetch_concept(concept_word, executor)
+                                             for concept_word in concept_words])
+        finally:
+            executor.shutdown(wait=True)
+            # The pool's threads are gone, so are their sessions.
+            self.close_sessions()
+        return dict(zip(concept_words, results))
+    # end fetch_all
+
+    # Fetch one concept's edges for every valid relationship.
+    # Returns the list of edges, or None if any request failed.
+    async def fetch_concept(self, concept_word, executor):
+        results = await asyncio.gather(*[self.fetch_relationship(concept_word,
+                                                                 relationship,
+                                                                 executor)
+                                         for relationship
+                                         in self.querier.valid_relationships])
+        edges = list()
+        for result in results:
+            if result == None:
+                return None
+            edges.extend(result)
+        # end for
+        return edges
+    # end fetch_concept
+
+    # Fetch one concept's edges for one relationship, retrying if the
+    # request fails or is throttled. Waits as long as the response's
+    # Retry-After header says to, if it has one, and otherwise
+    # exponentially longer each try.
+    # Returns the list of edges, or None if every try failed.
+    async def fetch_relationship(self, concept_word, relationship, executor):
+        query_uri = (self.querier.api_url +
+                     'node=' + self.querier.ParseToURI('c', 'en', concept_word) +
+                     '&rel=/r/' + relationship)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            await self.token_bucket.acquire()
+            self.request_count += 1
+            error_text = ""
+            retry_after = None
+            try:
+                response = await loop.run_in_executor(executor, self.get, query_uri)
+                # Throttled or server error; try again.
+                if response.status_code == 429 or response.status_code >= 500:
+                    error_text = "status " + str(response.status_code)
+                    retry_after = self.parse_retry_after(response.headers.get('Retry-After'))
+                else:
+                    response.raise_for_status()
+                    return response.json()['edges']
+            except (requests.RequestException, ValueError, KeyError) as e:
+                error_text = str(e)
+            # end try
+            if attempt == self.max_retries:
+                break
+            if not retry_after == None:
+                backoff = retry_after
+            else:
+                # Wait exponentially longer each try, with some jitter
+                # so retries don't all land at once.
+                backoff = self.base_backoff * (2 ** attempt) * (1 + random.random() * 0.1)
+            print("Error querying " + query_uri + ": " + error_text +
+                  ". Retrying in " + str(round(backoff, 2)) + " seconds")
+            await asyncio.sleep(backoff)
+        # end for
+        print("Giving up on " + query_uri)
+        return None
+    # end fetch_relationship
+
+    # Parse a Retry-After header, which is either a number of seconds
+    # or an HTTP date.
+    # Returns the number of seconds to wait, or None if there is no
+    # header or it can't be parsed.
+    def parse_retry_after(self, header_value):
+        if header_value == None:
+            return None
+        header_value = header_value.strip()
+        if header_value.isdigit():
+            return float(header_value)
+        try:
+            retry_time = parsedate_to_datetime(header_value)
+        except (TypeError, ValueError):
+            return None
+        if retry_time == None:
+            return None
+        return max(0.0, retry_time.timestamp() - time.time())
+    # end parse_retry_after
+
+    # Store a fetched concept's edges and mark it as queried, all
+    # in one transaction.
+    def store_edges(self, concept_word, edges):
+        database_manager = self.querier.database_manager
+        predicate_rows = list()
+        other_concepts = list()
+        for edge in edges:
+            predicate_row = self.querier.MakePredicateRow(edge, concept_word)
+            if predicate_row == None:
+                continue
+            predicate_rows.append(predicate_row)
+            for other_concept in [predicate_row[1], predicate_row[3]]:
+                if not other_concept == concept_word:
+                    other_concepts.append(other_concept)
+            # end for
+        # end for
+        with database_manager.transaction():
+            database_manager.insert_concepts_if_missing(list(dict.fromkeys(other_concepts)), 0)
+            database_manager.insert_predicates_if_missing(predicate_rows)
+            database_manager.insert_concepts_if_missing([concept_word], 1)
+        # end with
+    # end store_edges
+# end class ConceptNetFetcher
@@ -0,0 +1,139 @@
+import gzip
+import json
+import time
+import argparse
+
+from database_manager import DatabaseManager
+from external_knowledge_querier import ExternalKnowledgeQuerier
+from constants import Constants as const
+
+# Loads a ConceptNet assertions dump into the concepts database, so
+# that runs can use ConceptNet without querying its API.
+# The dump is the gzipped, tab-separated csv ConceptNet publishes,
+# e.g. conceptnet-assertions-5.7.0.csv.gz, with one assertion per line:
+#   assertion uri, relationship uri, start uri, end uri, json info
+class ConceptNetImporter:
+    # The database manager to load the assertions into.
+    database_manager = None
+
+    # A querier, for parsing ConceptNet URIs and cleaning words
+    # the same way queried edges are.
+    querier = None
+
+    # The relationships to keep, as they appear in relationship URIs.
+    valid_relationships = set()
+
+    # How many assertions to insert per transaction.
+    batch_size = 100000
+
+    def __init__(self, database_manager_in=None, batch_size=100000):
+        if database_manager_in == None:
+            self.database_manager = DatabaseManager()
+        else:
+            self.database_manager = database_manager_in
+        self.querier = ExternalKnowledgeQuerier(self.database_manager)
+        self.batch_size = batch_size
+        # Keep every relationship some coherence element maps to.
+        self.valid_relationships = set()
+        for coherence, cn_rel_list in const.coherence_to_cn_rel.items():
+            self.valid_relationships.update(cn_rel_list)
+        # end for
+    # end __init__
+
+    # Stream the assertions dump at the given path into the database.
+    # Only assertions between two English concepts with one of the
+    # valid relationships are kept. Every concept found is marked as
+    # queried.
+    # Returns the number of assertions kept.
+    def import_assertions(self, dump_path):
+        self.database_manager.ensure_schema()
+        start_time = time.perf_counter()
+        line_count = 0
+        kept_count = 0
+        predicate_rows = list()
+        with gzip.open(dump_path, 'rt', encoding='utf-8') as dump_file:
+            for line in dump_file:
+                line_count += 1
+                predicate_row = self.parse_assertion(line)
+                if predicate_row == None:
+                    continue
+                predicate_rows.append(predicate_row)
+                if len(predicate_rows) >= self.batch_size:
+                    self.insert_batch(predicate_rows)
+                    kept_count += len(predicate_rows)
+                    predicate_rows = list()
+                    print("Read " + str(line_count) + " assertions, kept " +
+                          str(kept_count) + " (" +
+                          str(round(time.perf_counter() - start_time, 1)) + "s)")
+                # end if
+            # end for
+        # end with
+        if len(predicate_rows) > 0:
+            self.insert_batch(predicate_rows)
+            kept_count += len(predicate_rows)
+        # end if
+        print("Done. Read " + str(line_count) + " assertions, kept " +
+              str(kept_count) + " (" +
+              str(round(time.perf_counter() - start_time, 1)) + "s)")
+        return kept_count
+    # end import_assertions
+
+    # Parse a line of the assertions dump into a predicates table row,
+    # (name, source, relationship, target, weight), with the source
+    # concept as the name.
+    # Returns None if the assertion should not be kept.
+    def parse_assertion(self, line):
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 5:
+            return None
+        relationship_uri = fields[1]
+        start_uri = fields[2]
+        end_uri = fields[3]
+        # Check the cheap things before parsing anything.
+        if not (start_uri.startswith('/c/en/') and
+                end_uri.startswith('/c/en/')):
+            return None
+        relationship = self.querier.ParseFromURI(relationship_uri)['word']
+        if not relationship in self.valid_relationships:
+            return None
+        source = self.querier.CleanWord(self.querier.ParseFromURI(start_uri)['word'])
+        target = self.querier.CleanWord(self.querier.ParseFromURI(end_uri)['word'])
+        weight = json.loads(fields[4]).get('weight', 1.0)
+        return (source, source, relationship, target, weight)
+    # end parse_assertion
+
+    # Insert a batch of predicate rows and their concepts in
+    # one transaction.
+    def insert_batch(self, predicate_rows):
+        concept_names = list()
+        for predicate_row in predicate_rows:
+            concept_names.append(predicate_row[1])
+            concept_names.append(predicate_row[3])
+        # end for
+        concept_names = list(dict.fromkeys(concept_names))
+        with self.database_manager.transaction():
+            self.database_manager.insert_concepts_if_missing(concept_names, 1)
+            self.database_manager.insert_predicates_if_missing(predicate_rows)
+        # end with
+    # end insert_batch
+
+# end class ConceptNetImporter
+
+def main():
+    parser = argparse.ArgumentParser()
+    # The path of the gzipped ConceptNet assertions dump.
+    parser.add_argument('dump_path')
+    # Which concept database to load the assertions into.
+    parser.add_argument('--db_path', default=None)
+    # How many assertions to insert per transaction.
+    parser.add_argument('--batch_size', type=int, default=100000)
+    args = parser.parse_args()
+
+    database_manager = DatabaseManager(args.db_path, use_pool=True, pool_size=1)
+    importer = ConceptNetImporter(database_manager, args.batch_size)
+    importer.import_assertions(args.dump_path)
+    database_manager.close_all_connections()
+# end main
+
+if __name__ == '__main__':
+    main()
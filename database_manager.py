@@ -1,6 +1,12 @@
+import os
 import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
 from sqlite3 import Error
 
+import numpy as np
+
 from constants import Constants as const
 
 class DatabaseManager:
@@ -11,13 +17,84 @@ class DatabaseManager:
     # Whether we print verbose logs
     verbose = False
 
-    def __init__(self, db_path=None):
+    # Whether connections are kept open in a pool and reused
+    # across commands instead of being opened and closed for
+    # every single command.
+    use_pool = False
+
+    # The maximum number of connections the pool will hold open
+    # at once. A connection is held for one command, or for one
+    # whole transaction scope, then handed back to the pool.
+    pool_size = 1
+
+    # How many compiled statements each connection keeps in
+    # sqlite's statement cache.
+    statement_cache_size = 256
+
+    # The most values put in a single IN (...) list. Kept below
+    # sqlite's limit on the number of bound parameters.
+    max_in_list_size = 500
+
+    # The schema version ensure_schema migrates databases up to.
+    schema_version = 3
+
+    # Per-connection pragmas. How many bytes of the database file
+    # to memory-map, and how large each connection's page cache is.
+    mmap_size = 268435456
+    cache_size_kib = 65536
+
+    # The columns of each table, in the order they are selected.
+    table_columns = dict()
+    table_columns['concepts'] = ['name', 'queried']
+    table_columns['predicates'] = ['name', 'source', 'relationship',
+                                   'target', 'weight']
+    table_columns['embeddings'] = ['name'] + ['e' + str(i) for i in range(300)]
+    # Each concept's embedding packed into a single BLOB of
+    # little-endian float32 values.
+    table_columns['embedding_vectors'] = ['name', 'vector']
+    # Facts about the database itself, as key and value text.
+    table_columns['metadata'] = ['key', 'value']
+
+    # The number of values in each concept's embedding.
+    embedding_dimensions = 300
+
+    def __init__(self, db_path=None, use_pool=False, pool_size=4,
+                 statement_cache_size=256):
         # Change this to True for debugging
         self.verbose = False
         if db_path == None:
             self.concepts_db_file_path = const.data_directory + 'concept_data.db'
         else:
             self.concepts_db_file_path = db_path
+
+        self.use_pool = use_pool
+        self.pool_size = max(1, int(pool_size))
+        self.statement_cache_size = statement_cache_size
+
+        # Select commands already built, keyed by table name and
+        # the tuple of column names they match on.
+        self.select_commands = dict()
+
+        # Whether embeddings are read from the packed embedding_vectors
+        # table. None until it is first checked.
+        self.embedding_vectors_present = None
+
+        # Connections that are open but not currently held by
+        # any thread.
+        self.idle_connections = list()
+        # Every connection the pool has opened and not yet closed.
+        self.all_connections = list()
+        # Guards the pool lists and counters. Threads waiting for a
+        # free connection when the pool is full wait on this.
+        self.pool_condition = threading.Condition()
+        # Per-thread state: the connection the thread's transaction
+        # holds and how deeply nested its transaction scopes are.
+        self.thread_state = threading.local()
+
+        # Counters for how many connections were opened and how
+        # many times an already open connection was reused.
+        self.connections_opened = 0
+        self.connections_reused = 0
     # end __init__
 
     # ===== GENERAL =====
@@ -29,8 +106,10 @@ class DatabaseManager:
     #       If the operation failed, return False. 
     def execute_command(self, sql_command, command_data=None):
         return_value = None
-        # Open a connection to the database
-        connection = sqlite3.connect(self.concepts_db_file_path)
+        # Get a connection to the database. Outside of a transaction,
+        # this is a fresh connection, or one from the pool, that is
+        # released again once the command has been executed.
+        connection, is_temporary = self.acquire_connection()
         try:
             # Get a cursor to the database
             cursor = connection.cursor()
@@ -41,28 +120,189 @@ class DatabaseManager:
                 cursor.execute(sql_command, command_data)
             return_value = cursor.fetchall()
             # end if
-            # Commit the changes to the database
-            connection.commit()
+            # Commit the changes to the database, unless we are
+            # inside a transaction scope. The transaction commits
+            # once when the scope ends.
+            if not self.in_transaction():
+                connection.commit()
         except Error as e:
             return_value = False
             if self.verbose:
                 print("Error executing sql command " + sql_command + ": " + str(e))
                 print(" data: " + str(command_data))
         # end try
-        # Whether the command was executed successfully or not,
-        # close the connection.
-        self.close_connection(connection)
-        # has been executed. 
+        # Release temporary connections whether the command was
+        # executed successfully or not.
+        if is_temporary:
+            self.release_connection(connection)
         return return_value
     # end execute_command
 
+    # Execute a sql command once for each row of data in the
+    # given list, using a single statement.
+    # Returns True if the command succeeded, False otherwise.
+    def execute_many(self, sql_command, command_data_list):
+        return_value = True
+        connection, is_temporary = self.acquire_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.executemany(sql_command, command_data_list)
+            if not self.in_transaction():
+                connection.commit()
+        except Error as e:
+            return_value = False
+            if self.verbose:
+                print("Error executing sql command " + sql_command + ": " + str(e))
+        # end try
+        if is_temporary:
+            self.release_connection(connection)
+        return return_value
+    # end execute_many
+
+    # Open a transaction scope. Every command executed by this
+    # thread inside the scope runs on the same connection and is
+    # committed once when the outermost scope ends, or rolled back
+    # if an exception escapes the scope.
+    # Scopes can be nested; only the outermost one commits.
+    # Usage:
+    #   with database_manager.transaction():
+    #       database_manager.insert_row(...)
+    @contextmanager
+    def transaction(self):
+        state = self.thread_state
+        depth = getattr(state, 'transaction_depth', 0)
+        if depth == 0:
+            # Hold a connection for the whole scope, and release it
+            # at the end.
+            connection, is_temporary = self.acquire_connection()
+            state.transaction_connection = connection
+            state.transaction_is_temporary = is_temporary
+        state.transaction_depth = depth + 1
+        try:
+            yield state.transaction_connection
+        except BaseException:
+            state.transaction_depth -= 1
+            if state.transaction_depth == 0:
+                self.end_transaction(rollback=True)
+            raise
+        state.transaction_depth -= 1
+        if state.transaction_depth == 0:
+            self.end_transaction(rollback=False)
+    # end transaction
+
+    # Commit or roll back the current thread's transaction and
+    # let go of its connection.
+    def end_transaction(self, rollback):
+        state = self.thread_state
+        connection = state.transaction_connection
+        try:
+            if rollback:
+                connection.rollback()
+            else:
+                connection.commit()
+        except Error as e:
+            print("Error ending transaction: " + str(e))
+        if state.transaction_is_temporary:
+            self.release_connection(connection)
+        state.transaction_connection = None
+        state.transaction_is_temporary = False
+    # end end_transaction
+
+    # Whether the current thread is inside a transaction scope.
+    def in_transaction(self):
+        return getattr(self.thread_state, 'transaction_depth', 0) > 0
+    # end in_transaction
+
+    # Get the connection a command should run on.
+    # Returns the connection and whether it is temporary, meaning
+    # the caller has to release it with release_connection once the
+    # command is done.
+    def acquire_connection(self):
+        # Inside a transaction, always use the transaction's connection.
+        if self.in_transaction():
+            with self.pool_condition:
+                self.connections_reused += 1
+            return self.thread_state.transaction_connection, False
+        if not self.use_pool:
+            connection = self.open_connection(self.concepts_db_file_path)
+            with self.pool_condition:
+                self.connections_opened += 1
+            return connection, True
+        return self.get_pooled_connection(), True
+    # end acquire_connection
+
+    # Take a connection from the pool.
+    # Takes an idle connection, opens a new one if the pool is not
+    # full, or waits for another thread to release one.
+    def get_pooled_connection(self):
+        with self.pool_condition:
+            while True:
+                if len(self.idle_connections) > 0:
+                    connection = self.idle_connections.pop()
+                    self.connections_reused += 1
+                    break
+                if len(self.all_connections) < self.pool_size:
+                    # check_same_thread is off so a connection released
+                    # by one thread can be picked up by another.
+                    connection = self.open_connection(self.concepts_db_file_path,
+                                                      check_same_thread=False)
+                    self.all_connections.append(connection)
+                    self.connections_opened += 1
+                    break
+                self.pool_condition.wait()
+            # end while
+        return connection
+    # end get_pooled_connection
+
+    # Let go of a temporary connection from acquire_connection.
+    # Outside of pool mode it is closed. Otherwise it goes back to
+    # the pool, where another thread can take it, unless the pool
+    # was closed while it was held.
+    def release_connection(self, connection):
+        if not self.use_pool:
+            self.close_connection(connection)
+            return
+        with self.pool_condition:
+            if not any(connection is pooled_connection
+                       for pooled_connection in self.all_connections):
+                self.close_connection(connection)
+                return
+            self.idle_connections.append(connection)
+            self.pool_condition.notify()
+    # end release_connection
+
+    # Close every connection held by the pool.
+    # Call this at the end of a run.
+    def close_all_connections(self):
+        with self.pool_condition:
+            for connection in self.all_connections:
+                self.close_connection(connection)
+            self.all_connections = list()
+            self.idle_connections = list()
+            self.pool_condition.notify_all()
+        self.thread_state = threading.local()
+    # end close_all_connections
+
+    # Get the counters for how many connections were opened
+    # and how many times an open connection was reused.
+    def get_connection_stats(self):
+        stats = dict()
+        stats['opened'] = self.connections_opened
+        stats['reused'] = self.connections_reused
+        stats['pooled'] = len(self.all_connections)
+        return stats
+    # end get_connection_stats
+
     # Open a connection to the given database file. 
     # Returns the connection object. 
     # Returns None if a connection could not be made. 
-    def open_connection(self, database_file_path):
+    def open_connection(self, database_file_path, check_same_thread=True):
         connection = None
         try:
-            connection = sqlite3.connect(database_file_path)
+            connection = sqlite3.connect(database_file_path,
+                                         check_same_thread=check_same_thread,
+                                         cached_statements=self.statement_cache_size)
+            self.apply_connection_pragmas(connection)
         except Error as e:
             print("Error establishing connection to database "
                   + database_file_path
@@ -111,10 +351,49 @@ class DatabaseManager:
                 sql_insert_command += ",?"
             # end for
             sql_insert_command += ");"
+        elif table_name == 'embedding_vectors':
+            # A name already packed keeps its vector, so copying the
+            # 300-column table in rowid order keeps each name's first
+            # row, like the lookups on that table do.
+            sql_insert_command = """ INSERT OR IGNORE INTO embedding_vectors (name, vector)
+                                 VALUES(?,?) """
         # end if
         return sql_insert_command
     # end get_insert_command
 
+    # Insert many concepts, skipping any already in the concepts
+    # table. If queried is 1, also mark every one of them as queried.
+    # Concepts already marked as queried are never unmarked.
+    #   Inputs: names, list of cleaned concept names.
+    #           queried, 1 if the concepts' predicates are all in
+    #               the database, 0 otherwise.
+    #   Outputs: True if the inserts were successful.
+    def insert_concepts_if_missing(self, names, queried):
+        sql_insert_command = """ INSERT INTO concepts (name, queried)
+                             SELECT ?, ? WHERE NOT EXISTS
+                             (SELECT 1 FROM concepts WHERE name = ?) """
+        sql_update_command = " UPDATE concepts SET queried = ? WHERE name = ? "
+        insert_success = self.execute_many(sql_insert_command,
+                                           [(name, queried, name) for name in names])
+        if queried == 1:
+            insert_success = insert_success and self.execute_many(sql_update_command,
+                                                                  [(queried, name) for name in names])
+        return insert_success
+    # end insert_concepts_if_missing
+
+    # Insert many predicates, skipping any whose source, relationship,
+    # and target are already in the predicates table.
+    #   Inputs: rows, list of (name, source, relationship, target, weight)
+    #   Outputs: True if the inserts were successful.
+    def insert_predicates_if_missing(self, rows):
+        sql_insert_command = """ INSERT INTO predicates (name, source, relationship, target, weight)
+                             SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS
+                             (SELECT 1 FROM predicates
+                              WHERE source = ? AND relationship = ? AND target = ?) """
+        return self.execute_many(sql_insert_command,
+                                 [tuple(row) + tuple(row[1:4]) for row in rows])
+    # end insert_predicates_if_missing
+
     # ===== END INSERT =====
 
     # ===== DELETE =====
@@ -127,25 +406,25 @@ class DatabaseManager:
     # Outputs: True if the delete operation was successful.
     #           False otherwise.
     def delete_row(self, table_name, column_name, matching_value):
-        # Check if the matching value is a string. If so,
-        # place escape character quotes around it.
-        if isinstance(matching_value, str):
-            matching_value = "'" + matching_value + "'"
+        # Table and column names cannot be bound as parameters,
+        # so make sure they are ones we know about.
+        self.check_columns(table_name, [column_name])
         # Construct the sql command to delete a row from
         # the given table using the given search conditions.
-        search_condition = str(column_name) + " = " + str(matching_value)
+        # The matching value is bound to the ? placeholder.
         sql_delete_command = " DELETE FROM "
         sql_delete_command += str(table_name)
         sql_delete_command += " WHERE "
-        sql_delete_command += str(search_condition)
+        sql_delete_command += str(column_name) + " = ?"
         sql_delete_command += ";"
         # Execute the sql command.
-        delete_success = self.execute_command(sql_delete_command)
+        delete_success = self.execute_command(sql_delete_command, (matching_value,))
         return delete_success
     # end delete_row
     
     # Delete all rows from a table.
     def delete_all_rows(self, table_name):
+        self.check_columns(table_name, [])
         # Build the sql command.
         sql_delete_command = " DELETE FROM "
         sql_delete_command += str(table_name) + ";"
@@ -166,63 +445,458 @@ class DatabaseManager:
     # Outputs: the return values of the select command.
     #           If the rows are not found, returns an empty list []
     def select_row(self, table_name, column_names, matching_values):
-        # Check if any matching value is a string. If so,
-        # place escape character quotes around it.
-        matching_values_parsed = list()
-        for matching_value in matching_values:
-            if isinstance(matching_value, str):
-                matching_values_parsed.append("'" + matching_value + "'")
-            else:
-                matching_values_parsed.append(matching_value)
-            # end else
-        # end for
-
-        # Get the sql command.
-        sql_select_command = self.get_select_command(table_name, column_names, matching_values_parsed)
+        # Get the sql command. The matching values are bound to
+        # its ? placeholders, so no quoting is needed.
+        sql_select_command = self.get_select_command(table_name, column_names)
         # Execute the sql command.
-        select_return = self.execute_command(sql_select_command)
+        select_return = self.execute_command(sql_select_command,
+                                             tuple(matching_values))
         return select_return
     # end select_command
 
-    # Make a select command matching a single column. 
+    # Make a select command matching each of the given columns
+    # against a ? placeholder.
     # Depending on the table name, build a different
     # sql select command.
-    def get_select_command(self, table_name, column_names, matching_values):
-        sql_insert_command = ""
-        if table_name == 'concepts':
-            sql_insert_command = "SELECT name, queried "
-        elif table_name == 'predicates':
-            sql_insert_command = "SELECT name, source, relationship, target, weight "
-        elif table_name == 'embeddings':
-            sql_insert_command = "SELECT name"
-            # Get each of the 300 rows of floats
-            for i in range(300):
-                sql_insert_command += ', e' + str(i)
-            # end for
-        # end elif
-        # Build the search conditions using the list of columns and matching values.
+    # Commands are built once per table and set of columns and then
+    # reused, so the text handed to sqlite is identical every time
+    # and its compiled statement is taken from the statement cache.
+    def get_select_command(self, table_name, column_names):
+        command_key = (table_name, tuple(column_names))
+        if command_key in self.select_commands:
+            return self.select_commands[command_key]
+        self.check_columns(table_name, column_names)
+        sql_select_command = "SELECT " + ", ".join(self.table_columns[table_name])
+        sql_select_command += " FROM " + str(table_name)
+        # Build the search conditions using the list of columns.
         search_conditions = ""
         for i in range(len(column_names)):
             if i > 0:
                 search_conditions += " AND "
             # end if
-            search_conditions += column_names[i] + " = " + str(matching_values[i])
+            search_conditions += column_names[i] + " = ?"
         # end for
-        sql_insert_command += " FROM " + str(table_name)
         # Only add a WHERE statement if there were search conditions
         if not search_conditions == "":
-            sql_insert_command += " WHERE "
-            sql_insert_command += search_conditions
-        sql_insert_command += ";"
+            sql_select_command += " WHERE "
+            sql_select_command += search_conditions
+        sql_select_command += ";"
         
         if self.verbose:
-            print(sql_insert_command)
-            
-        return sql_insert_command
+            print(sql_select_command)
+
+        self.select_commands[command_key] = sql_select_command
+        return sql_select_command
     # end get_select_command
 
+    # Run the same select command once per set of matching values.
+    # Every lookup runs on a single connection and reuses the same
+    # compiled statement.
+    # Returns all the rows found, in the order of the values given.
+    def select_many(self, table_name, column_names, matching_values_list):
+        sql_select_command = self.get_select_command(table_name, column_names)
+        all_rows = list()
+        with self.transaction():
+            for matching_values in matching_values_list:
+                rows = self.execute_command(sql_select_command,
+                                            tuple(matching_values))
+                if rows == False:
+                    continue
+                all_rows.extend(rows)
+            # end for
+        # end with
+        return all_rows
+    # end select_many
+
+    # Get every row of a table whose column matches any of the
+    # given values, using IN (?, ?, ...) lookups.
+    # The values are deduplicated and split into chunks of at most
+    # max_in_list_size, so a whole image set's concepts take a few
+    # queries instead of one query per concept.
+    # Returns all the rows found.
+    def select_in(self, table_name, column_name, values):
+        self.check_columns(table_name, [column_name])
+        # Deduplicate while keeping the order the values came in.
+        unique_values = list(dict.fromkeys(values))
+        all_rows = list()
+        with self.transaction():
+            for chunk_start in range(0, len(unique_values), self.max_in_list_size):
+                chunk = unique_values[chunk_start:chunk_start + self.max_in_list_size]
+                sql_select_command = self.get_select_in_command(table_name,
+                                                                column_name,
+                                                                len(chunk))
+                rows = self.execute_command(sql_select_command, tuple(chunk))
+                if rows == False:
+                    continue
+                all_rows.extend(rows)
+            # end for
+        # end with
+        return all_rows
+    # end select_in
+
+    # Make a select command matching a column against an IN list
+    # of the given number of ? placeholders.
+    # Built commands are reused like those from get_select_command.
+    def get_select_in_command(self, table_name, column_name, value_count):
+        command_key = (table_name, column_name, 'IN', value_count)
+        if command_key in self.select_commands:
+            return self.select_commands[command_key]
+        sql_select_command = "SELECT " + ", ".join(self.table_columns[table_name])
+        sql_select_command += " FROM " + str(table_name)
+        sql_select_command += " WHERE " + column_name + " IN ("
+        sql_select_command += ",".join(["?"] * value_count) + ");"
+        self.select_commands[command_key] = sql_select_command
+        return sql_select_command
+    # end get_select_in_command
+
+    # Get the rows of the concepts table for the given concept names.
+    # Each row is (name, queried).
+    def select_concepts(self, names):
+        return self.select_in('concepts', 'name', names)
+    # end select_concepts
+
+    # Get every predicate whose source is one of the given concept names.
+    # Each row is (name, source, relationship, target, weight).
+    def select_predicates_by_source(self, names):
+        return self.select_in('predicates', 'source', names)
+    # end select_predicates_by_source
+
+    # Get every predicate whose target is one of the given concept names.
+    # Each row is (name, source, relationship, target, weight).
+    def select_predicates_by_target(self, names):
+        return self.select_in('predicates', 'target', names)
+    # end select_predicates_by_target
+
+    # Get the predicates matching a source, relationship, and target.
+    def select_predicate(self, source, relationship, target):
+        return self.select_row('predicates',
+                               ['source', 'relationship', 'target'],
+                               [source, relationship, target])
+    # end select_predicate
+
+    # Get the embedding rows for the given concept names.
+    # Each row is the name followed by its 300 embedding values.
+    def select_embeddings(self, names):
+        return self.select_in('embeddings', 'name', names)
+    # end select_embeddings
+
+    # Get the packed embeddings for the given concept names.
+    # Each row is (name, vector), where vector is a float32 BLOB.
+    # Decode vectors with decode_embedding.
+    def select_embedding_vectors(self, names):
+        return self.select_in('embedding_vectors', 'name', names)
+    # end select_embedding_vectors
+
+    # Whether the database has packed embeddings to read from, which
+    # is only once migrate_embeddings_to_blobs has copied all of them.
+    # Checked once, then remembered.
+    def has_embedding_vectors(self):
+        if self.embedding_vectors_present == None:
+            self.embedding_vectors_present = (self.get_metadata('embedding_vectors_complete') == '1')
+        return self.embedding_vectors_present
+    # end has_embedding_vectors
+
+    # Get a value from the metadata table.
+    # Returns None if the key has no value.
+    def get_metadata(self, key):
+        rows = self.execute_command("SELECT value FROM metadata WHERE key = ?;", (key,))
+        if not rows:
+            return None
+        return rows[0][0]
+    # end get_metadata
+
+    # Set a value in the metadata table.
+    def set_metadata(self, key, value):
+        return self.execute_command("INSERT OR REPLACE INTO metadata (key, value) VALUES(?,?);",
+                                    (key, str(value)))
+    # end set_metadata
+
     # ===== END SELECT =====
 
+    # Make sure a table and its columns are ones in the database's
+    # schema. Identifiers can't be bound as parameters, so this
+    # guards every place they are put into a command's text.
+    def check_columns(self, table_name, column_names):
+        if not table_name in self.table_columns:
+            raise ValueError("Unknown table " + str(table_name))
+        for column_name in column_names:
+            if not column_name in self.table_columns[table_name]:
+                raise ValueError("Unknown column " + str(column_name) +
+                                 " in table " + str(table_name))
+        # end for
+    # end check_columns
+
+    # ===== SCHEMA =====
+
+    # Make sure the database has every table and index the lookups
+    # rely on, migrating older databases up to the current schema
+    # version, and switch it to WAL journaling.
+    # The schema version is stored in sqlite's user_version pragma.
+    # Safe to call on every run; a database that is already up to
+    # date is left unchanged.
+    def ensure_schema(self):
+        # WAL lets readers keep reading while a writer commits.
+        # The journal mode can't change inside a transaction, and is
+        # remembered by the database file once set.
+        self.execute_command("PRAGMA journal_mode=WAL;")
+        version_rows = self.execute_command("PRAGMA user_version;")
+        current_version = 0
+        if version_rows:
+            current_version = version_rows[0][0]
+        # Apply each migration past the database's current version,
+        # in order, each in its own transaction.
+        for version in range(current_version + 1, self.schema_version + 1):
+            print("Migrating concept database to schema version " + str(version))
+            migration = getattr(self, 'migrate_schema_to_' + str(version))
+            with self.transaction():
+                migration()
+                # Pragmas can't take bound parameters.
+                self.execute_command("PRAGMA user_version = " + str(int(version)) + ";")
+            # end with
+        # end for
+    # end ensure_schema
+
+    # Schema version 1: the original tables, plus an index for
+    # every column the lookups match on.
+    def migrate_schema_to_1(self):
+        self.execute_command("CREATE TABLE IF NOT EXISTS concepts " +
+                             "(name TEXT, queried INTEGER);")
+        self.execute_command("CREATE TABLE IF NOT EXISTS predicates " +
+                             "(name TEXT, source TEXT, relationship TEXT, " +
+                             "target TEXT, weight REAL);")
+        embedding_columns = ", ".join([column + " REAL" for column
+                                       in self.table_columns['embeddings'][1:]])
+        self.execute_command("CREATE TABLE IF NOT EXISTS embeddings " +
+                             "(name TEXT, " + embedding_columns + ");")
+        self.execute_command("CREATE INDEX IF NOT EXISTS idx_concepts_name " +
+                             "ON concepts (name);")
+        # Lookups by source alone use the leftmost column of the
+        # (source, relationship, target) index, so source needs no
+        # index of its own.
+        self.execute_command("CREATE INDEX IF NOT EXISTS idx_predicates_triple " +
+                             "ON predicates (source, relationship, target);")
+        self.execute_command("CREATE INDEX IF NOT EXISTS idx_predicates_target " +
+                             "ON predicates (target);")
+        self.execute_command("CREATE INDEX IF NOT EXISTS idx_embeddings_name " +
+                             "ON embeddings (name);")
+    # end migrate_schema_to_1
+
+    # Schema version 2: a table of embeddings packed as one float32
+    # BLOB per concept. It starts empty; migrate_embeddings_to_blobs
+    # fills it from the 300-column embeddings table.
+    def migrate_schema_to_2(self):
+        self.execute_command("CREATE TABLE IF NOT EXISTS embedding_vectors " +
+                             "(name TEXT PRIMARY KEY, vector BLOB);")
+    # end migrate_schema_to_2
+
+    # Schema version 3: a metadata table, which records whether every
+    # embedding has been packed into embedding_vectors.
+    # Databases packed before it existed are marked as packed if the
+    # 300-column table was dropped after packing, or if both tables
+    # have the same concepts.
+    def migrate_schema_to_3(self):
+        self.execute_command("CREATE TABLE IF NOT EXISTS metadata " +
+                             "(key TEXT PRIMARY KEY, value TEXT);")
+        vector_rows = self.execute_command("SELECT COUNT(*) FROM embedding_vectors;")
+        vector_count = vector_rows[0][0] if vector_rows else 0
+        if vector_count == 0:
+            return
+        legacy_rows = self.execute_command("SELECT COUNT(DISTINCT name) FROM embeddings;")
+        if legacy_rows == False or legacy_rows[0][0] == vector_count:
+            self.set_metadata('embedding_vectors_complete', 1)
+    # end migrate_schema_to_3
+
+    # Get a fingerprint of the database's contents: its schema
+    # version, then the row count and largest rowid of each table,
+    # then how many concepts are marked as queried.
+    # Anything cached from the database is only good while the
+    # fingerprint stays the same. Tables that don't exist count as
+    # None.
+    def get_fingerprint(self):
+        fingerprint = list()
+        version_rows = self.execute_command("PRAGMA user_version;")
+        fingerprint.append(version_rows[0][0] if version_rows else 0)
+        for table_name in self.table_columns:
+            rows = self.execute_command("SELECT COUNT(*), MAX(rowid) FROM " + table_name + ";")
+            fingerprint.append(tuple(rows[0]) if rows else None)
+        # end for
+        rows = self.execute_command("SELECT COUNT(*) FROM concepts WHERE queried = 1;")
+        fingerprint.append(rows[0][0] if rows else None)
+        return tuple(fingerprint)
+    # end get_fingerprint
+
+    # ===== EMBEDDINGS =====
+
+    # Pack a sequence of embedding values into a float32 BLOB.
+    def encode_embedding(self, values):
+        return np.asarray(values, dtype='<f4').tobytes()
+    # end encode_embedding
+
+    # Turn a float32 BLOB back into a numpy array.
+    # The array is a read-only view over the BLOB's bytes, so no
+    # values are copied or converted.
+    def decode_embedding(self, vector_blob):
+        return np.frombuffer(vector_blob, dtype='<f4')
+    # end decode_embedding
+
+    # Copy every embedding in the 300-column embeddings table into the
+    # packed embedding_vectors table, a batch of rows per transaction.
+    # Embeddings are only read from the packed table once every row
+    # has been copied, so a migration that is stopped part way loses
+    # nothing and can just be run again.
+    # If drop_legacy is True, drop the old table afterwards and VACUUM
+    # so the database file shrinks.
+    # Returns the number of embeddings copied.
+    def migrate_embeddings_to_blobs(self, drop_legacy=False, batch_size=10000):
+        self.ensure_schema()
+        start_size = os.path.getsize(self.concepts_db_file_path)
+        # Read from the 300-column table until the copy is finished.
+        self.set_metadata('embedding_vectors_complete', 0)
+        self.embedding_vectors_present = None
+        sql_select_command = ("SELECT rowid, " +
+                              ", ".join(self.table_columns['embeddings']) +
+                              " FROM embeddings WHERE rowid > ?" +
+                              " ORDER BY rowid LIMIT ?;")
+        sql_insert_command = self.get_insert_command('embedding_vectors')
+        copied_count = 0
+        last_rowid = 0
+        while True:
+            rows = self.execute_command(sql_select_command, (last_rowid, batch_size))
+            if not rows:
+                break
+            # Each row is rowid, name, then the embedding values.
+            vector_rows = [(row[1], self.encode_embedding(row[2:])) for row in rows]
+            with self.transaction():
+                self.execute_many(sql_insert_command, vector_rows)
+            copied_count += len(rows)
+            last_rowid = rows[-1][0]
+            print("Packed " + str(copied_count) + " embeddings")
+        # end while
+        self.set_metadata('embedding_vectors_complete', 1)
+        self.embedding_vectors_present = None
+
+        if drop_legacy:
+            self.execute_command("DROP TABLE IF EXISTS embeddings;")
+            # VACUUM can't run inside a transaction.
+            self.execute_command("VACUUM;")
+        # end if
+        # Move the copied rows out of the WAL file into the database
+        # file, so its size counts them.
+        self.execute_command("PRAGMA wal_checkpoint(TRUNCATE);")
+        end_size = os.path.getsize(self.concepts_db_file_path)
+        print("Database file size: " + str(start_size) + " -> " + str(end_size) + " bytes")
+        return copied_count
+    # end migrate_embeddings_to_blobs
+
+    # Get how many distinct concepts have an embedding.
+    def count_embeddings(self):
+        table_name = 'embedding_vectors' if self.has_embedding_vectors() else 'embeddings'
+        rows = self.execute_command("SELECT COUNT(DISTINCT name) FROM " + table_name + ";")
+        if not rows:
+            return 0
+        return rows[0][0]
+    # end count_embeddings
+
+    # Go through every embedding in the database, a batch at a time.
+    # Yields lists of (name, vector) pairs, where vector is a float32
+    # numpy array. Reads the packed table if it has rows, otherwise
+    # the 300-column table. Names may repeat in the 300-column table.
+    def iterate_embeddings(self, batch_size=10000):
+        use_vectors = self.has_embedding_vectors()
+        table_name = 'embedding_vectors' if use_vectors else 'embeddings'
+        sql_select_command = ("SELECT rowid, " +
+                              ", ".join(self.table_columns[table_name]) +
+                              " FROM " + table_name + " WHERE rowid > ?" +
+                              " ORDER BY rowid LIMIT ?;")
+        last_rowid = 0
+        while True:
+            rows = self.execute_command(sql_select_command, (last_rowid, batch_size))
+            if not rows:
+                break
+            if use_vectors:
+                yield [(row[1], self.decode_embedding(row[2])) for row in rows]
+            else:
+                yield [(row[1], np.asarray(row[2:], dtype='<f4')) for row in rows]
+            last_rowid = rows[-1][0]
+        # end while
+    # end iterate_embeddings
+
+    # ===== END EMBEDDINGS =====
+
+    # Set the per-connection pragmas on a newly opened connection.
+    def apply_connection_pragmas(self, connection):
+        cursor = connection.cursor()
+        # Map the database file into memory for reads.
+        cursor.execute("PRAGMA mmap_size = " + str(int(self.mmap_size)) + ";")
+        # Negative sizes are in KiB rather than pages.
+        cursor.execute("PRAGMA cache_size = " + str(-int(self.cache_size_kib)) + ";")
+        # With WAL, NORMAL only syncs at checkpoints. The database
+        # stays consistent; a power loss can only lose the last
+        # few commits, which are re-fetchable cache entries.
+        cursor.execute("PRAGMA synchronous = NORMAL;")
+        cursor.close()
+    # end apply_connection_pragmas
+
+    # Run ANALYZE, then get sqlite's query plan for each of the hot
+    # lookups and report whether any of them scans a whole table.
+    # Returns a list of dictionaries with:
+    #   'name': a name for the lookup.
+    #   'sql': the sql command of the lookup.
+    #   'plan': the lines of its query plan.
+    #   'full_scan': True if any line of the plan is a table scan,
+    #       None if the plan could not be made (e.g. missing table).
+    def query_plan_report(self):
+        self.execute_command("ANALYZE;")
+        hot_lookups = list()
+        hot_lookups.append(('concepts by name',
+                            self.get_select_in_command('concepts', 'name', 2),
+                            ('a', 'b')))
+        hot_lookups.append(('predicates by source',
+                            self.get_select_in_command('predicates', 'source', 2),
+                            ('a', 'b')))
+        hot_lookups.append(('predicates by target',
+                            self.get_select_in_command('predicates', 'target', 2),
+                            ('a', 'b')))
+        hot_lookups.append(('predicate by source, relationship, target',
+                            self.get_select_command('predicates',
+                                                    ['source', 'relationship', 'target']),
+                            ('a', 'IsA', 'b')))
+        hot_lookups.append(('embeddings by name',
+                            self.get_select_in_command('embeddings', 'name', 2),
+                            ('a', 'b')))
+        hot_lookups.append(('embedding vectors by name',
+                            self.get_select_in_command('embedding_vectors', 'name', 2),
+                            ('a', 'b')))
+        report = list()
+        for lookup_name, sql_command, sample_data in hot_lookups:
+            plan_rows = self.execute_command("EXPLAIN QUERY PLAN " + sql_command,
+                                             sample_data)
+            if plan_rows == False:
+                print("ERROR     " + lookup_name + ": could not get query plan")
+                report.append({'name': lookup_name,
+                               'sql': sql_command,
+                               'plan': list(),
+                               'full_scan': None})
+                continue
+            # The last column of each row is the plan's text.
+            plan = [plan_row[-1] for plan_row in plan_rows]
+            full_scan = False
+            for plan_line in plan:
+                if plan_line.startswith('SCAN'):
+                    full_scan = True
+            # end for
+            report.append({'name': lookup_name,
+                           'sql': sql_command,
+                           'plan': plan,
+                           'full_scan': full_scan})
+            print(("FULL SCAN " if full_scan else "ok        ") +
+                  lookup_name + ": " + " | ".join(plan))
+        # end for
+        return report
+    # end query_plan_report
+
+    # ===== END SCHEMA =====
+
     # ===== UTILITY =====
     # Non-basic utility functions
 
@@ -233,7 +907,27 @@ class DatabaseManager:
 def main():
     # Test some stuff!
     print("hey :) main in database_manager")
-    db_manager = DatabaseManager()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db_path', default=None)
+    # Create or migrate the tables and indexes.
+    parser.add_argument('--ensure_schema', action='store_true')
+    # Print the query plan of each hot lookup.
+    parser.add_argument('--query_plan_report', action='store_true')
+    # Pack the 300-column embeddings into float32 BLOBs.
+    parser.add_argument('--migrate_embeddings', action='store_true')
+    # After packing them, drop the 300-column embeddings table.
+    parser.add_argument('--drop_legacy_embeddings', action='store_true')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db_path)
+    if args.ensure_schema:
+        db_manager.ensure_schema()
+    if args.migrate_embeddings:
+        db_manager.migrate_embeddings_to_blobs(args.drop_legacy_embeddings)
+    if args.query_plan_report:
+        db_manager.query_plan_report()
+    if args.ensure_schema or args.migrate_embeddings or args.query_plan_report:
+        return
     # Write into the predicates table
     #row_data = ('test', 'testing', 'is', 'pog', 1.0)
     #insert_result = db_manager.insert_row('predicates', row_data)
@@ -244,7 +938,7 @@ def main():
     #insert_result = db_manager.insert_row('concepts', row_data)
     #print("Insert success: " + str(insert_result))
     # Delete from the concepts table
-    #delete_result = db_manager.delete_row('concepts', 'name', "'" + 'test' + "'")
+    #delete_result = db_manager.delete_row('concepts', 'name', 'test')
     #print("Delete success: " + str(delete_result))
     # Select from the concepts table
     select_results = db_manager.select_row('embeddings', ['name'], ['dog'])
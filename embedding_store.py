@@ -0,0 +1,156 @@
+import os
+import argparse
+
+import numpy as np
+
+from database_manager import DatabaseManager
+from constants import Constants as const
+
+# A store of every concept's embedding in one contiguous float32
+# matrix on disk, with a sorted array of concept names to find each
+# concept's row by binary search.
+# The matrix and the name index are memory-mapped, so loading them
+# reads nothing up front and getting an embedding is a search of the
+# names and a slice of the matrix with no sql.
+class EmbeddingStore:
+    # Where the .npy embedding matrix is.
+    matrix_path = ''
+    # Where the .npy array of sorted concept names is.
+    names_path = ''
+    # Where the .npy array of each sorted name's matrix row is.
+    rows_path = ''
+
+    # The memory-mapped embedding matrix, one row per concept.
+    matrix = None
+    # The memory-mapped concept names, UTF-8 encoded into a
+    # fixed-width bytes array and sorted.
+    names = None
+    # The memory-mapped matrix row of each name in names.
+    name_rows = None
+
+    def __init__(self, matrix_path=None):
+        if matrix_path == None:
+            matrix_path = const.data_directory + 'embeddings.npy'
+        self.matrix_path = matrix_path
+        base_path = os.path.splitext(matrix_path)[0]
+        self.names_path = base_path + '_names.npy'
+        self.rows_path = base_path + '_rows.npy'
+        self.matrix = None
+        self.names = None
+        self.name_rows = None
+    # end __init__
+
+    # Write every embedding in the concept database to the matrix
+    # and its name index.
+    # Returns the number of embeddings written.
+    def export(self, database_manager=None):
+        if database_manager == None:
+            database_manager = DatabaseManager()
+        embedding_count = database_manager.count_embeddings()
+        print("Exporting " + str(embedding_count) + " embeddings to " + self.matrix_path)
+        # Write straight into a .npy file so the whole matrix never
+        # has to be in memory at once.
+        matrix = np.lib.format.open_memmap(self.matrix_path, mode='w+',
+                                           dtype='<f4',
+                                           shape=(embedding_count,
+                                                  database_manager.embedding_dimensions))
+        row_index = dict()
+        for batch in database_manager.iterate_embeddings():
+            for name, vector in batch:
+                # Keep the first embedding found for each name, like
+                # the database lookups do.
+                if name in row_index:
+                    continue
+                row_index[name] = len(row_index)
+                matrix[row_index[name]] = vector
+            # end for
+        # end for
+        matrix.flush()
+        del matrix
+        # Sort the names so a name's row can be found by binary search.
+        names = np.array([name.encode('utf-8') for name in row_index.keys()],
+                         dtype=bytes)
+        if len(names) == 0:
+            names = np.zeros(0, dtype='S1')
+        rows = np.fromiter(row_index.values(), dtype='<i8', count=len(row_index))
+        sort_order = np.argsort(names, kind='stable')
+        np.save(self.names_path, names[sort_order])
+        np.save(self.rows_path, rows[sort_order])
+        print("Wrote " + str(len(row_index)) + " embeddings")
+        return len(row_index)
+    # end export
+
+    # Memory-map the matrix and its name index.
+    def load(self):
+        self.matrix = load_array(self.matrix_path)
+        self.names = load_array(self.names_path)
+        self.name_rows = load_array(self.rows_path)
+        print("Loaded embedding matrix " + self.matrix_path + " with " +
+              str(len(self.names)) + " embeddings")
+    # end load
+
+    # Whether the matrix has been loaded.
+    def is_loaded(self):
+        return not self.matrix is None
+    # end is_loaded
+
+    # Get a concept's embedding as a read-only float32 array.
+    # Returns an empty list if the concept has no embedding.
+    def get_embedding(self, concept_name):
+        return self.get_embeddings_many([concept_name])[concept_name]
+    # end get_embedding
+
+    # Get the embeddings of many concepts.
+    # Returns a dictionary keyed by concept name.
+    # All of the names are searched for at once.
+    def get_embeddings_many(self, concept_names):
+        embeddings = dict()
+        concept_names = list(dict.fromkeys(concept_names))
+        if len(concept_names) == 0:
+            return embeddings
+        # A name longer than the widest stored name can't be stored,
+        # and would be cut short when made into a search key.
+        name_width = self.names.dtype.itemsize
+        encoded_names = [concept_name.encode('utf-8') for concept_name in concept_names]
+        keys = np.array([encoded_name if len(encoded_name) <= name_width else b''
+                         for encoded_name in encoded_names],
+                        dtype=self.names.dtype)
+        positions = np.searchsorted(self.names, keys)
+        for concept_name, encoded_name, position in zip(concept_names,
+                                                        encoded_names,
+                                                        positions):
+            if (position < len(self.names)
+                and self.names[position] == encoded_name):
+                embeddings[concept_name] = self.matrix[self.name_rows[position]]
+            else:
+                embeddings[concept_name] = list()
+        # end for
+        return embeddings
+    # end get_embeddings_many
+
+# end class EmbeddingStore
+
+# Load a .npy array, memory-mapped unless it is empty.
+# An empty array has no data to map.
+def load_array(file_path):
+    try:
+        return np.load(file_path, mmap_mode='r')
+    except ValueError:
+        return np.load(file_path)
+# end load_array
+
+def main():
+    parser = argparse.ArgumentParser()
+    # Which concept database to export the embeddings of.
+    parser.add_argument('--db_path', default=None)
+    # Where to write the embedding matrix. Its name index is written
+    # next to it.
+    parser.add_argument('--matrix_path', default=None)
+    args = parser.parse_args()
+
+    embedding_store = EmbeddingStore(args.matrix_path)
+    embedding_store.export(DatabaseManager(args.db_path))
+# end main
+
+if __name__ == '__main__':
+    main()
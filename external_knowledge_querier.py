@@ -8,6 +8,8 @@ import pickle
 import requests
 
 from database_manager import DatabaseManager
+from conceptnet_fetcher import ConceptNetFetcher
+from query_cache import LRUCache
 
 # Root directory
 ROOT_DIRECTORY = os.path.abspath("../")
@@ -31,42 +33,110 @@ class ExternalKnowledgeQuerier:
     # Count the total number of queries made
     query_count = 0
 
-    def __init__(self):
+    # Whether to treat the concepts database as complete and never
+    # query the ConceptNet API, e.g. after importing a ConceptNet
+    # assertions dump with conceptnet_importer.py.
+    offline = False
+
+    # The URL of the ConceptNet API to query.
+    # http://api.conceptnet.io is the public API.
+    # If an EC2 instance is made this will be the instance's url.
+    api_url = 'http://api.conceptnet.io/query?'
+
+    # What relationships we're actually searching for.
+    # Referential:
+    #   IsA, PartOf, HasA, DefinedAs, MannerOf
+    # Causal:
+    #   UsedFor, CapableOf, Causes, HasSubevent,
+    #   HasFirstSubevent, HasLastSubevent
+    # Affective:
+    #   MotivatedByGoal, ObstructedBy, Desires,
+    #   CausesDesire
+    # Spatial:
+    #   AtLocation, LocatedNear
+    # Temporal:
+    #   Mostly shares with Causal
+    # 17 relationships total
+    valid_relationships = ['IsA', 'PartOf', 'HasA',
+                           'DefinedAs', 'MannerOf',
+                           'UsedFor', 'CapableOf', 'Causes',
+                           'HasSubevent', 'HasFirstSubevent',
+                           'HasLastSubevent',
+                           'MotivatedByGoal', 'ObstructedBy',
+                           'Desires', 'CausesDesire',
+                           'AtLocation', 'LocatedNear']
+
+    # A ConceptNetFetcher for querying many concepts at once.
+    # Made the first time it is needed.
+    fetcher = None
+
+    # Caches of GetPredicates and GetEmbedding results, keyed by
+    # cleaned concept word, so concepts that come up again and again
+    # are only looked up in the database once.
+    predicate_cache = None
+    embedding_cache = None
+    # Where to save the caches between runs. The caches are written
+    # to this path with _predicates.pkl and _embeddings.pkl added.
+    # Empty to not save them.
+    # Each is saved with the database's fingerprint and discarded when
+    # loaded against a database with a different one.
+    cache_path = ''
+
+    def __init__(self, database_manager_in=None, offline=False,
+                 api_url=None, cache_entries=100000,
+                 cache_bytes=268435456, cache_path=''):
         print("Initializing ExternalKnowledgeQuerier")
-        # Make the database manager object
-        self.database_manager = DatabaseManager()
+        # Make the database manager object, unless one is passed in
+        # to be shared (e.g. one holding a connection pool).
+        if database_manager_in == None:
+            self.database_manager = DatabaseManager()
+        else:
+            self.database_manager = database_manager_in
 
         self.query_count = 0
+        self.offline = offline
+        if not api_url == None:
+            self.api_url = api_url
+        self.fetcher = None
+
+        # Split the cache capacity between the two caches.
+        self.predicate_cache = LRUCache(cache_entries, cache_bytes // 2)
+        self.embedding_cache = LRUCache(cache_entries, cache_bytes // 2)
+        self.cache_path = cache_path
+        if self.cache_path:
+            fingerprint = self.database_manager.get_fingerprint()
+            loaded_count = self.predicate_cache.load(self.cache_path + '_predicates.pkl',
+                                                     fingerprint)
+            loaded_count += self.embedding_cache.load(self.cache_path + '_embeddings.pkl',
+                                                      fingerprint)
+            print("Loaded " + str(loaded_count) + " cached query results")
+        # end if
     # end __init__
 
+    # Save the caches to the cache path, if there is one.
+    def SaveCaches(self):
+        if not self.cache_path:
+            return
+        fingerprint = self.database_manager.get_fingerprint()
+        self.predicate_cache.save(self.cache_path + '_predicates.pkl', fingerprint)
+        self.embedding_cache.save(self.cache_path + '_embeddings.pkl', fingerprint)
+    # end SaveCaches
+
+    # Get the statistics of both caches.
+    def GetCacheStats(self):
+        cache_stats = dict()
+        cache_stats['predicates'] = self.predicate_cache.get_stats()
+        cache_stats['embeddings'] = self.embedding_cache.get_stats()
+        return cache_stats
+    # end GetCacheStats
+
     # Query ConceptNet for a word. Adds the words' predicates
     # and other information to the databases if they are not
     # already present.
     # Returns the string that is used to identify this concept
     # in the database.
     def QueryConceptNet(self, input_word):
-        # What relationships we're actually searching for.
-        # Referential:
-        #   IsA, PartOf, HasA, DefinedAs, MannerOf
-        # Causal:
-        #   UsedFor, CapableOf, Causes, HasSubevent,
-        #   HasFirstSubevent, HasLastSubevent
-        # Affective:
-        #   MotivatedByGoal, ObstructedBy, Desires,
-        #   CausesDesire
-        # Spatial:
-        #   AtLocation, LocatedNear
-        # Temporal:
-        #   Mostly shares with Causal
-        # 17 relationships total
-        valid_relationships = ['IsA', 'PartOf', 'HasA',
-                               'DefinedAs', 'MannerOf',
-                               'UsedFor', 'CapableOf', 'Causes',
-                               'HasSubevent', 'HasFirstSubevent',
-                               'HasLastSubevent',
-                               'MotivatedByGoal', 'ObstructedBy',
-                               'Desires', 'CausesDesire',
-                               'AtLocation', 'LocatedNear']
+        valid_relationships = self.valid_relationships
         
         #print("Querying concepts for: " + str(input_word))
         query_result = None
@@ -78,9 +148,7 @@ class ExternalKnowledgeQuerier:
         # by fetching it.
         # If the return value is an empty list, it's not
         # in the database.
-        sql_select_response = self.database_manager.select_row('concepts',
-                                                               ['name'],
-                                                               [input_lower])
+        sql_select_response = self.database_manager.select_concepts([input_lower])
         existing_concept = False
         if len(sql_select_response) > 0:
             # Check if it's been queried in ConceptNet.
@@ -92,15 +160,14 @@ class ExternalKnowledgeQuerier:
 
         # If this is NOT an existing concept that has already been
         # queried in ConceptNet, query it in ConceptNet.
-        if not existing_concept:
+        # When offline, whatever is in the database is all there is.
+        if not existing_concept and not self.offline:
             # Otherwise, query from the public API
             print("Not in cache, querying API for " + input_lower)
             # Form the API query
             # URL of the api we are querying.
-            # http://api.conceptnet.io is the public API.
             # test_query = 'http://api.conceptnet.io/query?node=/c/en/dog&rel=/r/CapableOf'
-            # If an EC2 instance is made this will be the instance's url.
-            api_url = 'http://api.conceptnet.io/query?'
+            api_url = self.api_url
             # Form the concept net URI for the input word.
             cn_uri = self.ParseToURI('c', 'en', input_lower)
             # 'node' is a URI that must match either the start
@@ -132,17 +199,23 @@ class ExternalKnowledgeQuerier:
                     # Print query results
                     print("Query: " + query_uri_body)
                     print("Edges found: " + str(len(query_result['edges'])))
-                    for edge in query_result['edges']:
-                        if not edge_found:
-                            edge_found = True
-                        #print("    " + str(edge))
-                        # Store the edge in the concepts cache.
-                        self.AddEdgeToDatabase(edge, input_lower)
-                    # end for
+                    # Store all of this relationship's edges in one
+                    # transaction so they are committed once instead
+                    # of once per row.
+                    with self.database_manager.transaction():
+                        for edge in query_result['edges']:
+                            #print("    " + str(edge))
+                            # Store the edge in the concepts cache.
+                            self.AddEdgeToDatabase(edge, input_lower)
+                        # end for
+                    # end with
                     # Update total query count
                     self.query_count += 1
                 # end for
                 print("Total query count: " + str(self.query_count))
+                # New predicates may belong to concepts whose
+                # predicates are already cached.
+                self.predicate_cache.clear()
             # end try
             except:
                 e = sys.exc_info()[0]
@@ -183,9 +256,25 @@ class ExternalKnowledgeQuerier:
         predicate_dict['target'] = parsed_end['word']
         predicate_dict['weight'] = weight
         # Add the predicate to the database.
-        self.AddPredicateToDatabase(input_predicate, input_concept)
+        self.AddPredicateToDatabase(predicate_dict, input_concept)
         return None
     # end method AddEdgeToDatabase
+
+    # Make a predicates table row from an edge returned by the
+    # ConceptNet API.
+    # Returns (queried concept, source, relationship, target, weight),
+    # or None if either end of the edge is not an English concept.
+    def MakePredicateRow(self, input_edge, input_concept):
+        start = input_edge['start']['@id']
+        end = input_edge['end']['@id']
+        if not (start.startswith('/c/en/') and end.startswith('/c/en/')):
+            return None
+        source_concept = self.CleanWord(self.ParseFromURI(start)['word'])
+        relationship = self.ParseFromURI(input_edge['rel']['@id'])['word']
+        target_concept = self.CleanWord(self.ParseFromURI(end)['word'])
+        return (self.CleanWord(input_concept), source_concept, relationship,
+                target_concept, input_edge['weight'])
+    # end MakePredicateRow
     # Add a single predicate to the database. 
     # Input: predicate_in, the predicate dictionary to make a row
     #           for in the predicates table.
@@ -221,9 +310,9 @@ class ExternalKnowledgeQuerier:
         # Insert the predicate into the predicates table.
         # Make sure it's not a duplicate.
         # Fetch any rows that match the source, relationship, and target.
-        select_return = self.database_manager.select_row('predicates',
-                                                         ['source', 'relationship', 'target'],
-                                                         [source_concept, relationship, target_concept])
+        select_return = self.database_manager.select_predicate(source_concept,
+                                                               relationship,
+                                                               target_concept)
         # If any rows were found, that means this predicate is a duplicate.
         # If no rows were found, add this row to the database.
         if len(select_return) == 0:
@@ -239,13 +328,11 @@ class ExternalKnowledgeQuerier:
         # Clean the input
         concept = self.CleanWord(concept)
         # Check if the concept's in the concepts table.
-        select_return = self.database_manager.select_row('concepts',
-                                                         ['name'],
-                                                         [concept])
+        select_return = self.database_manager.select_concepts([concept])
         # If not, add it.
-        if len(select_return) < 0:
+        if len(select_return) == 0:
             row_data = [concept, queried]
-            self.database_manager.insert_row('concept', row_data)
+            self.database_manager.insert_row('concepts', row_data)
         return None
     # end MaybeAddConceptToDatabase
     
@@ -257,51 +344,109 @@ class ExternalKnowledgeQuerier:
     #       between the source and target concepts.
     #   'weight': float weight of the relationship from ConceptNet.
     def GetPredicates(self, concept_word):
-        # Clean the input
-        concept_word = self.CleanWord(concept_word)
-        predicates = list()
+        return self.GetPredicatesMany([concept_word])[self.CleanWord(concept_word)]
+    # end GetPredicates
 
-        # First, query concept net for the word in case
-        # it is not already in the database.
-        database_name = self.QueryConceptNet(concept_word)
+    # Get the predicates of many concept words at once.
+    # Returns a dictionary keyed by each cleaned concept word, whose
+    # values are the same dictionaries GetPredicates returns.
+    # Looks the concepts up with a few chunked IN (...) queries
+    # rather than two queries per concept.
+    # The dictionaries returned are copies, so the caller can change
+    # them without changing what is cached.
+    def GetPredicatesMany(self, concept_words):
+        # Clean the inputs, keeping them in order without duplicates.
+        cleaned_words = list(dict.fromkeys([self.CleanWord(concept_word)
+                                            for concept_word in concept_words]))
 
-        # The predicates for the concept are now in the
-        # database if there are any at all.
-        
-        # Return a dictionary with:
-        #   ['predicates']['name']
-        #       put (source, relationship, predicate, weight) into each
-        #       entry of the 'predicates' list
-        return_dict = dict()
-        return_dict['predicates'] = None
-        return_dict['name'] = database_name
-        # Get its predicates from the database.
-        sql_select_predicates = list()
-        # Get all rows where the concept is the source.
-        source_predicates = self.database_manager.select_row('predicates',
-                                                            ['source'],
-                                                            [database_name])
-        # Get all rows where the concept is the target.
-        target_predicates = self.database_manager.select_row('predicates',
-                                                            ['target'],
-                                                            [database_name])
-        sql_select_predicates.extend(source_predicates)
-        sql_select_predicates.extend(target_predicates)
-        # Each entry in the predicates list is a dictionary with:
-        #   source, relationship, target, weight
-        for sql_predicate in sql_select_predicates:
-            predicate_dict = dict()
-            predicate_dict['source'] = sql_predicate[1]
-            predicate_dict['relationship'] = sql_predicate[2]
-            predicate_dict['target'] = sql_predicate[3]
-            predicate_dict['weight'] = sql_predicate[4]
-            predicates.append(predicate_dict)
+        # Take whatever results are cached.
+        results = dict()
+        missing_words = list()
+        for cleaned_word in cleaned_words:
+            cached_result = self.predicate_cache.get(cleaned_word)
+            if cached_result == None:
+                missing_words.append(cleaned_word)
+            else:
+                results[cleaned_word] = cached_result
         # end for
+        if len(missing_words) == 0:
+            return dict([(cleaned_word, self.CopyPredicates(result))
+                         for cleaned_word, result in results.items()])
 
-        return_dict['predicates'] = predicates
-        
-        return return_dict
-    # end GetPredicates
+        # Query concept net for any word that has not been queried
+        # yet, in case it is not already in the database.
+        queried_words = set()
+        for concept_row in self.database_manager.select_concepts(missing_words):
+            if concept_row[1] == 1:
+                queried_words.add(concept_row[0])
+        # end for
+        unqueried_words = [cleaned_word for cleaned_word in missing_words
+                           if not cleaned_word in queried_words]
+        # Fetch them all at once rather than one after another.
+        if len(unqueried_words) > 0 and not self.offline:
+            if self.fetcher == None:
+                self.fetcher = ConceptNetFetcher(self)
+            self.fetcher.fetch_concepts(unqueried_words)
+            # New predicates may belong to concepts whose predicates
+            # are already cached, so look every word up again.
+            # Words that could not be fetched are still unqueried.
+            self.predicate_cache.clear()
+            missing_words = cleaned_words
+            queried_words = set()
+            for concept_row in self.database_manager.select_concepts(missing_words):
+                if concept_row[1] == 1:
+                    queried_words.add(concept_row[0])
+            # end for
+        # end if
+
+        # Make an empty result for every word, then sort each
+        # predicate row into the results of the words it matches.
+        # Rows where the word is the source come before rows where
+        # the word is the target.
+        for cleaned_word in missing_words:
+            results[cleaned_word] = {'name': cleaned_word,
+                                     'predicates': list()}
+        # end for
+        source_predicates = self.database_manager.select_predicates_by_source(missing_words)
+        for sql_predicate in source_predicates:
+            results[sql_predicate[1]]['predicates'].append(self.MakePredicateDict(sql_predicate))
+        # end for
+        target_predicates = self.database_manager.select_predicates_by_target(missing_words)
+        for sql_predicate in target_predicates:
+            results[sql_predicate[3]]['predicates'].append(self.MakePredicateDict(sql_predicate))
+        # end for
+
+        # Cache the new results, except for words that haven't been
+        # queried, e.g. ones that could not be fetched or were looked
+        # up offline, so they are looked up again next time.
+        for cleaned_word in missing_words:
+            if cleaned_word in queried_words:
+                self.predicate_cache.put(cleaned_word, results[cleaned_word])
+        # end for
+        # Return the results in the order the words were given.
+        results = dict([(cleaned_word, self.CopyPredicates(results[cleaned_word]))
+                        for cleaned_word in cleaned_words])
+
+        return results
+    # end GetPredicatesMany
+
+    # Copy a result of GetPredicates, along with its list of
+    # predicate dictionaries and each predicate dictionary.
+    def CopyPredicates(self, predicates_in):
+        return {'name': predicates_in['name'],
+                'predicates': [dict(predicate_dict) for predicate_dict
+                               in predicates_in['predicates']]}
+    # end CopyPredicates
+
+    # Make a predicate dictionary from a row of the predicates table.
+    def MakePredicateDict(self, sql_predicate):
+        predicate_dict = dict()
+        predicate_dict['source'] = sql_predicate[1]
+        predicate_dict['relationship'] = sql_predicate[2]
+        predicate_dict['target'] = sql_predicate[3]
+        predicate_dict['weight'] = sql_predicate[4]
+        return predicate_dict
+    # end MakePredicateDict
 
     # Parse a concept-net URI into its three constituent parts:
     # /type/language/word
@@ -346,22 +491,52 @@ class ExternalKnowledgeQuerier:
     # end CleanWord
 
     # Given a concept, get its embedding value. 
+    # If the database has packed embeddings, returns a numpy array
+    # of float32 values. Otherwise returns a tuple of the values in
+    # the 300-column embeddings table.
     def GetEmbedding(self, concept_word):
-        # First, clean the word so we can look it up accurately
-        cleaned_word = self.CleanWord(concept_word)
-        # Next, search for it in the embeddings table.
-        select_result = self.database_manager.select_row('embeddings',
-                                                         ['name'],
-                                                         [cleaned_word])
-        # DEBUG
-        #print("embedding obtained for " + cleaned_word + ", select result length: " + str(len(select_result)))
-        embedding = list()
-        if len(select_result) > 0:
-            # If there is an embedding from the results, set it.
-            embedding = select_result[0][1:]
-        # If no embedding was found, return an empty list.
-        return embedding
+        return self.GetEmbeddingsMany([concept_word])[self.CleanWord(concept_word)]
     # end GetEmbedding
+
+    # Given many concepts, get all of their embedding values at once.
+    # Returns a dictionary keyed by each cleaned concept word. Words
+    # without an embedding map to an empty list.
+    def GetEmbeddingsMany(self, concept_words):
+        cleaned_words = [self.CleanWord(concept_word)
+                         for concept_word in concept_words]
+        # Take whatever embeddings are cached.
+        embeddings = dict()
+        missing_embeddings = dict()
+        for cleaned_word in cleaned_words:
+            if cleaned_word in embeddings or cleaned_word in missing_embeddings:
+                continue
+            cached_embedding = self.embedding_cache.get(cleaned_word)
+            if cached_embedding is None:
+                missing_embeddings[cleaned_word] = list()
+            else:
+                embeddings[cleaned_word] = cached_embedding
+        # end for
+        if len(missing_embeddings) == 0:
+            return embeddings
+        missing_words = list(missing_embeddings.keys())
+        # Read packed embeddings if the database has them.
+        if self.database_manager.has_embedding_vectors():
+            for select_row in self.database_manager.select_embedding_vectors(missing_words):
+                missing_embeddings[select_row[0]] = self.database_manager.decode_embedding(select_row[1])
+            # end for
+        else:
+            for select_row in self.database_manager.select_embeddings(missing_words):
+                # Take the first row found for each word.
+                if len(missing_embeddings[select_row[0]]) == 0:
+                    missing_embeddings[select_row[0]] = select_row[1:]
+            # end for
+        # end if
+        for cleaned_word, embedding in missing_embeddings.items():
+            self.embedding_cache.put(cleaned_word, embedding)
+        # end for
+        embeddings.update(missing_embeddings)
+        return embeddings
+    # end GetEmbeddingsMany
                 
 def main():
     print ("This is the main in external_knowledge_querier")
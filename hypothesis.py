@@ -1,3 +1,4 @@
+from collections import Counter
 
 # A class representing a hypothesis about a relationship
 # in the knowledge graph. 
@@ -49,9 +50,9 @@ class Hypothesis:
     # as its premise.
     subsequent_hypotheses = list()
 
-    # A list with the hypotheses that this hypothesis
+    # A set with the hypotheses that this hypothesis
     # mutually contradicts with.
-    contradicting_hypotheses = list()
+    contradicting_hypotheses = set()
 
     
     
@@ -71,7 +72,7 @@ class Hypothesis:
 
         self.evidence_score = 0
         
-        self.contradicting_hypotheses = list()
+        self.contradicting_hypotheses = set()
 
         self.subsequent_hypotheses = list()
     # end init
@@ -120,6 +121,11 @@ class Hypothesis:
             return False
     # end eq
 
+    # Hash by ID too, so hypotheses that are equal hash the same.
+    def __hash__(self):
+        return hash(self.hypothesis_id)
+    # end hash
+
     # Whether the given other hypothesis is functionally
     # the same as this hypothesis.
     # This is true if:
@@ -158,41 +164,19 @@ class Hypothesis:
         elif not self.target_node.node_id == other_hypothesis.target_node.node_id:
             return False
         else:
-            # Keep track of which pieces of evidence in
-            # the other hypothesis have already been matched.
-            matched_other_indices = list()
-            # Keep track of which pieces of evidence in this hypothesis
-            # have already been matched.
-            matched_indices = list()
-            for index, evidence in self.evidence.items():
-                #print("evidence: " + str(evidence))
-                for other_index, other_evidence in other_hypothesis.get_evidence().items():
-                    #print("other evidence: " + str(other_index) + "|" + str(other_evidence))
-                    if other_index in matched_other_indices:
-                        #print("matched prior, skipping")
-                        continue
-                    # We have found a matching piece of evidence.
-                    # Note it and stop searching through the other
-                    # hypothesis' evidence.
-                    elif evidence == other_evidence:
-                        #print("evidence matches")
-                        matched_other_indices.append(other_index)
-                        matched_indices.append(index)
-                        # If every index in the other hypothesis has
-                        # been matched, return True.
-                        #print("len matched indices: " + str(len(matched_other_indices)))
-                        #print("len other_hypothesis evidence: " + str(len(other_hypothesis.get_evidence())))
-                        if len(matched_other_indices) == len(other_hypothesis.get_evidence().items()):
-                            return True
-                        break
-                    # end elif
-                # end for
-            # end for
-            # If we have reached this point, check that all
-            # of this hypothesis' pieces of evidence have
-            # found a match. If not, then the two
-            # hypotheses are not functionally equal
-            if not len(matched_indices) == len(self.evidence.items()):
+            # Count each hypothesis' pieces of evidence by their
+            # fingerprints. The hypotheses are functionally equal if
+            # all of this hypothesis' evidence is found in the other's,
+            # or the other has evidence and all of it is found in this
+            # hypothesis'.
+            evidence_counts = Counter([evidence.get_fingerprint() for evidence
+                                       in self.evidence.values()])
+            other_evidence_counts = Counter([evidence.get_fingerprint() for evidence
+                                             in other_hypothesis.get_evidence().values()])
+            other_evidence_matched = (len(other_evidence_counts) > 0
+                                      and len(other_evidence_counts - evidence_counts) == 0)
+            evidence_matched = len(evidence_counts - other_evidence_counts) == 0
+            if not (other_evidence_matched or evidence_matched):
                 return False
         # end else
         # If we have reached this point, then every single other
@@ -276,12 +260,8 @@ class Hypothesis:
 
     # Add a new contradicting hypothesis.
     def add_contradicting_hypothesis(self, hypothesis_in):
-        # Don't add duplicate entries.
-        for hypothesis in self.contradicting_hypotheses:
-            if hypothesis_in == hypothesis:
-                return
-        # end for
-        self.contradicting_hypotheses.append(hypothesis_in)
+        # Being a set, it won't take duplicate entries.
+        self.contradicting_hypotheses.add(hypothesis_in)
         return
     # Get the set of contradicting hypotheses
     def get_contradicting_hypotheses(self):
@@ -321,8 +301,117 @@ class Hypothesis:
         self.subsequent_hypotheses.append(hypothesis)
         return
 
+    # Merge another hypothesis with the same conclusion into this one.
+    # Each piece of the other hypothesis' evidence is added to this
+    # hypothesis unless this hypothesis already has it.
+    # Returns True if any evidence was added.
+    def merge_evidence(self, other_hypothesis):
+        non_duplicates_found = False
+        existing_fingerprints = set([evidence.get_fingerprint() for evidence
+                                     in self.evidence.values()])
+        for index_1, evidence_to_add in other_hypothesis.get_evidence().items():
+            # Do NOT add the evidence if it already exists in
+            # the hypothesis it is being merged into.
+            if evidence_to_add.get_fingerprint() in existing_fingerprints:
+                continue
+            non_duplicates_found = True
+            self.add_evidence(evidence_to_add)
+            existing_fingerprints.add(evidence_to_add.get_fingerprint())
+        # end for
+        return non_duplicates_found
+    # end merge_evidence
+
 # end class Hypothesis
 
+# A collection of hypotheses, each with a distinct conclusion.
+# Adding a hypothesis whose conclusion is already in the set merges
+# its evidence into the existing hypothesis instead.
+# Hypotheses are indexed by the pair of nodes and relationship of
+# their conclusion, so adding one only compares it to hypotheses
+# about the same pair of nodes rather than to the whole set.
+# Iterates over hypotheses in the order they were added, like a list.
+class HypothesisSet:
+    # The hypotheses in the set, in the order they were added.
+    hypotheses = list()
+
+    # The hypotheses about each pair of nodes and relationship.
+    #   Key is (smaller node id, larger node id, relationship).
+    #   Value is a list of the hypotheses with that key, in the order
+    #   they were added.
+    buckets = dict()
+
+    # Make a set from a list of hypotheses, which are assumed to
+    # have distinct conclusions already.
+    def __init__(self, hypotheses_in=None):
+        self.hypotheses = list()
+        self.buckets = dict()
+        if not hypotheses_in == None:
+            for hypothesis in hypotheses_in:
+                self.append(hypothesis)
+            # end for
+        # end if
+    # end __init__
+
+    def __len__(self):
+        return len(self.hypotheses)
+    # end __len__
+
+    def __iter__(self):
+        return iter(self.hypotheses)
+    # end __iter__
+
+    def __getitem__(self, index):
+        return self.hypotheses[index]
+    # end __getitem__
+
+    # Get the key of the bucket a hypothesis goes in.
+    # The key is the same whichever way around the nodes are.
+    def get_key(self, hypothesis):
+        source_id = hypothesis.source_node.node_id
+        target_id = hypothesis.target_node.node_id
+        if target_id < source_id:
+            return (target_id, source_id, hypothesis.relationship)
+        return (source_id, target_id, hypothesis.relationship)
+    # end get_key
+
+    # Add a hypothesis to the end of the set without checking
+    # whether its conclusion is already in the set.
+    def append(self, hypothesis):
+        self.hypotheses.append(hypothesis)
+        self.buckets.setdefault(self.get_key(hypothesis), list()).append(hypothesis)
+    # end append
+
+    # Add a hypothesis to the set.
+    # If an existing hypothesis is functionally equal to it, the set
+    # is unchanged. Otherwise, if an existing hypothesis has the same
+    # source node, target node, and relationship, the new hypothesis'
+    # evidence is merged into it. Otherwise, the new hypothesis is
+    # added to the end of the set.
+    # Returns True if the set changed, False otherwise.
+    def add(self, hypothesis_to_add):
+        # Only hypotheses about the same pair of nodes and
+        # relationship can be equal or have the same conclusion.
+        # Check them in the order they were added.
+        for existing_hypothesis in self.buckets.get(self.get_key(hypothesis_to_add), list()):
+            if existing_hypothesis.is_functionally_equal_to(hypothesis_to_add):
+                return False
+            if (existing_hypothesis.source_node.node_id == hypothesis_to_add.source_node.node_id
+                and existing_hypothesis.target_node.node_id == hypothesis_to_add.target_node.node_id):
+                existing_hypothesis.merge_evidence(hypothesis_to_add)
+                return True
+            # end if
+        # end for
+        self.append(hypothesis_to_add)
+        return True
+    # end add
+
+    # Get the hypotheses in the set as a list, in the order they
+    # were added.
+    def get_list(self):
+        return list(self.hypotheses)
+    # end get_list
+# end class HypothesisSet
+
 # A class representing a single piece of evidence
 # either supporting or refuting a hypothesis.
 class Evidence:
@@ -382,6 +471,11 @@ class Evidence:
     # A text reason for this evidence's rejection.
     rejection_explanation = ""
 
+    # A hashable key that is the same for any two pieces of evidence
+    # with the same type and data. Made by get_fingerprint the first
+    # time it's needed. None until then.
+    fingerprint = None
+
     def __init__(self):
         self.evidence_type = ""
         self.data = list()
@@ -391,59 +485,63 @@ class Evidence:
         self.vital = False
         self.rejected = False
         self.rejection_explanation = ""
+        self.fingerprint = None
     # end init
 
-    # Evidence is the same if it has data with the same
-    # names and the values of that data are the same
-    # as well.
+    # Evidence is the same if it has the same type and data
+    # with the same names and values, in any order.
     def __eq__(self, other):
         # Check that they're both Evidence first.
         if not isinstance(other, Evidence):
             return False
-        # Next, check that they're the same type
-        # of evidence.
-        if not self.evidence_type == other.evidence_type:
-            return False
-
-        # Check that all the data matches.
-        remaining_other_data = list()
-        for datum in other.get_data():
-            remaining_other_data.append(datum)
-        for datum in self.data:
-            # Look for the corresponding datum
-            # in the other object's data.
-            # If it does not exist,
-            # these are not the same evidence.
-            datum_matched = False
-            other_datum_matched = None
-            for other_datum in remaining_other_data:
-                # If it exists, there has been a match.
-                if self.datum_equals(datum, other_datum):
-                    datum_matched = True
-                    other_datum_matched = other_datum
-                    break
-                # end if
-            # end for
-            # On a match, remove the other datum from the list
-            # of remaining other data and move on.
-            if datum_matched:
-                remaining_other_data.remove(other_datum_matched)
-            # If there was NOT a match, then the evidences are
-            # not the same.
-            else:
-                return False
-        # end for
-
-        # If we have reached this point, all datum has
-        # a corresponding items in the other piece of
-        # evidence and all of the data matches.
-        # The two pieces of evidence are the same. 
-        return True
+        return self.get_fingerprint() == other.get_fingerprint()
     # end eq
 
+    def __hash__(self):
+        return hash(self.get_fingerprint())
+    # end hash
+
+    # Get this evidence's fingerprint: its type and a sorted tuple
+    # of its data's names and values, with nodes, edges, and
+    # hypotheses stood in for by what identifies them.
+    def get_fingerprint(self):
+        if self.fingerprint == None:
+            data_keys = [(datum['name'], self.get_value_key(datum['value']))
+                         for datum in self.data]
+            data_keys.sort(key=repr)
+            self.fingerprint = (self.evidence_type, tuple(data_keys))
+        return self.fingerprint
+    # end get_fingerprint
+
+    # Get a hashable key for a piece of data's value that is the same
+    # for values that are equal.
+    #   Hypotheses are identified by their ID.
+    #   Knowledge graph nodes are identified by their ID.
+    #   Knowledge graph edges have no ID, so each edge object is its
+    #   own identity.
+    #   Lists, tuples, and dictionaries are identified by the keys of
+    #   their contents.
+    def get_value_key(self, value):
+        if isinstance(value, Hypothesis):
+            return ('hypothesis', value.hypothesis_id)
+        elif hasattr(value, 'node_id'):
+            return ('node', value.node_id)
+        elif hasattr(value, 'source_node') and hasattr(value, 'target_node'):
+            return ('edge', id(value))
+        elif isinstance(value, dict):
+            return ('dict', tuple(sorted([(key, self.get_value_key(item))
+                                          for key, item in value.items()],
+                                         key=repr)))
+        elif isinstance(value, (list, tuple)):
+            return ('list', tuple([self.get_value_key(item) for item in value]))
+        return value
+    # end get_value_key
+
     # Add data to this piece of evidence. 
     def add_data(self, name, data_in):
         self.data.append({'name': name, 'value': data_in})
+        # The fingerprint has to be made again with the new data.
+        self.fingerprint = None
         return
     # Get the full set of data.
     def get_data(self):
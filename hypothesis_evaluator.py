@@ -1,13 +1,16 @@
+import time
 import itertools
 from collections import deque
 
 import networkx as nx
+import numpy as np
 
 from scipy import spatial
 
 from knowledge_graph import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge, NodeFactory
 from hypothesis import Hypothesis, Evidence
 from constants import Constants as const
+from mwis_solver import MWISSolver
 
 from output_writer import OutputWriter
 
@@ -18,6 +21,10 @@ import argparse
 # Object to contain functions for evaluating
 # hypotheses. 
 class HypothesisEvaluator:
+
+    # How many rows of the cosine similarity matrix to compute at
+    # once when calculating interrelatedness.
+    similarity_chunk_size = 1024
     
     def __init__(self, args_in):
         self.args = args_in
@@ -33,6 +40,13 @@ class HypothesisEvaluator:
     def multi_objective_optimization(self, kg_in, hypothesis_set_in):
         # DEBUG:
         print("Calling multi-objective-optimization")
+        # The time budget counts from here. It covers estimating the
+        # hypotheses' scores and searching for the best set, but only
+        # the search stops early when it runs out. Estimates are
+        # always finished, since the search needs every weight, and
+        # the chosen set is always filtered and scored in full
+        # afterwards, outside the budget.
+        start_time = time.perf_counter()
         
         # For writing intermediary outputs
         output_writer = OutputWriter(self.args)
@@ -46,14 +60,16 @@ class HypothesisEvaluator:
         always_acceptable_hypotheses = list()
         # A list of hypotheses that have at least one contradiction each.
         contradicting_hypotheses = list()
+        # The hypotheses sorted so far.
+        sorted_hypotheses = set()
         # Sort each hypothesis based on whether or not they
         # contradict with at least one other hypothesis. 
         for hypothesis in hypothesis_set_in:
             # Check if this hypothesis has already been
             # sorted. If so, skip it.
-            if (hypothesis in always_acceptable_hypotheses
-                or hypothesis in contradicting_hypotheses):
+            if hypothesis in sorted_hypotheses:
                 continue
+            sorted_hypotheses.add(hypothesis)
 
             # Check if it has any contradicting hypotheses.
             # If so, add it to the list of hypotheses with
@@ -69,64 +85,80 @@ class HypothesisEvaluator:
         h_score_by_id = dict()
         # For each hypothesis with a contradiction, estimate their
         # scores and make a dictionary of hypothesis IDs to scores.
+        # All the estimates share one cache, so the knowledge graph's
+        # statistics are only counted once and hypotheses premised on
+        # several others are only estimated once.
+        estimate_cache = self.make_estimate_cache(kg_in)
         for hypothesis in contradicting_hypotheses:
-            est_score = self.estimate_hypothesis_score(hypothesis, kg_in)
+            est_score = self.estimate_hypothesis_score(hypothesis, kg_in, estimate_cache)
             h_score_by_id[hypothesis.hypothesis_id] = est_score
             print("Estimated score of hypothesis " + str(hypothesis.hypothesis_id) + ": " + str(est_score))
         # end for
 
         # Now that we have an estimated score for each hypothesis,
-        # formulate the hypotheses with contradictions into a networkx graph.
-        # Each node is a hypothesis.
-        # Form an edge between the nodes of every hypothesis pair
-        # that does not contradict.
-
-        # First, make a networkx graph with the hypotheses
-        # as nodes, keyed by their hypothesis IDs.
-        # The weight will be the hypothesis' estimated score.
-        # Note: Graph() makes an undirected graph.
-        nx_graph = nx.Graph()
+        # find the maximum weight independent set of the graph of
+        # contradictions between them: the set of hypotheses with
+        # the highest total estimated score where no two hypotheses
+        # contradict.
+        # Each vertex is a hypothesis ID, weighted by the hypothesis'
+        # estimated score. Because weights must be integers, we round
+        # each score. Hypotheses with weights of 0 or less are
+        # never chosen.
+        h_weight_by_id = dict()
+        contradiction_graph = dict()
         for hypothesis in contradicting_hypotheses:
-            # Because weights must be integers, we multiply each
-            # score by 1000 and round. 
-            int_score = round(h_score_by_id[hypothesis.hypothesis_id])
-            nx_graph.add_node(hypothesis.hypothesis_id,
-                              weight = int_score)
+            h_weight_by_id[hypothesis.hypothesis_id] = round(h_score_by_id[hypothesis.hypothesis_id])
+            contradiction_graph[hypothesis.hypothesis_id] = [contradicting_hypothesis.hypothesis_id
+                                                             for contradicting_hypothesis
+                                                             in hypothesis.contradicting_hypotheses]
         # end for
-
-        # Go through every hypothesis with at least one contradiction
-        for h1 in contradicting_hypotheses:
-            # Check every hypothesis with a contradiction
-            for h2 in contradicting_hypotheses:
-                # Don't compare the hypothesis to itself.
-                if h1.hypothesis_id == h2.hypothesis_id:
-                    continue
-                # Check if the hypotheses contradict.
-                if not h1.contradicts(h2):
-                    # If not, make an edge between them in the
-                    # networkx graph.
-                    #nx_graph.edges[node_id, edge.target_node.node_id]['relationship'] = edge.relationship
-                    nx_graph.add_edge(h1.hypothesis_id,
-                                     h2.hypothesis_id)
-                # end if not
-            # end for
+        # If there is a time budget, the solver gets whatever is left
+        # of it and returns the best set it found when it runs out.
+        total_time_budget = float(self.args.optimize_time_budget)
+        print("Estimated hypothesis scores in " +
+              str(round(time.perf_counter() - start_time, 3)) + "s")
+        if total_time_budget >= 0:
+            total_time_budget = max(0, total_time_budget - (time.perf_counter() - start_time))
+        mwis_solver = MWISSolver(int(self.args.mwis_exact_size),
+                                 float(self.args.mwis_time_budget),
+                                 total_time_budget,
+                                 self.args.optimize_checkpoint)
+        # Resume from the checkpointed set, if there is one.
+        initial_ids = list()
+        if not self.args.optimize_checkpoint == '':
+            initial_ids = mwis_solver.load_checkpoint(self.args.optimize_checkpoint)
+            if len(initial_ids) > 0:
+                print("Resuming from " + str(len(initial_ids)) + " checkpointed hypotheses in " +
+                      self.args.optimize_checkpoint)
+        # end if
+        mwis_ids, mwis_weight, component_reports = mwis_solver.solve(h_weight_by_id,
+                                                                     contradiction_graph,
+                                                                     initial_ids)
+        print("incumbent history:")
+        for history_entry in mwis_solver.incumbent_history:
+            print("  " + str(round(history_entry['time'], 3)) + "s: weight " +
+                  str(history_entry['weight']))
+        # end for
+        print("contradiction graph: " + str(len(contradiction_graph)) + " hypotheses in " +
+              str(len(component_reports)) + " components")
+        for component_report in component_reports:
+            # Don't report every lone hypothesis.
+            if component_report['size'] < 2:
+                continue
+            print("  component of " + str(component_report['size']) + " hypotheses: " +
+                  component_report['method'] + " weight " + str(component_report['weight']) +
+                  ", upper bound " + str(component_report['upper_bound']) +
+                  ", gap " + str(round(component_report['gap'] * 100, 2)) + "%")
         # end for
+        print("max weight independent set: " + str(mwis_ids) + ", weight " + str(mwis_weight))
+        search_end_time = time.perf_counter()
+        print("Chose hypothesis set in " + str(round(search_end_time - start_time, 3)) + "s")
 
-        # Get the maximum weight clique of the graph of hypotheses
-        # we just formed.
-        # Automatically uses the 'weight' attribute for each node.
-        # max_weight_clique returns:
-        #   0: a list of the node names in the max clique
-        #   1: the weight of the max clique
-        max_clique = nx.max_weight_clique(nx_graph)
-        print("hypothesis graph: " + str(nx_graph))
-        print("max clique: " + str(max_clique))
-
-        # Grab all the hypotheses in the clique. These are the
-        # hypotheses in the maximum weighted independent set of
+        # Grab all the hypotheses in the independent set. These are
+        # the hypotheses in the maximum weighted independent set of
         # hypotheses with contradictions.
         mwis_hypotheses = list()
-        for h_id in max_clique[0]:
+        for h_id in mwis_ids:
             mwis_hypotheses.append(hypotheses_by_id[h_id])
         # end for
 
@@ -154,6 +186,9 @@ class HypothesisEvaluator:
         final_hypothesis_set = new_accepted
         # Score this hypothesis set.
         score = self.calculate_objective_score(kg_in, final_hypothesis_set)
+        # Filtering and scoring aren't bounded by the time budget.
+        print("Filtered and scored hypothesis set in " +
+              str(round(time.perf_counter() - search_end_time, 3)) + "s, outside the time budget")
         # Make the new scored set
         scored_set = dict()
         scored_set['set'] = final_hypothesis_set
@@ -403,18 +438,31 @@ class HypothesisEvaluator:
     def calculate_interrelatedness(self, kg_in):
         interrelatedness = 0
         sum_average_similarity = 0
-        node_count = 0
-        # Go through each node in the knowledge graph
-        for node_id, node in kg_in.nodes.items():
-            # Only count the average similarity of concept nodes that
-            # are formally part of the knowledge graph.
-            if not (node.node_type == 'concept' and
-                    node.graph_member):
-                continue
-            # Get its average similarity in the graph and
-            # add it to the sum.
-            sum_average_similarity += self.average_similarity(node, kg_in)
-            node_count += 1
+        node_ids, embedding_matrix = self.stack_member_embeddings(kg_in)
+        node_count = len(node_ids)
+        # If some concept has no embedding, fall back to comparing
+        # the nodes one pair at a time.
+        if embedding_matrix is None:
+            for node_id in node_ids:
+                sum_average_similarity += self.average_similarity_pairwise(kg_in.nodes[node_id],
+                                                                           kg_in)
+            # end for
+            interrelatedness = sum_average_similarity / node_count
+            return interrelatedness
+        # end if
+        # Each node's average similarity is the sum of its row of the
+        # cosine similarity matrix, minus its similarity to itself,
+        # over the number of other nodes. Compute the matrix a block
+        # of rows at a time so its memory stays bounded.
+        for start in range(0, node_count, self.similarity_chunk_size):
+            block = embedding_matrix[start:start + self.similarity_chunk_size]
+            block_similarities = block @ embedding_matrix.T
+            self_similarities = block_similarities[np.arange(len(block)),
+                                                   np.arange(start, start + len(block))]
+            row_sums = block_similarities.sum(axis=1) - self_similarities
+            for row_sum in row_sums:
+                sum_average_similarity += float(row_sum) / (node_count - 1)
+            # end for
         # end for
         # Average the average similarities to get the interrelatedness
         interrelatedness = sum_average_similarity / node_count
@@ -424,6 +472,23 @@ class HypothesisEvaluator:
     # Calculate the average similarity of a single knowledge graph
     # node to the rest of the knowledge graph it's in.
     def average_similarity(self, node_in, kg_in):
+        node_ids, embedding_matrix = self.stack_member_embeddings(kg_in)
+        if embedding_matrix is None or len(node_in.embedding) == 0:
+            return self.average_similarity_pairwise(node_in, kg_in)
+        # Don't compare the node to itself
+        other_rows = [i for i, node_id in enumerate(node_ids)
+                      if not node_id == node_in.node_id]
+        node_embedding = np.asarray(node_in.embedding, dtype=np.float64)
+        node_embedding = node_embedding / np.linalg.norm(node_embedding)
+        similarities = embedding_matrix[other_rows] @ node_embedding
+        average_similarity = float(similarities.sum()) / len(other_rows)
+        return average_similarity
+    # end average_similarity
+
+    # Calculate the average similarity of a single knowledge graph
+    # node to the rest of the knowledge graph it's in, one pair
+    # of nodes at a time.
+    def average_similarity_pairwise(self, node_in, kg_in):
         count = 0
         sum_similarity = 0
         for node_id, node in kg_in.nodes.items():
@@ -443,7 +508,34 @@ class HypothesisEvaluator:
         # end for
         average_similarity = sum_similarity / count
         return average_similarity
-    # end calculate_relatedness
+    # end average_similarity_pairwise
+
+    # Stack the embeddings of the concept nodes that are formally
+    # part of a knowledge graph into one matrix, each row scaled
+    # to unit length so that a matrix product gives cosine
+    # similarities.
+    # Returns the node ids in row order and the matrix. The matrix
+    # is None if any of the nodes has no embedding.
+    def stack_member_embeddings(self, kg_in):
+        node_ids = list()
+        embeddings = list()
+        for node_id, node in kg_in.nodes.items():
+            if not (node.node_type == 'concept' and
+                    node.graph_member):
+                continue
+            node_ids.append(node_id)
+            embeddings.append(node.embedding)
+        # end for
+        if any(len(embedding) == 0 for embedding in embeddings):
+            print("Error in hypothesis_evaluator --> stack_member_embeddings; node has no embeddings.")
+            return node_ids, None
+        # end if
+        # Work in float64, like SciPy's cosine distance does.
+        embedding_matrix = np.array(embeddings, dtype=np.float64)
+        embedding_matrix = embedding_matrix.reshape(len(node_ids), -1)
+        embedding_matrix /= np.linalg.norm(embedding_matrix, axis=1, keepdims=True)
+        return node_ids, embedding_matrix
+    # end stack_member_embeddings
 
     # Calculate the cosine similarity between two knowledge graph
     # nodes based on their embeddings from ConceptNet.
@@ -467,18 +559,110 @@ class HypothesisEvaluator:
     # to the overall score.
     # Takes the hypothesis itself, as well as knowledge graph it would be
     # applied to (without any other hypotheses).
-    def estimate_hypothesis_score(self, hypothesis_in, kg_in):
-        estimated_score = 0
+    # A hypothesis' estimate is its own evidence and density scores
+    # plus the estimates of its valid subsequent hypotheses.
+    # Hypotheses premised on each other through a cycle are estimated
+    # together, as one group: each of them gets the group's own scores
+    # plus the estimates of the group's subsequent hypotheses outside
+    # the group. So an estimate doesn't depend on which hypothesis
+    # was estimated first.
+    # To estimate many hypotheses' scores over the same knowledge
+    # graph, pass them all the same estimate cache from
+    # make_estimate_cache, so the graph's base statistics are only
+    # counted once and each hypothesis is only estimated once.
+    def estimate_hypothesis_score(self, hypothesis_in, kg_in, estimate_cache=None):
+        if estimate_cache == None:
+            estimate_cache = self.make_estimate_cache(kg_in)
+        # If this hypothesis has already been estimated, use that.
+        if not hypothesis_in.hypothesis_id in estimate_cache['scores']:
+            self.estimate_group_scores(hypothesis_in, estimate_cache)
+        return estimate_cache['scores'][hypothesis_in.hypothesis_id]
+    # end estimate_hypothesis_score
 
+    # Estimate the scores of a hypothesis and of every hypothesis
+    # premised on it, directly or not, that hasn't been estimated yet.
+    # Finds the groups of hypotheses premised on each other with
+    # Tarjan's strongly connected components algorithm. Each group
+    # is finished after every group it leads to, so their estimates
+    # are ready when it is estimated.
+    def estimate_group_scores(self, hypothesis_in, estimate_cache):
+        search_order = estimate_cache['search_order']
+        low_links = estimate_cache['low_links']
+        group_stack = estimate_cache['group_stack']
+        hypothesis_id = hypothesis_in.hypothesis_id
+        search_order[hypothesis_id] = len(search_order)
+        low_links[hypothesis_id] = search_order[hypothesis_id]
+        group_stack.append(hypothesis_in)
+        estimate_cache['on_group_stack'].add(hypothesis_id)
+        for hypothesis in hypothesis_in.subsequent_hypotheses:
+            # Only estimate subsequent hypotheses that are still valid.
+            if not hypothesis.is_valid():
+                continue
+            # Already estimated, as part of a finished group.
+            if hypothesis.hypothesis_id in estimate_cache['scores']:
+                continue
+            if not hypothesis.hypothesis_id in search_order:
+                self.estimate_group_scores(hypothesis, estimate_cache)
+                low_links[hypothesis_id] = min(low_links[hypothesis_id],
+                                               low_links[hypothesis.hypothesis_id])
+            elif hypothesis.hypothesis_id in estimate_cache['on_group_stack']:
+                # Premised back on a hypothesis still being estimated,
+                # so both are in the same group.
+                low_links[hypothesis_id] = min(low_links[hypothesis_id],
+                                               search_order[hypothesis.hypothesis_id])
+            # end elif
+        # end for
+        # If this hypothesis is the first of its group to be reached,
+        # the group is every hypothesis above it on the stack.
+        if not low_links[hypothesis_id] == search_order[hypothesis_id]:
+            return
+        group = list()
+        while True:
+            hypothesis = group_stack.pop()
+            estimate_cache['on_group_stack'].remove(hypothesis.hypothesis_id)
+            group.append(hypothesis)
+            if hypothesis.hypothesis_id == hypothesis_id:
+                break
+        # end while
+        # Add the scores up in the same order however the group was
+        # reached.
+        group.sort(key=lambda hypothesis: hypothesis.hypothesis_id)
+        group_ids = set([hypothesis.hypothesis_id for hypothesis in group])
+        if len(group) > 1:
+            print("Warning: hypotheses " + str(sorted(group_ids)) +
+                  " are premised on each other. Estimating them together.")
+        group_score = 0
+        for hypothesis in group:
+            group_score += self.estimate_own_score(hypothesis, estimate_cache)
+        # end for
+        # Add the estimates of the group's subsequent hypotheses outside
+        # the group, which are all finished.
+        for hypothesis in group:
+            for subsequent_hypothesis in hypothesis.subsequent_hypotheses:
+                if (not subsequent_hypothesis.is_valid()
+                    or subsequent_hypothesis.hypothesis_id in group_ids):
+                    continue
+                group_score += estimate_cache['scores'][subsequent_hypothesis.hypothesis_id]
+            # end for
+        # end for
+        for hypothesis in group:
+            estimate_cache['scores'][hypothesis.hypothesis_id] = group_score
+        # end for
+    # end estimate_group_scores
+
+    # Estimate a hypothesis' own contribution to the overall score,
+    # without any hypotheses premised on it: the sum of its estimated
+    # evidence score and its estimated density score.
+    def estimate_own_score(self, hypothesis_in, estimate_cache):
         # Estimate evidence contribution.
         est_evidence_score = self.args.evidence_weight * hypothesis_in.evidence_score
 
         # Estimate density contribution.
         # Get the base density of the knowledge graph without any
         # hypotheses.
-        base_node_count = len(kg_in.nodes)
-        base_edge_count = self.graph_edge_count(kg_in)
-        base_density = self.calculate_density(base_node_count, base_edge_count)
+        base_node_count = estimate_cache['base_node_count']
+        base_edge_count = estimate_cache['base_edge_count']
+        base_density = estimate_cache['base_density']
 
         # Estimate how many nodes and edges this hypothesis would add to
         # the knowledge graph.
@@ -507,26 +691,32 @@ class HypothesisEvaluator:
         # Multiply this by the weight of density scores. 
         est_density_score = self.args.density_weight * density_contribution
 
-        est_subsequent_score = 0
-        # See if there are any other hypotheses premised
-        # on this hypothesis. If so, estimate their score
-        # contributions as well and add them to
-        # this hypothesis'
-        for hypothesis in hypothesis_in.subsequent_hypotheses:
-            # Only add the subsequent hypothesis' estimated score to
-            # this estimated score if it is still valid. 
-            if hypothesis.is_valid():
-                est_subsequent_score += self.estimate_hypothesis_score(hypothesis, kg_in)
-        # end for
-
-        # The final estimated score is the sum of:
-        #   the estimated evidence score
-        #   the estimated density score
-        #   the estimated scores of any subsequent hypotheses
-        estimated_score = est_evidence_score + est_density_score + est_subsequent_score
-
-        return estimated_score
-    # end estimate_hypothesis_score
+        return est_evidence_score + est_density_score
+    # end estimate_own_score
+
+    # Make a cache for estimate_hypothesis_score over the given
+    # knowledge graph. It is a dictionary of:
+    #   'base_node_count', 'base_edge_count', 'base_density': the
+    #       knowledge graph's statistics without any hypotheses.
+    #   'scores': the estimated score of each hypothesis estimated so
+    #       far, keyed by hypothesis ID.
+    #   'search_order', 'low_links', 'group_stack', 'on_group_stack':
+    #       estimate_group_scores' search state.
+    # The cache is only good while the knowledge graph and the
+    # hypotheses' evidence don't change.
+    def make_estimate_cache(self, kg_in):
+        estimate_cache = dict()
+        estimate_cache['base_node_count'] = len(kg_in.nodes)
+        estimate_cache['base_edge_count'] = self.graph_edge_count(kg_in)
+        estimate_cache['base_density'] = self.calculate_density(estimate_cache['base_node_count'],
+                                                                estimate_cache['base_edge_count'])
+        estimate_cache['scores'] = dict()
+        estimate_cache['search_order'] = dict()
+        estimate_cache['low_links'] = dict()
+        estimate_cache['group_stack'] = list()
+        estimate_cache['on_group_stack'] = set()
+        return estimate_cache
+    # end make_estimate_cache
 
     # Calculate density for a knowldge graph with the
     # given number of nodes and the given number of edges.
@@ -554,22 +744,48 @@ class HypothesisEvaluator:
 
     # Given a set of hypotheses, determine which ones
     # contradict with one another. Each hypothesis
-    # contains a list with the IDs of the hypotheses that
+    # contains a set of the hypotheses that
     # it mutually contradicts with.
+    # Only referential hypotheses can contradict, and only if they
+    # share a node, so each hypothesis is only compared with the
+    # referential hypotheses sharing one of its nodes.
     def determine_contradicting_hypotheses(self, hypothesis_set_in):
+        # The positions of the referential hypotheses linking each
+        # node, keyed by node ID.
+        referential_positions_by_node = dict()
+        for position, hypothesis in enumerate(hypothesis_set_in):
+            if not hypothesis.coherence_type == 'referential':
+                continue
+            referential_positions_by_node.setdefault(hypothesis.source_node.node_id,
+                                                     list()).append(position)
+            # Don't index a hypothesis twice if it links a node to itself.
+            if hypothesis.target_node.node_id == hypothesis.source_node.node_id:
+                continue
+            referential_positions_by_node.setdefault(hypothesis.target_node.node_id,
+                                                     list()).append(position)
+        # end for
+        is_hypothesis_index = self.build_is_hypothesis_index(hypothesis_set_in)
 
         for hypothesis_1 in hypothesis_set_in:
-            # Check each other hypothesis
-            for hypothesis_2 in hypothesis_set_in:
+            if not hypothesis_1.coherence_type == 'referential':
+                continue
+            # Check each other hypothesis sharing a node with this one.
+            candidate_positions = set()
+            for node_id in [hypothesis_1.source_node.node_id,
+                            hypothesis_1.target_node.node_id]:
+                candidate_positions.update(referential_positions_by_node[node_id])
+            # end for
+            for position in sorted(candidate_positions):
+                hypothesis_2 = hypothesis_set_in[position]
                 # Don't compare a hypothesis to itself.
                 if hypothesis_1 == hypothesis_2:
                     continue
                 # Find out if these two hypotheses contradict.
                 if self.hypotheses_contradict(hypothesis_1,
                                               hypothesis_2,
-                                              hypothesis_set_in):
-                    # If they do, place them on each others'
-                    # contradicting hypothesis lists.
+                                              is_hypothesis_index):
+                    # If they do, place them in each others'
+                    # contradicting hypothesis sets.
                     #print("Contradicting hypotheses: ")
                     #print(" " + str(hypothesis_1))
                     #print(" " + str(hypothesis_2))
@@ -581,13 +797,38 @@ class HypothesisEvaluator:
         return
     # end determine_contradicting_hypotheses
 
+    # Make an index of the valid 'is' hypotheses by the pair of
+    # nodes they link.
+    # Returns a dictionary keyed by a tuple of the lower and higher
+    # of the two nodes' IDs, since 'is' relationships are
+    # bidirectional, whose values are lists of the hypotheses.
+    def build_is_hypothesis_index(self, hypothesis_set_in):
+        is_hypothesis_index = dict()
+        for hypothesis in hypothesis_set_in:
+            if not hypothesis.relationship == 'is':
+                continue
+            if not hypothesis.is_valid():
+                continue
+            node_pair = self.get_node_pair_key(hypothesis.source_node,
+                                               hypothesis.target_node)
+            is_hypothesis_index.setdefault(node_pair, list()).append(hypothesis)
+        # end for
+        return is_hypothesis_index
+    # end build_is_hypothesis_index
+
+    # Get the key for a pair of nodes in either order.
+    def get_node_pair_key(self, node_1, node_2):
+        return (min(node_1.node_id, node_2.node_id),
+                max(node_1.node_id, node_2.node_id))
+    # end get_node_pair_key
+
     # Returns True if the two hypotheses given mutually
     # contradict with one another.
     # Returns False otherwise
     def hypotheses_contradict(self,
                               hypothesis_1,
                               hypothesis_2,
-                              hypothesis_set_in):
+                              is_hypothesis_index):
         contradicting = False
         # Check the coherence type and call the appropriate
         # hypothesis constraint function.
@@ -595,7 +836,7 @@ class HypothesisEvaluator:
             and hypothesis_2.coherence_type == 'referential'):
             contradicting = self.referential_hypothesis_constraint(hypothesis_1,
                                                                    hypothesis_2,
-                                                                   hypothesis_set_in)
+                                                                   is_hypothesis_index)
         # end if
 
         return contradicting
@@ -609,10 +850,12 @@ class HypothesisEvaluator:
     #   1. They cause one object to be assigned an is relationship to
     #   two other objects that are themselves not assigned is relationships
     #   to each other (violates the Transitive property). 
+    # The 'is' relationships are looked up in an index made by
+    # build_is_hypothesis_index.
     def referential_hypothesis_constraint(self,
                                           hypothesis_1,
                                           hypothesis_2,
-                                          hypothesis_set_in):
+                                          is_hypothesis_index):
         contradicting = True
 
         # The is relationship that hypothesis 1 is asserting
@@ -661,32 +904,19 @@ class HypothesisEvaluator:
         # If there is any match, then one object, matching_node_1/2,
         # is being assigned to two other objects; non_matching_1 and
         # non_matching_2.
-        # Check the other hypotheses to see if an 'is' relationship
-        # is being asserted between the two other (non-matching) objects.
-
-        for hypothesis in hypothesis_set_in:
+        # Check the other valid 'is' hypotheses between the two other
+        # (non-matching) objects.
+        node_pair = self.get_node_pair_key(non_matching_1, non_matching_2)
+        for hypothesis in is_hypothesis_index.get(node_pair, list()):
             # Skip either of the two hypotheses passed in.
             if (hypothesis == hypothesis_1
                 or hypothesis == hypothesis_2):
                 continue
-            # Skip any non-is hypotheses
-            elif not hypothesis.relationship == 'is':
-                continue
-            # Skip any non valid hypotheses.
-            if not hypothesis.is_valid():
-                continue
-            # In the cases below, there IS a valid hypothesis
-            # placing an 'is' relationship between the two
-            # other objects. Thus, the two hypotheses
-            # passed in do not contradict each other. 
-            elif (non_matching_1 == hypothesis.source_node
-                and non_matching_2 == hypothesis.target_node):
-                contradicting = False
-                return contradicting
-            elif (non_matching_1 == hypothesis.target_node
-                  and non_matching_2 == hypothesis.source_node):
-                contradicting = False
-                return contradicting
+            # There IS a valid hypothesis placing an 'is'
+            # relationship between the two other objects. Thus, the
+            # two hypotheses passed in do not contradict each other. 
+            contradicting = False
+            return contradicting
         # end for
         
         # If we have reached this point, we have not found
@@ -718,78 +948,91 @@ class HypothesisEvaluator:
     # contradictions and the set of hypotheses that had to
     # be rejected due to contradictions. 
     def filter_by_base_evidence(self, hypothesis_set_in):
-        # Maintain a list of accepted and rejected hypotheses
-        accepted_hypotheses = list()
+        # Maintain a set of accepted hypotheses and a list of
+        # rejected hypotheses, in the order they were rejected.
+        accepted_hypotheses = set()
         rejected_hypotheses = list()
 
+        # The evidence premised on each hypothesis, as a dictionary
+        # keyed by the premise hypothesis whose values are lists of
+        # (hypothesis, evidence) tuples.
+        dependent_evidence = dict()
+
         # Go through each hypothesis, reset its evidence
         # rejections, and place them in the accepted
-        # hypotheses list. 
+        # hypotheses set. Note which evidence each one is a
+        # premise of.
         for hypothesis in hypothesis_set_in:
             hypothesis.reset_rejected_evidence()
-            accepted_hypotheses.append(hypothesis)
+            accepted_hypotheses.add(hypothesis)
+            for index, evidence in hypothesis.get_evidence().items():
+                for premise_hypothesis in evidence.premise_hypotheses:
+                    dependent_evidence.setdefault(premise_hypothesis, list()).append((hypothesis,
+                                                                                      evidence))
+                # end for
+            # end for
         # end for
 
-        # Do a loop of checking hypothesis evidence and rejecting
-        # hypotheses until no new hypothesis is rejected.
-        stable_state = False
-        while not stable_state:
-            # For each hypothesis that is still accepted, check
-            # each piece of evidence.
-            # Keep track of which ones should be rejected after
-            # checking its evidence.
-            hypotheses_to_reject = list()
-            for hypothesis in accepted_hypotheses:
-                # Go through each piece of evidence and see if
-                # it should be rejected. 
-                for index, evidence in hypothesis.get_evidence().items():
-                    # Ignore any piece of evidence that has already been rejected.
-                    if evidence.is_rejected():
-                        continue
-                    
-                    should_reject, explanation = self.should_reject_evidence(hypothesis,
-                                                                            evidence,
-                                                                            accepted_hypotheses)
-                    if should_reject:
-                        # DEBUG
-                        print("Rejecting evidence: " + str(evidence)
-                              + ". Explanation: " + explanation)
-                        evidence.reject(explanation)
-                # end for
-                
-                # We have now gone through each piece of evidence
-                # for this hypothesis and either marked it for
-                # rejection or left it alone.
-                # Check if the hypothesis is still valid.
-                # If not, add it to the list of hypotheses to reject.
-                if not hypothesis.is_valid():
+        # Check each piece of evidence once against its hypothesis'
+        # constraints and whether its premise hypotheses exist.
+        for hypothesis in hypothesis_set_in:
+            for index, evidence in hypothesis.get_evidence().items():
+                # Ignore any piece of evidence that has already been rejected.
+                if evidence.is_rejected():
+                    continue
+                should_reject, explanation = self.should_reject_evidence(hypothesis,
+                                                                        evidence,
+                                                                        accepted_hypotheses)
+                if should_reject:
                     # DEBUG
-                    print("Rejecting hypothesis: " + str(hypothesis))
-                    hypotheses_to_reject.append(hypothesis)
+                    print("Rejecting evidence: " + str(evidence)
+                          + ". Explanation: " + explanation)
+                    evidence.reject(explanation)
             # end for
+        # end for
 
-            # If there were no new hypotheses to reject, we have
-            # reached a stable state. Stop looping.
-            if len(hypotheses_to_reject) < 1:
-                stable_state = True
-            else:
-                # Otherwise, there are new hypotheses to reject.
-                # Remove the hypotheses to reject from the set of
-                # accepted hypotheses and add it to the set
-                # of rejected hypotheses.
-                for hypothesis_to_reject in hypotheses_to_reject:
-                    accepted_hypotheses.remove(hypothesis_to_reject)
-                    rejected_hypotheses.append(hypothesis_to_reject)
-                # end for
-            # end else
+        # Reject each hypothesis that is no longer valid, then reject
+        # the evidence premised on it, which may make more hypotheses
+        # invalid in turn. Keep going until no hypothesis is left to
+        # reject.
+        rejection_queue = deque([hypothesis for hypothesis in hypothesis_set_in
+                                 if not hypothesis.is_valid()])
+        while len(rejection_queue) > 0:
+            hypothesis = rejection_queue.popleft()
+            # A hypothesis can be queued more than once.
+            if not hypothesis in accepted_hypotheses:
+                continue
+            # DEBUG
+            print("Rejecting hypothesis: " + str(hypothesis))
+            accepted_hypotheses.remove(hypothesis)
+            rejected_hypotheses.append(hypothesis)
+            # Only evidence of hypotheses that are still accepted
+            # needs rejecting.
+            for dependent_hypothesis, evidence in dependent_evidence.get(hypothesis, list()):
+                if (evidence.is_rejected()
+                    or not dependent_hypothesis in accepted_hypotheses):
+                    continue
+                explanation = ("Premise hypothesis " +
+                               str(hypothesis.hypothesis_id) +
+                               " not in accepted hypotheses")
+                # DEBUG
+                print("Rejecting evidence: " + str(evidence)
+                      + ". Explanation: " + explanation)
+                evidence.reject(explanation)
+                if evidence.is_vital() and not dependent_hypothesis.is_valid():
+                    rejection_queue.append(dependent_hypothesis)
+            # end for
         # end while
 
         # We have now accepted or rejected hypotheses based SOLELY on
         # their evidence, and reached a stable state of hypotheses
         # which COULD exist alongside each other.
 
-        # Return the accepted and rejected hypotheses.
-        return accepted_hypotheses, rejected_hypotheses
+        # Return the accepted hypotheses, in the order they were
+        # given, and the rejected hypotheses.
+        return ([hypothesis for hypothesis in hypothesis_set_in
+                 if hypothesis in accepted_hypotheses],
+                rejected_hypotheses)
     # end filter_by_base_evidence
 
     # Determine whether a piece of evidence should be
@@ -928,6 +1171,16 @@ def main():
     parser.add_argument('--density_weight', default=100)
     parser.add_argument('--connectivity_weight', default=1)
     parser.add_argument('--evidence_weight', default=1)
+    # The most hypotheses a group of contradicting hypotheses can
+    # have to be resolved exactly, and the most seconds to spend
+    # resolving each group.
+    parser.add_argument('--mwis_exact_size', default=64)
+    parser.add_argument('--mwis_time_budget', default=10)
+    # The most seconds to spend choosing the hypothesis set, or -1
+    # for no limit, and where to checkpoint the best set so far.
+    # Only the set search stops early; see main.py.
+    parser.add_argument('--optimize_time_budget', default=-1)
+    parser.add_argument('--optimize_checkpoint', default='')
 
     args = parser.parse_args()
     # end args
@@ -1,8 +1,11 @@
-from collections import deque
+import bisect
+import multiprocessing
 
 from knowledge_graph import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
-from hypothesis import Hypothesis, Evidence
+from hypothesis import Hypothesis, Evidence, HypothesisSet
 from constants import Constants as const
+from identity_resolver import IdentityResolver
+from concept_path_index import ConceptPathIndex, get_max_cn_edge_count, is_concept_path_edge
 
 # Object to contain functions for generating
 # hypotheses. 
@@ -10,10 +13,31 @@ class HypothesisGenerator:
 
     # Use this counter to assign unique IDs to each hypothesis.
     hypothesis_id_counter = 0
+
+    # How to find the transitive 'is' hypotheses between objects.
+    #   'fixpoint': repeat the referential second pass until it
+    #       makes no new hypotheses.
+    #   'union_find': resolve which objects are the same with an
+    #       IdentityResolver and hypothesize each missing pair once.
+    referential_closure = 'fixpoint'
+
+    # A ConceptPathIndex to look concept paths up in instead of
+    # searching for each one, if one has been built.
+    concept_path_index = None
+
+    # How many worker processes to split causal hypothesis
+    # generation across. 1 generates them in this process.
+    causal_workers = 1
     
     def __init__(self, args_in):
         self.args = args_in
         self.hypothesis_id_counter = 0
+        self.referential_closure = 'fixpoint'
+        self.concept_path_index = None
+        self.causal_workers = 1
+        if not args_in == None:
+            self.referential_closure = args_in.referential_closure
+            self.causal_workers = int(args_in.causal_workers)
         print("Hypothesis Generator initialized.")
 
     # Hypothesize Referential relationships amongst the nodes in
@@ -31,13 +55,23 @@ class HypothesisGenerator:
         #target_shared_node_type = 'concept'
         
         first_pass_hypotheses = self.referential_hypothesis_first_pass(kg_in)
-        hypotheses = first_pass_hypotheses
+
+        if self.referential_closure == 'union_find':
+            return self.referential_hypothesis_closure(kg_in, first_pass_hypotheses)
+
+        hypotheses = HypothesisSet(first_pass_hypotheses)
 
         # For the second pass, use the existing hypothesized
         # 'is' relationships to see if any objects share an 'is'
         # relationship to the same third object.
         # Keep doing it until no new hypotheses have been added
         # to the set.
+        # Each pass only has to join the hypotheses added by the
+        # previous pass against the rest; every other pair was already
+        # joined. New hypotheses are always added to the end of the
+        # set, so the previous pass' hypotheses start at delta_start.
+        # The first pass' hypotheses are all new.
+        delta_start = 0
         set_altered = True
         counter = 1
         while set_altered == True:
@@ -45,7 +79,9 @@ class HypothesisGenerator:
             set_altered = False
 
             second_pass_hypotheses = self.referential_hypothesis_second_pass(kg_in,
-                                                                             hypotheses)
+                                                                             hypotheses,
+                                                                             delta_start)
+            delta_start = len(hypotheses)
             # Now merge the second pass hypotheses with the existing hypothesis set.
             for hypothesis in second_pass_hypotheses:
                 #print("Trying to add hypothesis to set")
@@ -67,7 +103,7 @@ class HypothesisGenerator:
         # end while
         
 
-        return hypotheses
+        return hypotheses.get_list()
 
     # For the first pass, look for object nodes that
     # share the same concept nodes.
@@ -75,12 +111,71 @@ class HypothesisGenerator:
     # scene graph nodes which share an 'is_concept' relationship
     # with the same concept node.
     def referential_hypothesis_first_pass(self, kg_in):
-        hypotheses = list()
+        hypotheses = HypothesisSet()
 
         # Hypothesize an 'is' relationship between any two
         # scene graph nodes which share a the target edge relationship
         # with the same node of the target shared node type.
         # Only do so with Object nodes (node_type == "object")
+        # Rather than checking every other node for a shared concept,
+        # look up the nodes that share each of this node's concepts
+        # in an index.
+        is_concept_index = self.build_is_concept_index(kg_in)
+        # Where each node is in the knowledge graph's node order, so
+        # candidates can be checked in the same order as if every
+        # node were checked.
+        node_positions = dict()
+        for node_id in kg_in.nodes.keys():
+            node_positions[node_id] = len(node_positions)
+        # end for
+        for node_id, kg_node in kg_in.nodes.items():
+            # Skip this node if it is not an object.
+            if not kg_node.node_type == "object":
+                continue
+            # Get all the target nodes this scene graph
+            # node has the target relationship to.
+            is_target_nodes = list()
+            for edge in kg_node.edges:
+                if (edge.relationship == 'is_concept'
+                    and edge.target_node.node_type == 'concept'):
+                    is_target_nodes.append(edge.target_node)
+            # Find every other node with an 'is_concept' relationship to
+            # any of the same concept nodes, along with the first such
+            # concept node.
+            shared_target_nodes = dict()
+            for target_node in is_target_nodes:
+                for node_id_2 in is_concept_index.get(target_node.node_id, list()):
+                    # Do not let the node form a relationship with itself.
+                    if node_id_2 == node_id:
+                        continue
+                    if not node_id_2 in shared_target_nodes:
+                        shared_target_nodes[node_id_2] = target_node
+                # end for
+            # end for
+            for node_id_2 in sorted(shared_target_nodes.keys(),
+                                    key=lambda n_id: node_positions[n_id]):
+                # kg_node and kg_node_2 both point to the same
+                # third node.
+                new_hypothesis = self.make_shared_concept_hypothesis(kg_node,
+                                                                     kg_in.nodes[node_id_2],
+                                                                     shared_target_nodes[node_id_2])
+                # Add it to the set of hypotheses this
+                # function will return. 
+                self.add_hypothesis_to_set(new_hypothesis, hypotheses)
+            # end for node_id_2 in shared_target_nodes
+        # end for node_id, kg_node in kg_in.items()
+
+        return hypotheses.get_list()
+
+    # end referential_hypothesis_first_pass
+
+    # The referential first pass, done by checking every object node
+    # against every other node in the knowledge graph.
+    # Makes the same hypotheses as referential_hypothesis_first_pass,
+    # only much more slowly. Kept to compare against.
+    def referential_hypothesis_first_pass_pairwise(self, kg_in):
+        hypotheses = HypothesisSet()
+
         for node_id, kg_node in kg_in.nodes.items():
             # Skip this node if it is not an object.
             if not kg_node.node_type == "object":
@@ -102,62 +197,106 @@ class HypothesisGenerator:
                 for target_node in is_target_nodes:
                     if kg_node_2.has_edge_to(target_node.node_id,
                                              'is_concept'):
-                        # kg_node and kg_node_2 both point to the same
-                        # third node.
-                        
-                        # Form a hypothesis for an 'is' relationship
-                        # between the two nodes.
-                        new_hypothesis = Hypothesis(self.hypothesis_id_counter,
-                                                    kg_node,
-                                                    kg_node_2,
-                                                    'is',
-                                                    'referential',
-                                                    True)
-                        self.hypothesis_id_counter += 1
-                        # Add evidence for this hypothesis.
-                        # Structural evidence for this 'is' hypothesis
-                        # are the target edge types ('is_concept' or 'is') from the
-                        # source and target nodes which point to the same third node.
-                        # The data for the evidence is both edges and the shared third node.
-                        # The type of evidence will be shared_ + the type of the third node.
-                        structural_evidence = Evidence()
-                        structural_evidence.evidence_type = 'shared_' + 'concept'
-                        structural_evidence.add_data('edge', kg_node.get_edge(target_node.node_id, 'is_concept'))
-                        structural_evidence.add_data('edge', kg_node_2.get_edge(target_node.node_id, 'is_concept'))
-                        structural_evidence.add_data('target_node', target_node)
-                        # This is considered Vital evidence. Without it, the 'is' relationship
-                        # would not exist to begin with. 
-                        structural_evidence.set_vital()
-
-                        explanation = (kg_node.node_name + " and " +
-                                       kg_node_2.node_name +
-                                       " both have 'is_concept' relationship to " +
-                                       target_node.node_name)
-                        structural_evidence.set_explanation(explanation)
-                        
-                        new_hypothesis.add_evidence(structural_evidence)
-                        # For additional evidence, see how many of the objects' 'looks'
-                        # attributes match each other.
-                        # This is to see how much the objects look like each other
-                        # according to the image observations.
-                        looks_evidence_list = self.generate_looks_evidence(kg_node, kg_node_2)
-                        for looks_evidence in looks_evidence_list:
-                            new_hypothesis.add_evidence(looks_evidence)
-
-                        # We now have a new hypothesis.
-
-                        # Add it to the set of hypotheses this
-                        # function will return. 
+                        new_hypothesis = self.make_shared_concept_hypothesis(kg_node,
+                                                                             kg_node_2,
+                                                                             target_node)
                         self.add_hypothesis_to_set(new_hypothesis, hypotheses)
-                        
                         break
                 # end for concept_node in is_concept_nodes
             # end for node_id_2, kg_node_2 in kg_in.items()
         # end for node_id, kg_node in kg_in.items()
 
-        return hypotheses
-
-    # end referential_hypothesis_first_pass
+        return hypotheses.get_list()
+    # end referential_hypothesis_first_pass_pairwise
+
+    # Make an index of the hypotheses with the given relationship
+    # that link each node.
+    # Returns a dictionary keyed by node ID whose values are lists of
+    # the positions in hypotheses_in of the hypotheses whose source or
+    # target is that node, in order.
+    def build_hypothesis_node_index(self, hypotheses_in, relationship):
+        hypothesis_node_index = dict()
+        for position, hypothesis in enumerate(hypotheses_in):
+            if not hypothesis.relationship == relationship:
+                continue
+            hypothesis_node_index.setdefault(hypothesis.source_node.node_id,
+                                             list()).append(position)
+            # Don't index a hypothesis twice if it links a node to itself.
+            if hypothesis.target_node.node_id == hypothesis.source_node.node_id:
+                continue
+            hypothesis_node_index.setdefault(hypothesis.target_node.node_id,
+                                             list()).append(position)
+        # end for
+        return hypothesis_node_index
+    # end build_hypothesis_node_index
+
+    # Make an index of which nodes have an 'is_concept' relationship
+    # to each node.
+    # Returns a dictionary keyed by the target node's ID whose values
+    # are lists of the IDs of the nodes with an 'is_concept' edge to it,
+    # in the knowledge graph's node order.
+    def build_is_concept_index(self, kg_in):
+        is_concept_index = dict()
+        for node_id, kg_node in kg_in.nodes.items():
+            for edge in kg_node.edges:
+                if not edge.relationship == 'is_concept':
+                    continue
+                indexed_node_ids = is_concept_index.setdefault(edge.target_node.node_id,
+                                                               list())
+                # A node may have more than one edge to the same target.
+                if len(indexed_node_ids) > 0 and indexed_node_ids[-1] == node_id:
+                    continue
+                indexed_node_ids.append(node_id)
+            # end for
+        # end for
+        return is_concept_index
+    # end build_is_concept_index
+
+    # Make an 'is' hypothesis between two nodes which both have an
+    # 'is_concept' relationship to the same concept node.
+    # Returns the new hypothesis.
+    def make_shared_concept_hypothesis(self, kg_node, kg_node_2, target_node):
+        # Form a hypothesis for an 'is' relationship
+        # between the two nodes.
+        new_hypothesis = Hypothesis(self.hypothesis_id_counter,
+                                    kg_node,
+                                    kg_node_2,
+                                    'is',
+                                    'referential',
+                                    True)
+        self.hypothesis_id_counter += 1
+        # Add evidence for this hypothesis.
+        # Structural evidence for this 'is' hypothesis
+        # are the target edge types ('is_concept' or 'is') from the
+        # source and target nodes which point to the same third node.
+        # The data for the evidence is both edges and the shared third node.
+        # The type of evidence will be shared_ + the type of the third node.
+        structural_evidence = Evidence()
+        structural_evidence.evidence_type = 'shared_' + 'concept'
+        structural_evidence.add_data('edge', kg_node.get_edge(target_node.node_id, 'is_concept'))
+        structural_evidence.add_data('edge', kg_node_2.get_edge(target_node.node_id, 'is_concept'))
+        structural_evidence.add_data('target_node', target_node)
+        # This is considered Vital evidence. Without it, the 'is' relationship
+        # would not exist to begin with. 
+        structural_evidence.set_vital()
+
+        explanation = (kg_node.node_name + " and " +
+                       kg_node_2.node_name +
+                       " both have 'is_concept' relationship to " +
+                       target_node.node_name)
+        structural_evidence.set_explanation(explanation)
+        
+        new_hypothesis.add_evidence(structural_evidence)
+        # For additional evidence, see how many of the objects' 'looks'
+        # attributes match each other.
+        # This is to see how much the objects look like each other
+        # according to the image observations.
+        looks_evidence_list = self.generate_looks_evidence(kg_node, kg_node_2)
+        for looks_evidence in looks_evidence_list:
+            new_hypothesis.add_evidence(looks_evidence)
+
+        return new_hypothesis
+    # end make_shared_concept_hypothesis
 
     # For the second pass, look through the hypotheses from the
     # first pass to see if any object nodes share an
@@ -166,12 +305,24 @@ class HypothesisGenerator:
     # share an 'is' relationship with each other.
     # Returns the hypotheses to add to the hypothesis set passed in.
     # Does not change the hypothesis set passed in at all. 
-    def referential_hypothesis_second_pass(self, kg_in, hypotheses_in):
+    # Hypotheses at or after delta_start in hypotheses_in are the
+    # new ones. Only pairs of hypotheses where at least one of them
+    # is new are joined.
+    def referential_hypothesis_second_pass(self, kg_in, hypotheses_in, delta_start=0):
         print("Referential second pass")
 
         # Store all the new hypotheses to add and do not
         # add them to the overall set of hypotheses. 
-        hypotheses_to_add = list()
+        hypotheses_to_add = HypothesisSet()
+
+        # Index the positions of the hypotheses each node is a
+        # source or target node in, in the order of hypotheses_in.
+        hypothesis_positions_by_node = dict()
+        for position, hypothesis in enumerate(hypotheses_in):
+            for node in [hypothesis.source_node, hypothesis.target_node]:
+                hypothesis_positions_by_node.setdefault(node.node_id, list()).append(position)
+            # end for
+        # end for
         
         # Go through each scene graph node that is an object.
         for node_id, kg_node in kg_in.nodes.items():
@@ -182,98 +333,54 @@ class HypothesisGenerator:
             # is a source or target node in. These are all
             # the hypotheses that point an 'is' relationship
             # from this object to another object. 
-            involved_hypotheses = list()
-            # Track also all the hypotheses where
-            # this scene graph node is NOT the source node.
-            non_involved_hypotheses = list()
-            for hypothesis in hypotheses_in:
-                if (hypothesis.source_node.node_id == node_id
-                    or hypothesis.target_node.node_id == node_id):
-                    involved_hypotheses.append(hypothesis)
-                else:
-                    non_involved_hypotheses.append(hypothesis)
-            # end for
+            involved_positions = hypothesis_positions_by_node.get(node_id, list())
             # For each involved hypothesis, look through each
             # non-involved hypothesis for 'is' relationships from
             # other nodes. If they both point to the same node,
             # that suggests a transitive 'is' between the source node
             # of the involved hypothesis and the source node of the
             # non-involved hypothesis
-            for involved_hypothesis in involved_hypotheses:
-                for non_involved_hypothesis in non_involved_hypotheses:
-                    # First, find out which node the scene graph node
-                    # is pointing to.
-                    third_node = None
-                    node_to_link_1 = None
-                    if involved_hypothesis.source_node.node_id == node_id:
-                        third_node = involved_hypothesis.target_node
-                        node_to_link_1 = involved_hypothesis.source_node
-                    elif involved_hypothesis.target_node.node_id == node_id:
-                        third_node = involved_hypothesis.source_node
-                        node_to_link_1 = involved_hypothesis.target_node
-                    else:
-                        print("HELP! Something happened that shouldn't have!")
-                        print("In referential hypothesis second pass, the " +
-                              "scene graph node is neither the involved hypothesis' " +
-                              "source node nor target node.")
-
-                    # Next, find out if either of the non involved hypothesis'
-                    # nodes is the third node.
-                    # If so, it is it's OTHER node that we will hypothesize
-                    # an 'is' relationship to. If neither is the third node,
-                    # then no new hypothesis will be made.
+            for involved_position in involved_positions:
+                involved_hypothesis = hypotheses_in[involved_position]
+                # First, find out which node the scene graph node
+                # is pointing to.
+                third_node = None
+                node_to_link_1 = None
+                if involved_hypothesis.source_node.node_id == node_id:
+                    third_node = involved_hypothesis.target_node
+                    node_to_link_1 = involved_hypothesis.source_node
+                else:
+                    third_node = involved_hypothesis.source_node
+                    node_to_link_1 = involved_hypothesis.target_node
+                # Only the hypotheses with the third node as their source
+                # or target node can make a new hypothesis. If the involved
+                # hypothesis is an old one, only the new ones among them
+                # have to be checked.
+                third_node_positions = hypothesis_positions_by_node[third_node.node_id]
+                first_index = 0
+                if involved_position < delta_start:
+                    first_index = bisect.bisect_left(third_node_positions, delta_start)
+                for non_involved_position in third_node_positions[first_index:]:
+                    non_involved_hypothesis = hypotheses_in[non_involved_position]
+                    # Skip any other hypotheses this scene graph node
+                    # is a source or target node in.
+                    if (non_involved_hypothesis.source_node.node_id == node_id
+                        or non_involved_hypothesis.target_node.node_id == node_id):
+                        continue
+                    # It is the non involved hypothesis' OTHER node
+                    # that we will hypothesize an 'is' relationship to. 
                     node_to_link_2 = None
                     if non_involved_hypothesis.source_node.node_id == third_node.node_id:
                         node_to_link_2 = non_involved_hypothesis.target_node
-                    elif non_involved_hypothesis.target_node.node_id == third_node.node_id:
-                        node_to_link_2 = non_involved_hypothesis.source_node
                     else:
-                        #print("No new hypothesis made.")
-                        continue
+                        node_to_link_2 = non_involved_hypothesis.source_node
 
                     # Create the new hypothesis accordingly.
-                    # The hypothesis is for an 'is' relationship between
-                    # the two nodes to link. 
-                    new_hypothesis = Hypothesis(self.hypothesis_id_counter,
-                                                kg_node,
-                                                node_to_link_2,
-                                                'is',
-                                                'referential',
-                                                True)
-                    self.hypothesis_id_counter += 1
-                    # Add evidence for this hypothesis.
-                    # The vital evidence is the existence of the first
-                    # hypothesis, the second hypothesis, and the mutual
-                    # target node.
-                    vital_evidence = Evidence()
-                    vital_evidence.evidence_type = 'shared_' + 'object'
-                    vital_evidence.add_data('hypothesis', involved_hypothesis)
-                    vital_evidence.add_data('hypothesis', non_involved_hypothesis)
-                    vital_evidence.add_data('target_node', third_node)
-                    vital_evidence.set_vital()
-                    # As this evidence relies on two other hypotheses, it
-                    # is invalid if the other hypotheses are not accepted.
-                    # Add the two other hypotheses as premises.
-                    vital_evidence.add_premise_hypothesis(involved_hypothesis)
-                    vital_evidence.add_premise_hypothesis(non_involved_hypothesis)
-
-                    # Add an explanation for this evidence.
-                    explanation = (kg_node.node_name + " and " +
-                                   node_to_link_2.node_name +
-                                   " both have hypothetical 'is' relationship to " +
-                                   third_node.node_name)
-                    
-                    vital_evidence.set_explanation(explanation)
-                    new_hypothesis.add_evidence(vital_evidence)
-                    
-                    # For additional evidence, see how many of the objects' 'looks'
-                    # attributes match each other.
-                    # This is to see how much the objects look like each other
-                    # according to the image observations.
-                    looks_evidence_list = self.generate_looks_evidence(kg_node, node_to_link_2)
-                    for looks_evidence in looks_evidence_list:
-                        new_hypothesis.add_evidence(looks_evidence)
-                    # end for
+                    new_hypothesis = self.make_shared_object_hypothesis(kg_node,
+                                                                        node_to_link_2,
+                                                                        involved_hypothesis,
+                                                                        non_involved_hypothesis,
+                                                                        third_node)
                     # We now have a new hypothesis.
                     # Add it to the set of hypotheses this function
                     # will return.
@@ -281,13 +388,91 @@ class HypothesisGenerator:
                     
                 # end for
             # end for
-        return hypotheses_to_add
+        return hypotheses_to_add.get_list()
         
     # end referential_hypothesis_second_pass
 
+    # Instead of the referential second pass, resolve which nodes are
+    # the same entity using the 'is' hypotheses made so far, then
+    # hypothesize an 'is' relationship between each pair of
+    # co-referent nodes that doesn't have one yet.
+    # Each pair gets one hypothesis with one piece of 'shared_object'
+    # evidence, from a shortest chain of hypotheses between them.
+    # Returns the hypotheses given with the new ones added to the end.
+    def referential_hypothesis_closure(self, kg_in, hypotheses_in):
+        print("Referential closure")
+        identity_resolver = IdentityResolver(hypotheses_in)
+        equivalence_classes = identity_resolver.get_equivalence_classes(list(kg_in.nodes.keys()))
+        print("Equivalence classes: " + str(len(equivalence_classes)))
+        for (kg_node, node_to_link_2, involved_hypothesis,
+             non_involved_hypothesis, third_node) in identity_resolver.get_missing_links(kg_in.nodes.keys()):
+            new_hypothesis = self.make_shared_object_hypothesis(kg_node,
+                                                                node_to_link_2,
+                                                                involved_hypothesis,
+                                                                non_involved_hypothesis,
+                                                                third_node)
+            hypotheses_in.append(new_hypothesis)
+            # Let later pairs use this hypothesis as evidence.
+            identity_resolver.add_hypothesis(new_hypothesis)
+        # end for
+        print("SIZE OF HYPOTHESIS SET: " + str(len(hypotheses_in)))
+        return hypotheses_in
+    # end referential_hypothesis_closure
+
+    # Make an 'is' hypothesis between two nodes which both have a
+    # hypothesized 'is' relationship to the same third node.
+    # Returns the new hypothesis.
+    def make_shared_object_hypothesis(self, kg_node, node_to_link_2,
+                                      involved_hypothesis, non_involved_hypothesis,
+                                      third_node):
+        # The hypothesis is for an 'is' relationship between
+        # the two nodes to link. 
+        new_hypothesis = Hypothesis(self.hypothesis_id_counter,
+                                    kg_node,
+                                    node_to_link_2,
+                                    'is',
+                                    'referential',
+                                    True)
+        self.hypothesis_id_counter += 1
+        # Add evidence for this hypothesis.
+        # The vital evidence is the existence of the first
+        # hypothesis, the second hypothesis, and the mutual
+        # target node.
+        vital_evidence = Evidence()
+        vital_evidence.evidence_type = 'shared_' + 'object'
+        vital_evidence.add_data('hypothesis', involved_hypothesis)
+        vital_evidence.add_data('hypothesis', non_involved_hypothesis)
+        vital_evidence.add_data('target_node', third_node)
+        vital_evidence.set_vital()
+        # As this evidence relies on two other hypotheses, it
+        # is invalid if the other hypotheses are not accepted.
+        # Add the two other hypotheses as premises.
+        vital_evidence.add_premise_hypothesis(involved_hypothesis)
+        vital_evidence.add_premise_hypothesis(non_involved_hypothesis)
+
+        # Add an explanation for this evidence.
+        explanation = (kg_node.node_name + " and " +
+                       node_to_link_2.node_name +
+                       " both have hypothetical 'is' relationship to " +
+                       third_node.node_name)
+        
+        vital_evidence.set_explanation(explanation)
+        new_hypothesis.add_evidence(vital_evidence)
+        
+        # For additional evidence, see how many of the objects' 'looks'
+        # attributes match each other.
+        # This is to see how much the objects look like each other
+        # according to the image observations.
+        looks_evidence_list = self.generate_looks_evidence(kg_node, node_to_link_2)
+        for looks_evidence in looks_evidence_list:
+            new_hypothesis.add_evidence(looks_evidence)
+        # end for
+        return new_hypothesis
+    # end make_shared_object_hypothesis
+
     # Generate Causal hypotheses.
     def generate_causal_hypotheses(self, kg_in, hypotheses_in):
-        hypotheses = list()
+        hypotheses = HypothesisSet()
 
         # Hypothesize SEQUENCE relationships between two events.
         # SEQUENCE means that the two events are part of the same
@@ -299,121 +484,237 @@ class HypothesisGenerator:
 
         # Look through 'is' relationships to determine which events
         # involve the same objects. 
-
-        # Go through each action node.
-        for node_id_1, kg_node_1 in kg_in.nodes.items():
+        # Index the 'is' hypotheses by the nodes they link, so each
+        # pair of actions only looks at the hypotheses touching the
+        # objects involved in the first action.
+        is_hypothesis_index = self.build_hypothesis_node_index(hypotheses_in, 'is')
+
+        # Gather the action nodes along with the IDs of all the scene
+        # graph objects that were involved in each one.
+        action_entries = list()
+        for node_id, kg_node in kg_in.nodes.items():
             # Skip anything that's not an action node.
-            if not kg_node_1.node_type == "action":
+            if not kg_node.node_type == "action":
                 continue
+            involved_node_ids = set([node.node_id for node
+                                     in self.get_involved_object_nodes(kg_node)])
+            action_entries.append((node_id, kg_node, involved_node_ids))
+        # end for
 
-            # Get the nodes of all of the scene graph objects
-            # that were involved in this action. 
-            involved_nodes_1 = self.get_involved_object_nodes(kg_node_1)
-
-            # Go through each other action node.
-            for node_id_2, kg_node_2 in kg_in.nodes.items():
-                # Don't compare a node to itself
-                if node_id_1 == node_id_2:
-                    continue
-                # Skip this if it's not an action node.
-                if not kg_node_2.node_type == "action":
-                    continue
-
-                # Get the nodes of all the scene graph objects
-                # that were involved in this action.
-                involved_nodes_2 = self.get_involved_object_nodes(kg_node_2)
-
-                # Look for hypothesized 'is' relationships between the
-                # objects involved in the first action and the objects
-                # involved in the second action.
-                # They imply that the same object was involved in both
-                # actions.
-                for existing_hypothesis in hypotheses_in:
-                    # If this is not a referential hypothesis
-                    # with the 'is' relationship, skip it.
-                    if not existing_hypothesis.relationship == 'is':
-                        continue
-                    # Check if the source object was involved with either
-                    # action. If so, check if the target object was
-                    # involved with the other action.
-                    if ((existing_hypothesis.source_node in involved_nodes_1
-                            and existing_hypothesis.target_node in involved_nodes_2)
-                        or (existing_hypothesis.source_node in involved_nodes_2
-                            and existing_hypothesis.target_node in involved_nodes_1)):
-                        # If so, then there is (hypothetically) a single object
-                        # involved in both actions.
-                        # Make a new sequence hypothesis.
-                        new_hypothesis = Hypothesis(self.hypothesis_id_counter,
-                                                    kg_node_1,
-                                                    kg_node_2,
-                                                    'sequence',
-                                                    'causal',
-                                                    True)
-                        self.hypothesis_id_counter += 1
-                        # Add evidence for this hypothesis.
-                        # The vital evidence is the existence of the
-                        # 'is' hypothesis.
-                        vital_evidence = Evidence()
-                        vital_evidence.evidence_type = 'returning_' + 'object'
-                        vital_evidence.add_data('hypothesis', existing_hypothesis)
-                        vital_evidence.set_vital()
-                        # As this evidence relies on two other hypotheses, it
-                        # is invalid if the other hypotheses are not accepted.
-                        # Add the two other hypotheses as premises.
-                        vital_evidence.add_premise_hypothesis(existing_hypothesis)
-
-                        # Add an explanation for this evidence.
-                        action_1_object = None
-                        action_2_object = None
-                        if existing_hypothesis.source_node in involved_nodes_1:
-                            action_1_object = existing_hypothesis.source_node
-                            action_2_object = existing_hypothesis.target_node
-                        else:
-                            action_1_object = existing_hypothesis.target_node
-                            action_2_object = existing_hypothesis.source_node                            
-                        explanation = ("object node " + action_1_object.node_name +
-                                       " from action " + kg_node_1.node_name +
-                                       " and object node " + action_2_object.node_name +
-                                       " from action " + kg_node_2.node_name +
-                                       " are the same object via hypothetical 'is' relationship")
-                        vital_evidence.set_explanation(explanation)
-                        new_hypothesis.add_evidence(vital_evidence)
-
-                        # Add the hypothesis to the set of hypotheses.
-                        self.add_hypothesis_to_set(new_hypothesis, hypotheses)
-                    # end if
-                # end for existing_hypothesis in hypotheses_in
-
-                # See if there is a causal link between the two nodes.
-                # Don't look if the concepts are the same.
-                if not kg_node_1.cn_concept_name == kg_node_2.cn_concept_name:
-                    # Look for a concept path from one node to the other. 
-                    concept_path = self.get_scene_graph_concept_path(kg_in,
-                                                                     kg_node_1,
-                                                                     kg_node_2,
-                                                                     const.causal_filter,
-                                                                     self.args.causal_length)
-                    # Try and make a hypothesis from the concept path.
+        # Find what to hypothesize for each action node and the
+        # other action nodes, either here or across worker processes.
+        row_descriptions = self.describe_causal_rows(kg_in,
+                                                     hypotheses_in,
+                                                     action_entries,
+                                                     is_hypothesis_index)
+
+        # Make the hypotheses in action node order, so their IDs are
+        # the same however many workers found them.
+        for row_index, (node_id_1, kg_node_1, involved_ids_1) in enumerate(action_entries):
+            for description in row_descriptions[row_index]:
+                kg_node_2 = action_entries[description[1]][1]
+                if description[0] == 'returning_object':
+                    # There is (hypothetically) a single object
+                    # involved in both actions.
+                    new_hypothesis = self.make_returning_object_hypothesis(kg_node_1,
+                                                                           kg_node_2,
+                                                                           hypotheses_in[description[2]],
+                                                                           involved_ids_1)
+                else:
+                    # There is a causal link between the two nodes.
+                    concept_path = [self.get_edge_from_reference(kg_in, edge_reference)
+                                    for edge_reference in description[2]]
                     new_hypothesis = self.hypothesis_from_concept_path(concept_path,
                                                                        kg_node_1,
                                                                        kg_node_2,
                                                                        'sequence',
                                                                        'causal')
-                    if not new_hypothesis == None:
-                        # Add the hypothesis to the set.
-                        self.add_hypothesis_to_set(new_hypothesis, hypotheses)
-                    # end if
                 # end if
-                
-            # end for node 2
-        # end for node 1
+                if not new_hypothesis == None:
+                    # Add the hypothesis to the set.
+                    self.add_hypothesis_to_set(new_hypothesis, hypotheses)
+            # end for description
+        # end for row_index
         
-        return hypotheses
+        return hypotheses.get_list()
     # end generate_causal_hypotheses
 
+    # Describe the causal hypotheses for every row of action node
+    # pairs, where each row is one action node paired with every
+    # other action node.
+    # If there is more than one causal worker and processes can be
+    # forked, the rows are split across a pool of worker processes.
+    # Each worker inherits a snapshot of the knowledge graph, which
+    # it only reads.
+    # Returns a list with each row's descriptions, in row order.
+    def describe_causal_rows(self, kg_in, hypotheses_in,
+                             action_entries, is_hypothesis_index):
+        row_indices = list(range(len(action_entries)))
+        worker_count = min(self.causal_workers, len(row_indices))
+        if (worker_count > 1
+            and not 'fork' in multiprocessing.get_all_start_methods()):
+            print("Can't fork worker processes here. Generating causal hypotheses serially.")
+            worker_count = 1
+        if worker_count > 1:
+            causal_worker_state['generator'] = self
+            causal_worker_state['kg'] = kg_in
+            causal_worker_state['hypotheses'] = hypotheses_in
+            causal_worker_state['action_entries'] = action_entries
+            causal_worker_state['is_hypothesis_index'] = is_hypothesis_index
+            try:
+                context = multiprocessing.get_context('fork')
+                with context.Pool(worker_count) as pool:
+                    row_descriptions = pool.map(describe_causal_row_worker,
+                                                row_indices,
+                                                max(1, len(row_indices) // (worker_count * 4)))
+                # end with
+                return row_descriptions
+            except OSError as e:
+                print("Error starting causal workers: " + str(e) +
+                      ". Generating causal hypotheses serially.")
+            finally:
+                causal_worker_state.clear()
+            # end try
+        # end if
+        return [self.describe_causal_row(kg_in, hypotheses_in, action_entries,
+                                         is_hypothesis_index, row_index)
+                for row_index in row_indices]
+    # end describe_causal_rows
+
+    # Describe the causal hypotheses between one action node, given
+    # by its row index in the action entries, and every other
+    # action node.
+    # Returns a list of descriptions, each a tuple of:
+    #   'returning_object' or 'concept_path',
+    #   the other action node's index in the action entries,
+    #   for 'returning_object', the position of the 'is' hypothesis
+    #   in hypotheses_in, and for 'concept_path', a list of references
+    #   to the path's edges made by get_edge_reference.
+    # Descriptions are only plain values, so they can be sent back
+    # from a worker process.
+    def describe_causal_row(self, kg_in, hypotheses_in, action_entries,
+                            is_hypothesis_index, row_index):
+        row_descriptions = list()
+        node_id_1, kg_node_1, involved_ids_1 = action_entries[row_index]
+        # The positions of the 'is' hypotheses involving an object
+        # from this action.
+        candidate_positions = set()
+        for involved_node_id in involved_ids_1:
+            candidate_positions.update(is_hypothesis_index.get(involved_node_id, list()))
+        # end for
+        candidate_positions = sorted(candidate_positions)
+
+        # Go through each other action node.
+        for column_index, (node_id_2, kg_node_2, involved_ids_2) in enumerate(action_entries):
+            # Don't compare a node to itself
+            if node_id_1 == node_id_2:
+                continue
+
+            # Look for hypothesized 'is' relationships between the
+            # objects involved in the first action and the objects
+            # involved in the second action.
+            # They imply that the same object was involved in both
+            # actions.
+            for position in candidate_positions:
+                existing_hypothesis = hypotheses_in[position]
+                source_id = existing_hypothesis.source_node.node_id
+                target_id = existing_hypothesis.target_node.node_id
+                # Check if the source object was involved with either
+                # action. If so, check if the target object was
+                # involved with the other action.
+                if ((source_id in involved_ids_1
+                        and target_id in involved_ids_2)
+                    or (source_id in involved_ids_2
+                        and target_id in involved_ids_1)):
+                    row_descriptions.append(('returning_object', column_index, position))
+                # end if
+            # end for position in candidate_positions
+
+            # See if there is a causal link between the two nodes.
+            # Don't look if the concepts are the same.
+            if not kg_node_1.cn_concept_name == kg_node_2.cn_concept_name:
+                # Look for a concept path from one node to the other. 
+                concept_path = self.get_scene_graph_concept_path(kg_in,
+                                                                 kg_node_1,
+                                                                 kg_node_2,
+                                                                 const.causal_filter,
+                                                                 self.args.causal_length)
+                if len(concept_path) > 0:
+                    row_descriptions.append(('concept_path',
+                                             column_index,
+                                             [self.get_edge_reference(edge)
+                                              for edge in concept_path]))
+                # end if
+            # end if
+        # end for column_index
+        return row_descriptions
+    # end describe_causal_row
+
+    # Make a sequence hypothesis between two action nodes, given an
+    # 'is' hypothesis linking an object involved in the first action
+    # with an object involved in the second.
+    def make_returning_object_hypothesis(self, kg_node_1, kg_node_2,
+                                         existing_hypothesis, involved_ids_1):
+        new_hypothesis = Hypothesis(self.hypothesis_id_counter,
+                                    kg_node_1,
+                                    kg_node_2,
+                                    'sequence',
+                                    'causal',
+                                    True)
+        self.hypothesis_id_counter += 1
+        # Add evidence for this hypothesis.
+        # The vital evidence is the existence of the
+        # 'is' hypothesis.
+        vital_evidence = Evidence()
+        vital_evidence.evidence_type = 'returning_' + 'object'
+        vital_evidence.add_data('hypothesis', existing_hypothesis)
+        vital_evidence.set_vital()
+        # As this evidence relies on two other hypotheses, it
+        # is invalid if the other hypotheses are not accepted.
+        # Add the two other hypotheses as premises.
+        vital_evidence.add_premise_hypothesis(existing_hypothesis)
+
+        # Add an explanation for this evidence.
+        action_1_object = None
+        action_2_object = None
+        if existing_hypothesis.source_node.node_id in involved_ids_1:
+            action_1_object = existing_hypothesis.source_node
+            action_2_object = existing_hypothesis.target_node
+        else:
+            action_1_object = existing_hypothesis.target_node
+            action_2_object = existing_hypothesis.source_node
+        explanation = ("object node " + action_1_object.node_name +
+                       " from action " + kg_node_1.node_name +
+                       " and object node " + action_2_object.node_name +
+                       " from action " + kg_node_2.node_name +
+                       " are the same object via hypothetical 'is' relationship")
+        vital_evidence.set_explanation(explanation)
+        new_hypothesis.add_evidence(vital_evidence)
+        return new_hypothesis
+    # end make_returning_object_hypothesis
+
+    # Get a reference to an edge that can be sent between processes,
+    # as a tuple of its source node's ID and where it is in its
+    # source node's outgoing edges.
+    # Edges that aren't in their source node's outgoing edges, like
+    # temporary ones made for a single path, can't be referenced.
+    def get_edge_reference(self, edge):
+        for edge_index, source_edge in enumerate(edge.source_node.edges):
+            if source_edge is edge:
+                return (edge.source_node.node_id, edge_index)
+        # end for
+        raise ValueError("Edge " + str(edge) + " is not one of its source node's edges")
+    # end get_edge_reference
+
+    # Get the edge a reference made by get_edge_reference refers to.
+    def get_edge_from_reference(self, kg_in, edge_reference):
+        source_node_id, edge_index = edge_reference
+        return kg_in.nodes[source_node_id].edges[edge_index]
+    # end get_edge_from_reference
+
     # Generate Affective hypotheses.
     def generate_affective_hypotheses(self, kg_in, hypotheses_in):
-        affective_hypotheses = list()
+        affective_hypotheses = HypothesisSet()
 
         # Should be called after first set of causal hypotheses have been generated.
         # 1. For each object in a scene graph, look at each action that the
@@ -514,7 +815,7 @@ class HypothesisGenerator:
 
         # end for node_id, kg_node in kg_in
 
-        return affective_hypotheses
+        return affective_hypotheses.get_list()
     # end generate_affective_hypotheses
 
     # Create affective hypotheses from a given action
@@ -525,7 +826,7 @@ class HypothesisGenerator:
                                          action_node,
                                          object_node,
                                          premise_hypothesis=None):
-        affective_hypotheses = list()
+        affective_hypotheses = HypothesisSet()
 
         # Get the action node's concept
         # If the action does not have a concept, skip it.
@@ -626,7 +927,7 @@ class HypothesisGenerator:
             self.add_hypothesis_to_set(new_hypothesis, affective_hypotheses)
         # end for
 
-        return affective_hypotheses
+        return affective_hypotheses.get_list()
     # end affective_hypotheses_from_action
 
     # Generate causal hypotheses from the endpoints of
@@ -639,7 +940,27 @@ class HypothesisGenerator:
                                          hypotheses_in):
 
         #print("Causal from affective")
-        hypotheses = list()
+        hypotheses = HypothesisSet()
+
+        # Look every concept path up in one index, so there is only
+        # one search out of each distinct affective concept, however
+        # many hypotheses end at it and however many action nodes
+        # there are.
+        concept_path_index = self.concept_path_index
+        if concept_path_index == None:
+            concept_path_index = ConceptPathIndex()
+
+        # Gather the scene graph's action nodes that have concepts,
+        # along with their 'is_concept' edges.
+        action_entries = list()
+        for node_id, kg_node in kg_in.nodes.items():
+            if not kg_node.node_type == 'action':
+                continue
+            action_concept_edge = kg_node.get_first_edge('is_concept')
+            if action_concept_edge == None:
+                continue
+            action_entries.append((kg_node, action_concept_edge))
+        # end for
 
         # Search for affective hypotheses and get the concept
         # node at their endpoints.
@@ -648,41 +969,38 @@ class HypothesisGenerator:
                 continue
             affective_concept = hypothesis.target_node
             #print("Affective concept: " + affective_concept.node_name)
+            # Get the action node in the hypothesis' 'affected_action'
+            # evidence. Don't want to make a hypothesis back to
+            # the action that created this affective hypothesis in
+            # the first place.
+            action_evidence = hypothesis.get_specific_evidence('affected_action')
+            affected_action_node = action_evidence[0].get_datum('action')['value']
             # Go through all of the scene graph's action nodes.
-            for node_id, kg_node in kg_in.nodes.items():
-                if not kg_node.node_type == 'action':
-                    continue
-                # Check it against the action node in the hypothesis'
-                # 'affected_action' evidence. If it matches, skip it.
-                # Don't want to make a hypothesis back to
-                # the action that created this affective hypothesis in
-                # the first place.
-                action_evidence = hypothesis.get_specific_evidence('affected_action')
-                affected_action_node = action_evidence[0].get_datum('action')['value']
+            for kg_node, action_concept_edge in action_entries:
                 if kg_node == affected_action_node:
                     #print('Skipping affected action')
                     continue
-                
-                # Try to find a concept path between the affective
-                # endpoint and the action node.
-                action_concept_edge = kg_node.get_first_edge('is_concept')
-                if action_concept_edge == None:
-                    continue
 
                 #print("    Action node " + kg_node.node_name)
-                
+
+                # Try to find a concept path between the affective
+                # endpoint and the action node.
                 action_concept = action_concept_edge.target_node
+                if not concept_path_index.is_reachable(affective_concept,
+                                                       action_concept,
+                                                       const.causal_filter,
+                                                       self.args.causal_length):
+                    continue
                 initial_edge = KnowledgeGraphEdge(hypothesis.source_node,
                                                   'affected_by',
                                                   hypothesis.target_node)
                 terminating_edge = action_concept_edge
 
-                concept_path = self.concept_path_loop(affective_concept,
-                                                      action_concept,
-                                                      initial_edge,
-                                                      terminating_edge,
-                                                      const.causal_filter,
-                                                      self.args.causal_length)
+                concept_path = concept_path_index.get_path(initial_edge,
+                                                           terminating_edge,
+                                                           action_concept,
+                                                           const.causal_filter,
+                                                           self.args.causal_length)
                 new_hypothesis = self.hypothesis_from_concept_path(concept_path,
                                                                    affective_concept,
                                                                    kg_node,
@@ -694,14 +1012,14 @@ class HypothesisGenerator:
         # end for
         
 
-        return hypotheses
+        return hypotheses.get_list()
     # end causal_hypotheses_from_affective
 
     # Generate hypotheses about the temporal ordering of things.
     def generate_temporal_hypotheses(self,
                                      kg_in,
                                      hypotheses_in):
-        hypotheses = list()
+        hypotheses = HypothesisSet()
 
         # For every Sequence hypotheses, take the start and end
         # nodes and make a one-directional 'before' hypothesis if
@@ -821,7 +1139,7 @@ class HypothesisGenerator:
             
         # end for
 
-        return hypotheses
+        return hypotheses.get_list()
     # end generate_temporal_hypotheses
 
     # Given a concept path, make a hypothesis of the
@@ -914,16 +1232,16 @@ class HypothesisGenerator:
     # hypothesis was altered in any way (True) or not (False). 
     # For use in hypothesis generation.
     def add_hypothesis_to_set(self, hypothesis_to_add, hypothesis_set):
-        # Whether the hypothesis to add was merged with an existing
-        # hypothesis.
-        hypothesis_merged = False
+        # A HypothesisSet only compares the hypothesis to the ones
+        # about the same pair of nodes.
+        if isinstance(hypothesis_set, HypothesisSet):
+            return hypothesis_set, hypothesis_set.add(hypothesis_to_add)
         for existing_hypothesis in hypothesis_set:
             # First, check to see if the hypothesis being added is
             # functionally equivalent to this existing hypothesis.
             # If so, do not add it and return the
             # hypothesis set unchanged.
             if existing_hypothesis.is_functionally_equal_to(hypothesis_to_add):
-                #print("Hypothesis exists. No changes made to set.")
                 return hypothesis_set, False
             
             # The hypotheses will have to draw the same conclusion.
@@ -932,58 +1250,24 @@ class HypothesisGenerator:
             if (existing_hypothesis.source_node.node_id == hypothesis_to_add.source_node.node_id
                 and existing_hypothesis.target_node.node_id == hypothesis_to_add.target_node.node_id
                 and existing_hypothesis.relationship == hypothesis_to_add.relationship):
-
                 # Add each piece of evidence in the new hypothesis
                 # to the existing hypothesis if the existing hypothesis
                 # does not already have the evidence.
-                non_duplicates_found = False
-                for index_1, evidence_to_add in hypothesis_to_add.get_evidence().items():
-                    # Do NOT add the evidence if it already exists in
-                    # the hypothesis it is being merged into.
-                    # Check this by checking each piece of evidence of the same
-                    # type, data by data.
-                    is_duplicate = False
-                    for index_2, existing_evidence in existing_hypothesis.get_evidence().items():
-                        if evidence_to_add == existing_evidence:
-                            is_duplicate = True
-                            break
-                    # end for
-
-                    # Only add the evidence if it is not a duplicate
-                    # of existing evidence. 
-                    if not is_duplicate:
-                        #print("Non-duplicate evidence. Merged.")
-                        non_duplicates_found = True
-                        existing_hypothesis.add_evidence(evidence_to_add)
-                    #else:
-                    #    # DEBUG
-                    #    print("Duplicate evidence. Not merged.")
-                # end for
-                #print("Merging complete.")
-                #if non_duplicates_found:
-                #    print("Non-duplicates found.")
-                #else:
-                #    print("Only duplicate evidence?")
-                
-                hypothesis_merged = True
+                existing_hypothesis.merge_evidence(hypothesis_to_add)
                 # If all hypothesis merging is being done correctly, there
                 # will never be a case where two existing hypotheses have
                 # the same conclusion, as they would have already been
                 # merged.
                 # We can stop here. 
-                break
+                return hypothesis_set, True
             # end if
         # end for
 
         # If we did not end up merging the hypothesis with an existing one,
         # it is a hypothesis with an entirely new conclusion.
         # Add it to the overall set. 
-        if not hypothesis_merged:
-            #print("Adding hypothesis")
-            hypothesis_set.append(hypothesis_to_add)
-            return hypothesis_set, True
-        else:
-            return hypothesis_set, True
+        hypothesis_set.append(hypothesis_to_add)
+        return hypothesis_set, True
     # end add_hypothesis_to_set
 
     # Gets the nodes of all of the scene graph
@@ -1091,96 +1375,166 @@ class HypothesisGenerator:
     # an edge with concept_node_1 as its taret.
     # The terminating edge will be appended to the end of the path
     # at its conclusion. 
+    # Searches forward from the initial edge's target along outgoing
+    # edges and backward from concept_node_2 along incoming edges at
+    # the same time, always growing whichever side's frontier is
+    # smaller, until the two searches meet.
+    # Of all the shortest paths, returns the one a breadth-first search
+    # forward through each node's edges in order would find first.
+    # If there is a concept path index, looks the path up in it
+    # instead, which gives the same path.
     def concept_path_loop(self, concept_node_1, concept_node_2,
                           initial_edge, terminating_edge,
                           coherence_type, max_path_length = -1):
+        if not self.concept_path_index == None:
+            concept_path = self.concept_path_index.get_path(initial_edge,
+                                                            terminating_edge,
+                                                            concept_node_2,
+                                                            coherence_type,
+                                                            max_path_length)
+            if len(concept_path) > 0:
+                print("Concept path found!")
+            return concept_path
+        # end if
+
         concept_path = list()
 
-        # Traverse all outgoing and incoming cn_edge edges
-        # except for 'is_concept' edges.
-        # Make a queue of tuples consisting of:
-        #   'edge': the edge we are going to visit next.
-        #   'path': an ordered list of the edges on our search
-        #           leading to this one. Does not include the
-        #           current edge in 'edge'. 
-        # Use as a FIFO queue
-        bfs_queue = deque()
-        # Keep track of the nodes that have been visited. Do not
-        # visit a node more than once.
-        nodes_visited = list()
-
-        # Initialize the queue with the 'is_concept' edge
-        # leading to the first concept node in the queue.
-        initial_path = list()
-        bfs_queue.append({'edge': initial_edge,
-                         'path': initial_path})
-        
-        # Keep traversing until we run out of edges to traverse. 
-        while len(bfs_queue) > 0:
-            # Pop the first member of the queue
-            current_entry = bfs_queue.popleft()
-            current_edge = current_entry['edge']
-            current_path = current_entry['path']
-
-            # Get the node this edge leads to.
-            current_node = current_edge.target_node
-
-            # Add the current edge to the path
-            next_path = list()
-            for edge in current_path:
-                next_path.append(edge)
-            next_path.append(current_edge)
-
-            # Check if this node is the second concept node.
-            if current_node == concept_node_2:
-                print("Concept path found!")
-                # If so, we have found a path between
-                # the concepts.
-                # Add the terminating edge, then end BFS.
-                if not terminating_edge == None:
-                    next_path.append(terminating_edge)
-                concept_path = next_path
-                break
-            # end if
+        start_node = initial_edge.target_node
+        # The path can have at most max_path_length edges including
+        # the initial edge, so at most one fewer concept edge.
+        max_cn_edge_count = get_max_cn_edge_count(max_path_length)
+
+        # If the first concept node is the second, the path is just
+        # the initial and terminating edges.
+        if start_node == concept_node_2:
+            print("Concept path found!")
+            concept_path.append(initial_edge)
+            if not terminating_edge == None:
+                concept_path.append(terminating_edge)
+            return concept_path
+        # end if
 
-            # If a maximum path length was passed in (is not -1),
-            # then stop searching along this path if the next
-            # path has reached the maximum length.
-            if (max_path_length == -1
-                or len(next_path) < max_path_length):
-                # Get all the edges leading to and from
-                # this node and add them to the queue.
-                all_edges_to_check = list()
-                all_edges_to_check.extend
-                for next_edge in current_node.edges:
-                    # Skip this edge if it leads to a node
-                    # that has already been visited,
-                    # or if it is not a concept edge.
-                    if (next_edge.target_node in nodes_visited
-                        or not next_edge.cn_edge):
-                        continue
-                    # If a coherence type was passed in, then skip
-                    # this edge if its relationship does not match
-                    # the coherence type.
-                    if (coherence_type == ""
-                        or next_edge.relationship in const.coherence_to_cn_rel[coherence_type]):
-                        next_entry = {'edge': next_edge,
-                                      'path': next_path}
-                        # Add it to the queue
-                        bfs_queue.append(next_entry)
-                    # end if
+        # How many concept edges each node found so far is from the
+        # start node, going forward, and from concept_node_2, going
+        # backward. Keyed by node ID.
+        forward_distances = {start_node.node_id: 0}
+        backward_distances = {concept_node_2.node_id: 0}
+        # The nodes found at each distance, on each side.
+        forward_levels = [[start_node]]
+        backward_levels = [[concept_node_2]]
+        # The number of concept edges in the shortest path.
+        # -1 until the searches meet.
+        path_edge_count = -1
+        while (len(forward_levels[-1]) > 0
+               and len(backward_levels[-1]) > 0
+               and (max_cn_edge_count == -1
+                    or len(forward_levels) + len(backward_levels) - 2 < max_cn_edge_count)):
+            # Grow whichever side has the smaller frontier.
+            if len(forward_levels[-1]) <= len(backward_levels[-1]):
+                next_level = list()
+                for current_node in forward_levels[-1]:
+                    for next_edge in current_node.edges:
+                        next_node = next_edge.target_node
+                        if (next_node.node_id in forward_distances
+                            or not self.is_concept_path_edge(next_edge, coherence_type)):
+                            continue
+                        forward_distances[next_node.node_id] = len(forward_levels)
+                        next_level.append(next_node)
+                    # end for
                 # end for
+                forward_levels.append(next_level)
+            else:
+                next_level = list()
+                for current_node in backward_levels[-1]:
+                    for next_edge in current_node.edges_in:
+                        next_node = next_edge.source_node
+                        if (next_node.node_id in backward_distances
+                            or not self.is_concept_path_edge(next_edge, coherence_type)):
+                            continue
+                        backward_distances[next_node.node_id] = len(backward_levels)
+                        next_level.append(next_node)
+                    # end for
+                # end for
+                backward_levels.append(next_level)
             # end if
+            # The searches have met if the new level has any node the
+            # other side has found. The shortest path goes through the
+            # one closest to both ends.
+            for node in next_level:
+                if (node.node_id in forward_distances
+                    and node.node_id in backward_distances):
+                    edge_count = (forward_distances[node.node_id] +
+                                  backward_distances[node.node_id])
+                    if path_edge_count == -1 or edge_count < path_edge_count:
+                        path_edge_count = edge_count
+                # end if
+            # end for
+            if not path_edge_count == -1:
+                break
+        # end while
 
-            # Note that we have visited this node.
-            nodes_visited.append(current_node)
-            
+        # If the searches never met, there is no path.
+        if path_edge_count == -1:
+            return concept_path
+
+        print("Concept path found!")
+        # Build the path one edge at a time from the start node,
+        # always taking the first edge that stays on a shortest path.
+        # Past meeting_distance, whether a node is on a shortest path
+        # is known from its backward distance. Up to meeting_distance,
+        # mark the forward-side nodes that lead to a node on a shortest
+        # path at meeting_distance, working back towards the start.
+        meeting_distance = max(0, path_edge_count - (len(backward_levels) - 1))
+        on_path_node_ids = [None] * (meeting_distance + 1)
+        on_path_node_ids[meeting_distance] = set()
+        for node in forward_levels[meeting_distance]:
+            if backward_distances.get(node.node_id) == path_edge_count - meeting_distance:
+                on_path_node_ids[meeting_distance].add(node.node_id)
+        # end for
+        for distance in range(meeting_distance - 1, -1, -1):
+            on_path_node_ids[distance] = set()
+            for node in forward_levels[distance + 1]:
+                if not node.node_id in on_path_node_ids[distance + 1]:
+                    continue
+                for previous_edge in node.edges_in:
+                    if (forward_distances.get(previous_edge.source_node.node_id) == distance
+                        and self.is_concept_path_edge(previous_edge, coherence_type)):
+                        on_path_node_ids[distance].add(previous_edge.source_node.node_id)
+                # end for
+            # end for
+        # end for
 
-        # end while
+        concept_path.append(initial_edge)
+        current_node = start_node
+        for distance in range(1, path_edge_count + 1):
+            for next_edge in current_node.edges:
+                if not self.is_concept_path_edge(next_edge, coherence_type):
+                    continue
+                next_node_id = next_edge.target_node.node_id
+                if distance <= meeting_distance:
+                    on_path = next_node_id in on_path_node_ids[distance]
+                else:
+                    on_path = (backward_distances.get(next_node_id)
+                               == path_edge_count - distance)
+                if on_path:
+                    concept_path.append(next_edge)
+                    current_node = next_edge.target_node
+                    break
+                # end if
+            # end for
+        # end for
+        # Add the terminating edge.
+        if not terminating_edge == None:
+            concept_path.append(terminating_edge)
         
         return concept_path
     # end concept_path_loop
 
+    # Whether a concept path can go through an edge.
+    def is_concept_path_edge(self, edge, coherence_type):
+        return is_concept_path_edge(edge, coherence_type)
+    # end is_concept_path_edge
+
     # Given a concept path, determine whether the causal flow
     # is forward, backward, or neutral. 
     def determine_causal_flow(self, concept_path_in):
@@ -1290,3 +1644,20 @@ class HypothesisGenerator:
 
 
 # end HypothesisGenerator
+
+# The state causal hypothesis workers share. It is set in the parent
+# process just before the worker pool is forked, so every worker
+# inherits a snapshot of it instead of having it sent over.
+causal_worker_state = dict()
+
+# Describe the causal hypotheses for one row of action node pairs in
+# a worker process.
+# Returns the row's descriptions.
+def describe_causal_row_worker(row_index):
+    generator = causal_worker_state['generator']
+    return generator.describe_causal_row(causal_worker_state['kg'],
+                                         causal_worker_state['hypotheses'],
+                                         causal_worker_state['action_entries'],
+                                         causal_worker_state['is_hypothesis_index'],
+                                         row_index)
+# end describe_causal_row_worker
@@ -0,0 +1,204 @@
+from collections import deque
+
+# A disjoint-set (union-find) structure over hashable items.
+# Uses path compression and union by rank, so any sequence of
+# finds and unions takes near-linear time.
+class DisjointSet:
+    # Each item's parent item. Roots are their own parents.
+    parents = dict()
+    # An upper bound on the height of each root's tree.
+    ranks = dict()
+
+    def __init__(self):
+        self.parents = dict()
+        self.ranks = dict()
+    # end __init__
+
+    def __contains__(self, item):
+        return item in self.parents
+    # end __contains__
+
+    # Add an item in a set of its own, if it isn't in a set already.
+    def add(self, item):
+        if not item in self.parents:
+            self.parents[item] = item
+            self.ranks[item] = 0
+    # end add
+
+    # Find the root item of the set the given item is in.
+    def find(self, item):
+        self.add(item)
+        root = item
+        while not self.parents[root] == root:
+            root = self.parents[root]
+        # end while
+        # Point every item on the way straight at the root.
+        while not self.parents[item] == root:
+            next_item = self.parents[item]
+            self.parents[item] = root
+            item = next_item
+        # end while
+        return root
+    # end find
+
+    # Merge the sets of the two given items.
+    # Returns the root of the merged set.
+    def union(self, item_1, item_2):
+        root_1 = self.find(item_1)
+        root_2 = self.find(item_2)
+        if root_1 == root_2:
+            return root_1
+        # Hang the shorter tree under the taller one.
+        if self.ranks[root_1] < self.ranks[root_2]:
+            root_1, root_2 = root_2, root_1
+        self.parents[root_2] = root_1
+        if self.ranks[root_1] == self.ranks[root_2]:
+            self.ranks[root_1] += 1
+        return root_1
+    # end union
+
+    # Whether two items are in the same set.
+    def connected(self, item_1, item_2):
+        return self.find(item_1) == self.find(item_2)
+    # end connected
+
+    # Get every set, each as a list of its items in the order they
+    # were added. The sets are in the order of their first item.
+    def get_sets(self):
+        sets = dict()
+        for item in self.parents.keys():
+            sets.setdefault(self.find(item), list()).append(item)
+        # end for
+        return list(sets.values())
+    # end get_sets
+# end class DisjointSet
+
+
+# Resolves which nodes are the same entity given a set of 'is'
+# hypotheses between them. Two nodes are co-referent if a chain of
+# 'is' hypotheses links them, so co-referent nodes form equivalence
+# classes.
+# Also finds the co-referent pairs that no hypothesis links directly,
+# along with the two hypotheses and third node that would be the
+# 'shared_object' evidence for a hypothesis linking them.
+class IdentityResolver:
+    # The equivalence classes, as a disjoint set of node IDs.
+    disjoint_set = None
+
+    # The nodes hypotheses have been added for, keyed by node ID.
+    nodes = dict()
+
+    # The hypotheses linking each pair of nodes.
+    #   Key is a node ID.
+    #   Value is a dictionary keyed by the ID of each node the
+    #   first node is linked to, whose value is the first hypothesis
+    #   found linking them.
+    links = dict()
+
+    def __init__(self, hypotheses_in=list()):
+        self.disjoint_set = DisjointSet()
+        self.nodes = dict()
+        self.links = dict()
+        for hypothesis in hypotheses_in:
+            self.add_hypothesis(hypothesis)
+        # end for
+    # end __init__
+
+    # Add an 'is' hypothesis linking two nodes.
+    def add_hypothesis(self, hypothesis_in):
+        source_id = hypothesis_in.source_node.node_id
+        target_id = hypothesis_in.target_node.node_id
+        self.nodes[source_id] = hypothesis_in.source_node
+        self.nodes[target_id] = hypothesis_in.target_node
+        self.links.setdefault(source_id, dict()).setdefault(target_id, hypothesis_in)
+        self.links.setdefault(target_id, dict()).setdefault(source_id, hypothesis_in)
+        self.disjoint_set.union(source_id, target_id)
+    # end add_hypothesis
+
+    # Whether two nodes are co-referent.
+    def are_coreferent(self, node_id_1, node_id_2):
+        if not (node_id_1 in self.disjoint_set and node_id_2 in self.disjoint_set):
+            return False
+        return self.disjoint_set.connected(node_id_1, node_id_2)
+    # end are_coreferent
+
+    # Get the equivalence classes of co-referent nodes, each as a
+    # list of node IDs.
+    # If a node order is given, as a list of node IDs, each class
+    # and the list of classes follow it.
+    def get_equivalence_classes(self, node_order=None):
+        equivalence_classes = self.disjoint_set.get_sets()
+        if node_order == None:
+            return equivalence_classes
+        positions = self.get_positions(node_order)
+        for equivalence_class in equivalence_classes:
+            equivalence_class.sort(key=lambda node_id: positions[node_id])
+        # end for
+        equivalence_classes.sort(key=lambda equivalence_class: positions[equivalence_class[0]])
+        return equivalence_classes
+    # end get_equivalence_classes
+
+    # Go through every pair of co-referent nodes that no hypothesis
+    # links directly, where the first node is of the given node type.
+    # For each one, yields a tuple of:
+    #   the first node,
+    #   the second node,
+    #   the hypothesis linking the first node to a third node,
+    #   the hypothesis linking the third node to the second node,
+    #   the third node.
+    # Pairs are found by a breadth-first search from each first node
+    # in node order, so the third node is always linked to the first
+    # node either directly or by a pair yielded before. Add the
+    # hypothesis made for each pair with add_hypothesis before asking
+    # for the next pair, so later pairs can use it.
+    def get_missing_links(self, node_order, source_node_type='object'):
+        positions = self.get_positions(node_order)
+        for equivalence_class in self.get_equivalence_classes(node_order):
+            for source_id in equivalence_class:
+                source_node = self.nodes[source_id]
+                if not source_node.node_type == source_node_type:
+                    continue
+                # Breadth-first search from the source node, visiting
+                # each node's links in node order.
+                parents = dict()
+                parents[source_id] = None
+                search_queue = deque([source_id])
+                while len(search_queue) > 0:
+                    current_id = search_queue.popleft()
+                    for next_id in sorted(self.links[current_id].keys(),
+                                          key=lambda node_id: positions[node_id]):
+                        if next_id in parents:
+                            continue
+                        parents[next_id] = current_id
+                        search_queue.append(next_id)
+                        # Nodes one link away are already linked.
+                        if current_id == source_id:
+                            continue
+                        # Don't link the same pair twice.
+                        if source_id in self.links[next_id]:
+                            continue
+                        yield (source_node,
+                               self.nodes[next_id],
+                               self.links[source_id][current_id],
+                               self.links[current_id][next_id],
+                               self.nodes[current_id])
+                    # end for
+                # end while
+            # end for
+        # end for
+    # end get_missing_links
+
+    # Get where each node is in the given node order.
+    # Nodes that aren't in it go after all the ones that are.
+    def get_positions(self, node_order):
+        positions = dict()
+        for node_id in node_order:
+            positions[node_id] = len(positions)
+        # end for
+        for node_id in self.nodes.keys():
+            if not node_id in positions:
+                positions[node_id] = len(positions)
+        # end for
+        return positions
+    # end get_positions
+# end class IdentityResolver
@@ -491,13 +491,39 @@ class NodeFactory:
 
     # An external knowledge querier for getting cleaned names
     querier = None
+
+    # Embeddings fetched ahead of time by prefetch_embeddings,
+    # keyed by cleaned concept name.
+    prefetched_embeddings = dict()
+
+    # A loaded EmbeddingStore to get embeddings from instead of
+    # the database. None to get them from the database.
+    embedding_store = None
     
-    def __init__(self):
+    def __init__(self, querier_in=None, embedding_store_in=None):
         self.node_id_counter = -1
-        self.querier = ExternalKnowledgeQuerier()
+        # Use the given querier if there is one so the factory
+        # shares its database connections.
+        if querier_in == None:
+            self.querier = ExternalKnowledgeQuerier()
+        else:
+            self.querier = querier_in
+        self.prefetched_embeddings = dict()
+        self.embedding_store = embedding_store_in
         print("Node factory initialized")
     # end __init__
 
+    # Fetch the embeddings of many concepts at once so that making
+    # their concept nodes later does not query the database once
+    # per node.
+    def prefetch_embeddings(self, concept_names):
+        # The embedding store's lookups are already cheap.
+        if not self.embedding_store == None:
+            return
+        embeddings = self.querier.GetEmbeddingsMany(concept_names)
+        self.prefetched_embeddings.update(embeddings)
+    # end prefetch_embeddings
+
     # Make a knowledge graph node.
     # Returns the new node.
     def make_kg_node(self,
@@ -527,7 +553,12 @@ class NodeFactory:
         # If this node is a concept node, get its embedding as well.
         embedding = list()
         if node_type_in == 'concept':
-            embedding = self.querier.GetEmbedding(clean_name)
+            if not self.embedding_store == None:
+                embedding = self.embedding_store.get_embedding(clean_name)
+            elif clean_name in self.prefetched_embeddings:
+                embedding = self.prefetched_embeddings[clean_name]
+            else:
+                embedding = self.querier.GetEmbedding(clean_name)
         # end if
 
         # Make the kg node
@@ -22,6 +22,14 @@ def main():
     parser.add_argument('--causal_length', default=3)
     # Whether or not edges should be restricted to causal edges.
     parser.add_argument('--causal_type', default=False)
+    # How to find transitive 'is' hypotheses between objects.
+    # 'fixpoint' repeats the referential second pass until nothing
+    # changes. 'union_find' groups co-referent objects with a
+    # disjoint set and hypothesizes each missing pair once.
+    parser.add_argument('--referential_closure', default='fixpoint')
+    # How many worker processes to split causal hypothesis generation
+    # across. Hypotheses come out the same for any number of workers.
+    parser.add_argument('--causal_workers', default=1)
     # Whether we should generate all sets or just
     # the optimal one while doing hypothesis
     # evaluation.
@@ -31,6 +39,46 @@ def main():
     parser.add_argument('--density_weight', default=1000)
     parser.add_argument('--connectivity_weight', default=1)
     parser.add_argument('--evidence_weight', default=2)
+    # The most hypotheses a group of mutually contradicting
+    # hypotheses can have to be resolved exactly. Larger groups are
+    # resolved by a heuristic search.
+    parser.add_argument('--mwis_exact_size', default=64)
+    # The most seconds to spend resolving each group of
+    # contradicting hypotheses.
+    parser.add_argument('--mwis_time_budget', default=10)
+    # The most seconds to spend choosing the hypothesis set, or -1
+    # for no limit. It counts from the start of optimization, so
+    # estimating hypothesis scores uses it up too, but only the search
+    # for the set stops early: when it runs out, the best set found so
+    # far is used. Filtering and scoring the chosen set always run to
+    # the end, after the budget.
+    parser.add_argument('--optimize_time_budget', default=-1)
+    # Where to checkpoint the best hypothesis set found so far, as
+    # hypothesis IDs, e.g. data/optimize_checkpoint.json. If the file
+    # exists, optimization resumes from it. Empty to not checkpoint.
+    parser.add_argument('--optimize_checkpoint', default='')
+    # How many pooled connections to the concepts database to
+    # keep open for the run. 0 opens a new connection for
+    # every command.
+    parser.add_argument('--db_pool_size', default=4)
+    # The path of an embedding matrix exported by embedding_store.py.
+    # If given, concept embeddings are read from it instead of
+    # the concepts database.
+    parser.add_argument('--embedding_matrix', default='')
+    # Whether to never query the ConceptNet API and use only what is
+    # already in the concepts database, e.g. after importing a
+    # ConceptNet assertions dump with conceptnet_importer.py.
+    parser.add_argument('--offline', default=False)
+    # The URL of the ConceptNet API to query for concepts that are
+    # not in the concepts database yet.
+    parser.add_argument('--conceptnet_api_url', default='http://api.conceptnet.io/query?')
+    # How many concepts' predicates and embeddings to cache in
+    # memory, and the most bytes the caches can take up.
+    parser.add_argument('--cache_entries', default=100000)
+    parser.add_argument('--cache_bytes', default=268435456)
+    # Where to save the caches between runs, e.g. data/query_cache.
+    # Empty to not save them.
+    parser.add_argument('--cache_path', default='')
 
     args = parser.parse_args()
     
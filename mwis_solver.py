@@ -0,0 +1,460 @@
+import os
+import json
+import time
+
+# Finds a maximum weight independent set of a graph: the set of
+# vertices with the highest total weight where no two vertices
+# share an edge.
+# The graph is split into its connected components, which are solved
+# on their own. Components up to exact_size_limit vertices are solved
+# exactly by branch-and-bound. Larger ones, and any whose exact search
+# runs out of time, get a greedy solution improved by local search.
+# Each component's result is reported with an upper bound on its best
+# possible weight, so how far a solution may be from the optimum
+# is known.
+# Vertices with a weight of 0 or less are never chosen.
+# The search is anytime: a greedy solution for the whole graph is
+# found first and only improved on after that, so if the total time
+# budget runs out the best solution found so far is returned. How the
+# best solution's weight improved over time is kept, and the best
+# solution can be checkpointed to a file and resumed from.
+class MWISSolver:
+    # The most vertices a component can have to be solved exactly.
+    exact_size_limit = 64
+    # The most seconds to spend searching any one component.
+    time_budget = 10.0
+    # The most seconds to spend on the whole graph, or -1 for
+    # no limit.
+    total_time_budget = -1
+    # Where to checkpoint the best solution after each component is
+    # solved. Empty to not checkpoint it.
+    checkpoint_path = ''
+
+    # The weight of each vertex, keyed by vertex.
+    weights = dict()
+    # The component being solved, as a list of vertices, heaviest
+    # first, and their weights.
+    component = list()
+    component_weights = list()
+    # Each vertex's index in the component being solved.
+    # Vertex sets in a component are ints used as bitsets over
+    # these indices.
+    vertex_indices = dict()
+    # The neighbors of each vertex in the component, as bitsets.
+    neighbor_masks = list()
+
+    # The best solution found so far for the component being solved,
+    # as a bitset, and its weight.
+    incumbent = 0
+    incumbent_weight = 0
+    # The total weight of the best solutions of every other component.
+    other_components_weight = 0
+    # When the search of the component being solved has to stop,
+    # from time.perf_counter.
+    deadline = 0
+
+    # When solving started, from time.perf_counter.
+    start_time = 0
+    # How the weight of the best solution for the whole graph
+    # improved, as a list of dictionaries of:
+    #   'time': the seconds since solving started
+    #   'weight': the best solution's weight at that time.
+    incumbent_history = list()
+
+    def __init__(self, exact_size_limit=64, time_budget=10.0,
+                 total_time_budget=-1, checkpoint_path=''):
+        self.exact_size_limit = exact_size_limit
+        self.time_budget = time_budget
+        self.total_time_budget = total_time_budget
+        self.checkpoint_path = checkpoint_path
+        self.weights = dict()
+        self.component = list()
+        self.component_weights = list()
+        self.vertex_indices = dict()
+        self.neighbor_masks = list()
+        self.incumbent = 0
+        self.incumbent_weight = 0
+        self.other_components_weight = 0
+        self.deadline = 0
+        self.start_time = 0
+        self.incumbent_history = list()
+    # end __init__
+
+    # Solve the maximum weight independent set problem.
+    # weights is a dictionary keyed by vertex whose values are the
+    # vertices' weights. adjacency is a dictionary keyed by vertex
+    # whose values are the vertices it shares an edge with. An edge
+    # listed under only one of its vertices still counts both ways.
+    # Vertices missing from weights are ignored.
+    # If an initial solution is given, as a list of vertices, e.g.
+    # from load_checkpoint, the search starts from it.
+    # Returns a tuple of:
+    #   the list of vertices in the independent set,
+    #   the independent set's total weight,
+    #   a list with a report for each component, as a dictionary of:
+    #       'size': the number of vertices in the component
+    #       'method': 'exact' or 'heuristic'
+    #       'weight': the weight of the component's solution
+    #       'upper_bound': the most the solution's weight can be
+    #       'gap': how far the weight is below the upper bound, as
+    #           a fraction of the upper bound.
+    def solve(self, weights, adjacency, initial_solution=None):
+        self.weights = weights
+        self.start_time = time.perf_counter()
+        self.incumbent_history = list()
+        total_deadline = float('inf')
+        if self.total_time_budget >= 0:
+            total_deadline = self.start_time + self.total_time_budget
+        if initial_solution == None:
+            initial_solution = list()
+        initial_solution = set(initial_solution)
+
+        # Components have to follow edges both ways to be independent
+        # of each other.
+        adjacency = self.symmetrize_adjacency(adjacency)
+        components = self.find_components(weights, adjacency)
+
+        # First, quickly find a solution for every component, so
+        # there is a solution for the whole graph however soon
+        # time runs out.
+        component_solutions = list()
+        for component in components:
+            self.set_component(component, adjacency)
+            solution = self.greedy_solution(self.get_all_vertices())
+            initial_component_solution = self.repair_solution([vertex for vertex in component
+                                                               if vertex in initial_solution])
+            if self.get_weight(initial_component_solution) > self.get_weight(solution):
+                solution = initial_component_solution
+            component_solutions.append(solution)
+        # end for
+        component_weights = [self.get_weight_in(component, solution)
+                             for component, solution in zip(components, component_solutions)]
+        self.record_incumbent(sum(component_weights))
+
+        # Then improve on each component's solution in turn, until
+        # time runs out.
+        component_reports = list()
+        for component_index, component in enumerate(components):
+            self.set_component(component, adjacency)
+            self.incumbent = component_solutions[component_index]
+            self.incumbent_weight = component_weights[component_index]
+            self.other_components_weight = sum(component_weights) - self.incumbent_weight
+            self.deadline = min(time.perf_counter() + self.time_budget, total_deadline)
+            component_reports.append(self.solve_component())
+            component_solutions[component_index] = self.incumbent
+            component_weights[component_index] = self.incumbent_weight
+            if not self.checkpoint_path == '':
+                self.save_checkpoint(self.checkpoint_path,
+                                     self.get_solution_vertices(components, component_solutions),
+                                     sum(component_weights))
+        # end for
+
+        independent_set = self.get_solution_vertices(components, component_solutions)
+        return independent_set, sum(component_weights), component_reports
+    # end solve
+
+    # Make a copy of an adjacency dictionary in which every edge is
+    # listed under both of its vertices, and no vertex is its own
+    # neighbor. Each vertex's neighbors are a set.
+    def symmetrize_adjacency(self, adjacency):
+        symmetric_adjacency = dict()
+        for vertex, neighbors in adjacency.items():
+            for neighbor in neighbors:
+                if neighbor == vertex:
+                    continue
+                symmetric_adjacency.setdefault(vertex, set()).add(neighbor)
+                symmetric_adjacency.setdefault(neighbor, set()).add(vertex)
+            # end for
+        # end for
+        return symmetric_adjacency
+    # end symmetrize_adjacency
+
+    # Split the positive-weight vertices into connected components.
+    # Returns a list of components, each a list of vertices.
+    # Components, and the vertices in each, are in order of
+    # decreasing weight, then by vertex, so results don't depend on
+    # the order of the dictionaries passed in.
+    def find_components(self, weights, adjacency):
+        vertices = sorted([vertex for vertex, weight in weights.items() if weight > 0],
+                          key=lambda vertex: (-weights[vertex], vertex))
+        component_of = dict()
+        components = list()
+        for start_vertex in vertices:
+            if start_vertex in component_of:
+                continue
+            component = [start_vertex]
+            component_of[start_vertex] = len(components)
+            # Depth-first search out from the start vertex.
+            vertex_stack = [start_vertex]
+            while len(vertex_stack) > 0:
+                vertex = vertex_stack.pop()
+                for neighbor in adjacency.get(vertex, list()):
+                    if (neighbor in component_of
+                        or not weights.get(neighbor, 0) > 0):
+                        continue
+                    component_of[neighbor] = len(components)
+                    component.append(neighbor)
+                    vertex_stack.append(neighbor)
+                # end for
+            # end while
+            component.sort(key=lambda vertex: (-weights[vertex], vertex))
+            components.append(component)
+        # end for
+        return components
+    # end find_components
+
+    # Make the given component the one being solved.
+    # The adjacency has to list every edge under both its vertices,
+    # as symmetrize_adjacency makes it.
+    def set_component(self, component, adjacency):
+        self.component = component
+        self.component_weights = [self.weights[vertex] for vertex in component]
+        self.vertex_indices = dict()
+        for vertex_index, vertex in enumerate(component):
+            self.vertex_indices[vertex] = vertex_index
+        # end for
+        self.neighbor_masks = list()
+        for vertex in component:
+            neighbor_mask = 0
+            for neighbor in adjacency.get(vertex, list()):
+                if neighbor in self.vertex_indices and not neighbor == vertex:
+                    neighbor_mask |= 1 << self.vertex_indices[neighbor]
+            # end for
+            self.neighbor_masks.append(neighbor_mask)
+        # end for
+    # end set_component
+
+    # Solve the component being solved, starting from its incumbent.
+    # Returns the component's report.
+    def solve_component(self):
+        report = dict()
+        report['size'] = len(self.component)
+        all_vertices = self.get_all_vertices()
+        upper_bound = self.clique_cover_bound(all_vertices)
+
+        method = 'heuristic'
+        if time.perf_counter() <= self.deadline:
+            self.update_incumbent(self.local_search(self.incumbent))
+            if len(self.component) <= self.exact_size_limit:
+                if self.branch_and_bound(0, 0, all_vertices):
+                    method = 'exact'
+                    upper_bound = self.incumbent_weight
+            # end if
+        # end if
+
+        report['method'] = method
+        report['weight'] = self.incumbent_weight
+        report['upper_bound'] = upper_bound
+        report['gap'] = 0
+        if upper_bound > 0:
+            report['gap'] = (upper_bound - self.incumbent_weight) / upper_bound
+        return report
+    # end solve_component
+
+    # Make a solution the component's incumbent if it is better.
+    def update_incumbent(self, solution):
+        solution_weight = self.get_weight(solution)
+        if solution_weight > self.incumbent_weight:
+            self.incumbent = solution
+            self.incumbent_weight = solution_weight
+            self.record_incumbent(self.other_components_weight + solution_weight)
+        # end if
+    # end update_incumbent
+
+    # Note the weight of the best solution for the whole graph.
+    def record_incumbent(self, total_weight):
+        entry = dict()
+        entry['time'] = time.perf_counter() - self.start_time
+        entry['weight'] = total_weight
+        self.incumbent_history.append(entry)
+    # end record_incumbent
+
+    # Get the vertices in every component's solution, as a list.
+    def get_solution_vertices(self, components, component_solutions):
+        solution_vertices = list()
+        for component, solution in zip(components, component_solutions):
+            solution_vertices.extend([component[vertex_index]
+                                      for vertex_index in self.get_indices(solution)])
+        # end for
+        return solution_vertices
+    # end get_solution_vertices
+
+    # Write a solution, as a list of vertices, and its weight to a
+    # JSON checkpoint file.
+    def save_checkpoint(self, file_path, solution_vertices, solution_weight):
+        checkpoint = dict()
+        checkpoint['solution'] = solution_vertices
+        checkpoint['weight'] = solution_weight
+        with open(file_path, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+    # end save_checkpoint
+
+    # Read the solution from a checkpoint file written by
+    # save_checkpoint.
+    # Returns the list of vertices, or an empty list if the file
+    # doesn't exist.
+    def load_checkpoint(self, file_path):
+        if not os.path.exists(file_path):
+            return list()
+        with open(file_path, 'r') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        return checkpoint['solution']
+    # end load_checkpoint
+
+    # Search for the best independent set containing the chosen
+    # vertices and any of the candidate vertices, updating the
+    # incumbent whenever a better one is found.
+    # Returns False if it ran out of time before finishing.
+    def branch_and_bound(self, chosen, chosen_weight, candidates):
+        if chosen_weight > self.incumbent_weight:
+            self.update_incumbent(chosen)
+        if candidates == 0:
+            return True
+        if time.perf_counter() > self.deadline:
+            return False
+        # Prune if even the candidates' upper bound can't beat the
+        # incumbent.
+        if chosen_weight + self.clique_cover_bound(candidates) <= self.incumbent_weight:
+            return True
+        # Branch on the heaviest candidate, which comes first.
+        vertex_index = self.get_first_index(candidates)
+        vertex_bit = 1 << vertex_index
+        # Either it is in the set, so none of its neighbors are...
+        if not self.branch_and_bound(chosen | vertex_bit,
+                                     chosen_weight + self.component_weights[vertex_index],
+                                     candidates & ~vertex_bit & ~self.neighbor_masks[vertex_index]):
+            return False
+        # ...or it isn't.
+        return self.branch_and_bound(chosen, chosen_weight, candidates & ~vertex_bit)
+    # end branch_and_bound
+
+    # Get an upper bound on the weight of an independent set of the
+    # given vertices by covering them with cliques. An independent set
+    # can have at most one vertex from each clique, so the bound is
+    # the sum of each clique's heaviest vertex.
+    def clique_cover_bound(self, vertices):
+        bound = 0
+        remaining = vertices
+        while not remaining == 0:
+            # Start a clique from the heaviest remaining vertex, then
+            # grow it with the vertices adjacent to everything in it.
+            vertex_index = self.get_first_index(remaining)
+            bound += self.component_weights[vertex_index]
+            remaining &= ~(1 << vertex_index)
+            common_neighbors = remaining & self.neighbor_masks[vertex_index]
+            while not common_neighbors == 0:
+                vertex_index = self.get_first_index(common_neighbors)
+                remaining &= ~(1 << vertex_index)
+                common_neighbors &= ~(1 << vertex_index) & self.neighbor_masks[vertex_index]
+            # end while
+        # end while
+        return bound
+    # end clique_cover_bound
+
+    # Greedily build an independent set of the given vertices,
+    # going through them by how much weight they have per neighbor
+    # they would rule out and taking each one that is still free.
+    def greedy_solution(self, vertices):
+        vertex_order = sorted(self.get_indices(vertices),
+                              key=lambda vertex_index: (-self.component_weights[vertex_index]
+                                                        / (bin(self.neighbor_masks[vertex_index]
+                                                               & vertices).count('1') + 1),
+                                                        vertex_index))
+        solution = 0
+        for vertex_index in vertex_order:
+            if solution & self.neighbor_masks[vertex_index] == 0:
+                solution |= 1 << vertex_index
+        # end for
+        return solution
+    # end greedy_solution
+
+    # Improve a solution by swapping vertices in for their neighbors
+    # in the solution whenever they outweigh them, then filling in
+    # any vertices that are now free. Stops when no swap helps or
+    # time runs out.
+    def local_search(self, solution):
+        improved = True
+        while improved and time.perf_counter() <= self.deadline:
+            improved = False
+            for vertex_index in range(len(self.component_weights)):
+                vertex_bit = 1 << vertex_index
+                if not solution & vertex_bit == 0:
+                    continue
+                conflicts = solution & self.neighbor_masks[vertex_index]
+                if self.component_weights[vertex_index] > self.get_weight(conflicts):
+                    solution = (solution & ~conflicts) | vertex_bit
+                    solution = self.fill_solution(solution)
+                    improved = True
+                # end if
+            # end for
+        # end while
+        return solution
+    # end local_search
+
+    # Make an independent set of the component being solved from
+    # the given vertices, heaviest first, leaving out any that share
+    # an edge with a heavier one, then fill it in.
+    # Returns the solution as a bitset.
+    def repair_solution(self, vertices):
+        solution = 0
+        for vertex in vertices:
+            vertex_index = self.vertex_indices[vertex]
+            if solution & self.neighbor_masks[vertex_index] == 0:
+                solution |= 1 << vertex_index
+        # end for
+        return self.fill_solution(solution)
+    # end repair_solution
+
+    # Add every vertex that has no neighbor in the solution to it,
+    # heaviest first.
+    def fill_solution(self, solution):
+        for vertex_index in range(len(self.component_weights)):
+            if (solution & (1 << vertex_index) == 0
+                and solution & self.neighbor_masks[vertex_index] == 0):
+                solution |= 1 << vertex_index
+        # end for
+        return solution
+    # end fill_solution
+
+    # Get every vertex in the component being solved, as a bitset.
+    def get_all_vertices(self):
+        return (1 << len(self.component)) - 1
+    # end get_all_vertices
+
+    # Get the total weight of a solution to the given component.
+    def get_weight_in(self, component, solution):
+        weight = 0
+        for vertex_index in self.get_indices(solution):
+            weight += self.weights[component[vertex_index]]
+        # end for
+        return weight
+    # end get_weight_in
+
+    # Get the total weight of a set of vertices.
+    def get_weight(self, vertices):
+        weight = 0
+        for vertex_index in self.get_indices(vertices):
+            weight += self.component_weights[vertex_index]
+        # end for
+        return weight
+    # end get_weight
+
+    # Get the index of the lowest vertex in a non-empty bitset, which
+    # is also the heaviest.
+    def get_first_index(self, vertices):
+        return (vertices & -vertices).bit_length() - 1
+    # end get_first_index
+
+    # Get the indices of the vertices in a bitset, lowest first.
+    # Vertices are indexed heaviest first, so this is also the
+    # heaviest vertex first.
+    def get_indices(self, vertices):
+        indices = list()
+        while not vertices == 0:
+            lowest_bit = vertices & -vertices
+            indices.append(lowest_bit.bit_length() - 1)
+            vertices ^= lowest_bit
+        # end while
+        return indices
+    # end get_indices
+# end class MWISSolver
@@ -234,6 +234,9 @@ class OutputWriter:
         for hypothesis in hypothesis_in.contradicting_hypotheses:
             contradicting_hypotheses.append(hypothesis.hypothesis_id)
         # end for
+        # The contradicting hypotheses are a set, so sort their IDs
+        # to keep the output the same from run to run.
+        contradicting_hypotheses.sort()
         hypothesis_entry['contradicting_hypotheses'] = contradicting_hypotheses
 
         evidence_set = list()
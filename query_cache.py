@@ -0,0 +1,159 @@
+import os
+import sys
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+
+# A bounded, least-recently-used cache of query results.
+# Holds at most max_entries entries and about max_bytes bytes of
+# values. When either limit is passed, the entries used least
+# recently are evicted first.
+class LRUCache:
+    # The cached values keyed by query, ordered from least to most
+    # recently used.
+    entries = None
+    # The estimated size in bytes of each entry, keyed by query.
+    entry_sizes = dict()
+
+    # The most entries the cache can hold.
+    max_entries = 100000
+    # The most bytes of values the cache can hold.
+    max_bytes = 268435456
+    # The estimated bytes of values the cache holds right now.
+    current_bytes = 0
+
+    # Statistics on how well the cache is doing.
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, max_entries=100000, max_bytes=268435456):
+        self.entries = OrderedDict()
+        self.entry_sizes = dict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    # end __init__
+
+    def __len__(self):
+        return len(self.entries)
+    # end __len__
+
+    def __contains__(self, key):
+        return key in self.entries
+    # end __contains__
+
+    # Get the value cached for a key, marking it as the most
+    # recently used.
+    # Returns the default if the key isn't cached.
+    def get(self, key, default=None):
+        if not key in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+    # end get
+
+    # Cache a value for a key, evicting the least recently used
+    # entries if the cache is over either limit.
+    def put(self, key, value):
+        if key in self.entries:
+            self.remove(key)
+        entry_size = estimate_size(value)
+        # Don't cache values that wouldn't fit even on their own.
+        if entry_size > self.max_bytes or self.max_entries <= 0:
+            return
+        self.entries[key] = value
+        self.entry_sizes[key] = entry_size
+        self.current_bytes += entry_size
+        while (len(self.entries) > self.max_entries or
+               self.current_bytes > self.max_bytes):
+            oldest_key = next(iter(self.entries))
+            self.remove(oldest_key)
+            self.evictions += 1
+        # end while
+    # end put
+
+    # Remove a key from the cache, if it is there.
+    def remove(self, key):
+        if not key in self.entries:
+            return
+        del self.entries[key]
+        self.current_bytes -= self.entry_sizes.pop(key)
+    # end remove
+
+    # Remove every entry from the cache. Statistics are kept.
+    def clear(self):
+        self.entries.clear()
+        self.entry_sizes.clear()
+        self.current_bytes = 0
+    # end clear
+
+    # Get the cache's statistics as a dictionary.
+    def get_stats(self):
+        stats = dict()
+        stats['entries'] = len(self.entries)
+        stats['bytes'] = self.current_bytes
+        stats['hits'] = self.hits
+        stats['misses'] = self.misses
+        stats['evictions'] = self.evictions
+        lookup_count = self.hits + self.misses
+        stats['hit_rate'] = self.hits / lookup_count if lookup_count > 0 else 0
+        return stats
+    # end get_stats
+
+    # Write the cache's entries, least recently used first, to a
+    # pickle file, along with a fingerprint of the data they were
+    # cached from.
+    def save(self, file_path, fingerprint=None):
+        with open(file_path, 'wb') as cache_file:
+            pickle.dump({'fingerprint': fingerprint,
+                         'entries': list(self.entries.items())}, cache_file)
+    # end save
+
+    # Read entries from a pickle file written by save.
+    # Does nothing if the file doesn't exist, or if the fingerprint
+    # saved with it isn't the given one, since then the entries may
+    # be out of date.
+    # Returns the number of entries read.
+    def load(self, file_path, fingerprint=None):
+        if not os.path.exists(file_path):
+            return 0
+        with open(file_path, 'rb') as cache_file:
+            saved_cache = pickle.load(cache_file)
+        # Files saved without a fingerprint hold just the entries.
+        if not isinstance(saved_cache, dict):
+            saved_cache = {'fingerprint': None, 'entries': saved_cache}
+        if not saved_cache['fingerprint'] == fingerprint:
+            print("Discarding out of date cache " + str(file_path))
+            return 0
+        items = saved_cache['entries']
+        for key, value in items:
+            self.put(key, value)
+        # end for
+        return len(items)
+    # end load
+# end class LRUCache
+
+# Estimate how many bytes a cached value takes up, including
+# the contents of lists, tuples, and dictionaries.
+def estimate_size(value):
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+        # end for
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+        # end for
+    # end if
+    return size
+# end estimate_size
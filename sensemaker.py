@@ -19,6 +19,9 @@ from hypothesis_generator import HypothesisGenerator
 from hypothesis_evaluator import HypothesisEvaluator
 from visualizer import Visualizer
 from external_knowledge_querier import ExternalKnowledgeQuerier
+from database_manager import DatabaseManager
+from embedding_store import EmbeddingStore
+from concept_path_index import ConceptPathIndex
 from constants import Constants as const
 from output_writer import OutputWriter
 from input_handler import InputReader
@@ -56,6 +59,10 @@ class SenseMaker:
     names_used = list()
 
 
+    # The database manager shared by every object that reads
+    # from the concepts database during this run.
+    database_manager = None
+
     # An object that queries external knowledge.
     external_knowledge_querier = None
 
@@ -74,11 +81,34 @@ class SenseMaker:
 
         self.names_used = list()
 
+        # Initialize the database manager. With a pool size above 0,
+        # its connections stay open for the whole run and are reused
+        # instead of being opened and closed for every command.
+        pool_size = int(self.args.db_pool_size)
+        self.database_manager = DatabaseManager(use_pool=pool_size > 0,
+                                                pool_size=pool_size)
+        # Make sure the database's tables and indexes are in place.
+        self.database_manager.ensure_schema()
+
         # Initialize the object that will be querying external knowledge.
-        self.external_knowledge_querier = ExternalKnowledgeQuerier()
+        self.external_knowledge_querier = ExternalKnowledgeQuerier(self.database_manager,
+                                                                   self.args.offline,
+                                                                   self.args.conceptnet_api_url,
+                                                                   int(self.args.cache_entries),
+                                                                   int(self.args.cache_bytes),
+                                                                   self.args.cache_path)
+
+        # If there is an exported embedding matrix, memory-map it so
+        # nodes get their embeddings from it instead of the database.
+        embedding_store = None
+        if self.args.embedding_matrix:
+            embedding_store = EmbeddingStore(self.args.embedding_matrix)
+            embedding_store.load()
+        # end if
 
         # Initialize the object that will be used to create KnolwedgeGraphNodes
-        self.node_factory = NodeFactory()
+        self.node_factory = NodeFactory(self.external_knowledge_querier,
+                                        embedding_store)
 
         # Seed the RNG to get the same results.
         random.seed(5)
@@ -172,6 +202,16 @@ class SenseMaker:
         visualizer = Visualizer(self.args)
         visualizer.visualize(overall_kg, all_hypotheses, scored_sets)
 
+        # Report how well the query caches did, and save them for
+        # the next run if asked to. Saving reads the database's
+        # fingerprint, so it comes before the connections are closed.
+        print("Query caches: " + str(self.external_knowledge_querier.GetCacheStats()))
+        self.external_knowledge_querier.SaveCaches()
+        # Report how many database connections were opened vs. reused,
+        # then close the pooled connections.
+        print("Database connections: " + str(self.database_manager.get_connection_stats()))
+        self.database_manager.close_all_connections()
+
         return
         
     # end init
@@ -215,6 +255,13 @@ class SenseMaker:
 
         hypothesis_generator = HypothesisGenerator(self.args)
 
+        # Search out from every scene graph node's concept once, up
+        # front, so the causal hypotheses' concept paths are lookups.
+        # The concept edges don't change after this point.
+        concept_path_index = ConceptPathIndex()
+        concept_path_index.build(kg_in, const.causal_filter, self.args.causal_length)
+        hypothesis_generator.concept_path_index = concept_path_index
+
         # Generate Referential relationship hypotheses
         referential_hypotheses = hypothesis_generator.generate_referential_hypotheses(kg_in)
         hypotheses.extend(referential_hypotheses)
@@ -256,9 +303,9 @@ class SenseMaker:
         # Keep a dictionary of nodes for concepts from ConceptNet,
         # keyed by the concept's name.
         cn_concept_nodes = dict()
-        
-        # For each scene graph node, get its corresponding
-        # ConceptNet node and related predicates.
+
+        # Gather the scene graph nodes that get concepts.
+        scene_graph_nodes = list()
         for node_id, kg_node in kg_in.nodes.items():
             # Skip any node that is not a scene graph node.
             if not (kg_node.node_type == 'object'
@@ -268,21 +315,46 @@ class SenseMaker:
                       " is not an object, predicate, or action." +
                       " Skipping concept assignment.")
                 continue
+            scene_graph_nodes.append(kg_node)
+        # end for
 
+        # Fetch the predicates of every scene graph node's concept
+        # in a few bulk queries instead of once per node.
+        predicates_by_concept = self.external_knowledge_querier.GetPredicatesMany(
+            [kg_node.concept_name for kg_node in scene_graph_nodes])
+
+        # Likewise, fetch the embeddings of every concept a concept
+        # node will be made for: the scene graph nodes' concepts and
+        # every concept in their predicates.
+        concept_names = list()
+        for concept_name, predicates_result in predicates_by_concept.items():
+            if len(predicates_result['predicates']) <= 0:
+                continue
+            concept_names.append(concept_name)
+            for predicate in predicates_result['predicates']:
+                concept_names.append(predicate['source'])
+                concept_names.append(predicate['target'])
+            # end for
+        # end for
+        self.node_factory.prefetch_embeddings(concept_names)
+        
+        # For each scene graph node, get its corresponding
+        # ConceptNet node and related predicates.
+        for kg_node in scene_graph_nodes:
             #if 'woman' in kg_node.node_name:
             #    print("Checking woman")
-            
-            predicates = self.get_all_cn_predicates(kg_node)
+
+            clean_name = self.external_knowledge_querier.CleanWord(kg_node.concept_name)
+            predicates = self.get_all_cn_predicates(kg_node,
+                                                    predicates_by_concept[clean_name])
 
             print("Number of predicates: " + str(len(predicates)))
             # If no predicates are returned, skip the rest of
             # the procedure for this node.
             if len(predicates) <= 0:
                 continue
-            # Get the exact name of the concept as it would appear
-            # in the database.
-            clean_name = self.external_knowledge_querier.CleanWord(kg_node.concept_name)
-            # Set the conceptnet concept name to this cleaned name. 
+            # Set the conceptnet concept name to the exact name of
+            # the concept as it would appear in the database. 
             kg_node.cn_concept_name = clean_name
 
             # Get or make a node for this concept.
@@ -394,10 +466,14 @@ class SenseMaker:
 
     # Find all ConceptNet predicates that relate to the
     # given concept node.
-    def get_all_cn_predicates(self, kg_node):
+    # If the node's predicates were already fetched (e.g. by
+    # GetPredicatesMany), pass them in as predicates_result to
+    # skip querying for them again.
+    def get_all_cn_predicates(self, kg_node, predicates_result=None):
         print("Finding all ConceptNet predicates for " + kg_node.concept_name)
 
-        predicates_result = self.external_knowledge_querier.GetPredicates(kg_node.concept_name)
+        if predicates_result == None:
+            predicates_result = self.external_knowledge_querier.GetPredicates(kg_node.concept_name)
         #print("ConceptNet name: " + query_result['name'])
         #print("Predicates: ")
         #for predicate in query_result['predicates']:
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from database_manager import DatabaseManager
+from external_knowledge_querier import ExternalKnowledgeQuerier
+from conceptnet_fetcher import TokenBucket, ConceptNetFetcher
+
+# A stand-in for the ConceptNet API.
+# Answers every query with one English 'IsA' edge from the queried
+# node to /c/en/animal and one edge to a French node, which should be
+# left out. The first request for each node in throttled_nodes is
+# answered with a 429 asking to retry right away.
+class StubConceptNetHandler(BaseHTTPRequestHandler):
+    # The nodes whose first request gets throttled.
+    throttled_nodes = set()
+    # Every request's node and relationship, in the order they came.
+    requests_seen = list()
+    requests_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        return
+    # end log_message
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        node = query['node'][0]
+        relationship = query['rel'][0]
+        with self.requests_lock:
+            self.requests_seen.append((node, relationship))
+            throttle = node in self.throttled_nodes
+            self.throttled_nodes.discard(node)
+        # end with
+        if throttle:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        # end if
+        edges = list()
+        if relationship == '/r/IsA':
+            edges.append({'start': {'@id': node},
+                          'end': {'@id': '/c/en/animal'},
+                          'rel': {'@id': relationship},
+                          'weight': 1.5})
+            edges.append({'start': {'@id': node},
+                          'end': {'@id': '/c/fr/animal'},
+                          'rel': {'@id': relationship},
+                          'weight': 1.0})
+        # end if
+        body = json.dumps({'edges': edges}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    # end do_GET
+# end class StubConceptNetHandler
+
+class TestConceptNetFetcher(unittest.TestCase):
+
+    def setUp(self):
+        StubConceptNetHandler.throttled_nodes = set()
+        StubConceptNetHandler.requests_seen = list()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubConceptNetHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+        self.temp_directory = tempfile.mkdtemp()
+        self.database_manager = DatabaseManager(os.path.join(self.temp_directory, 'concepts.db'),
+                                                use_pool=True)
+        self.database_manager.ensure_schema()
+        api_url = 'http://127.0.0.1:' + str(self.server.server_port) + '/query?'
+        self.querier = ExternalKnowledgeQuerier(self.database_manager, api_url=api_url)
+        # Only query two relationships per concept.
+        self.querier.valid_relationships = ['IsA', 'RelatedTo']
+    # end setUp
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.database_manager.close_all_connections()
+        shutil.rmtree(self.temp_directory)
+    # end tearDown
+
+    # Fetching stores the English edges and marks the concept queried.
+    def test_fetch_stores_edges(self):
+        fetcher = ConceptNetFetcher(self.querier)
+        failed_words = fetcher.fetch_concepts(['dog'])
+        self.assertEqual(failed_words, list())
+        self.assertEqual(len(StubConceptNetHandler.requests_seen), 2)
+        predicates = self.database_manager.select_predicates_by_source(['dog'])
+        self.assertEqual([(row[1], row[2], row[3]) for row in predicates],
+                         [('dog', 'IsA', 'animal')])
+        concept_rows = dict([(row[0], row[1]) for row
+                             in self.database_manager.select_concepts(['dog', 'animal'])])
+        self.assertEqual(concept_rows, {'dog': 1, 'animal': 0})
+    # end test_fetch_stores_edges
+
+    # One fetcher can fetch more than once, each in its own event loop.
+    # With a burst of one token, requests queue on the bucket's lock.
+    def test_fetch_twice(self):
+        fetcher = ConceptNetFetcher(self.querier)
+        fetcher.token_bucket = TokenBucket(600, capacity=1)
+        self.assertEqual(fetcher.fetch_concepts(['dog', 'horse']), list())
+        self.assertEqual(fetcher.fetch_concepts(['cat', 'cow']), list())
+        self.assertEqual(len(StubConceptNetHandler.requests_seen), 8)
+    # end test_fetch_twice
+
+    # A throttled request is retried after the Retry-After wait rather
+    # than the fetcher's own, much longer, backoff.
+    def test_retry_after_is_used(self):
+        StubConceptNetHandler.throttled_nodes = set(['/c/en/dog'])
+        fetcher = ConceptNetFetcher(self.querier, base_backoff=60.0)
+        start_time = time.perf_counter()
+        self.assertEqual(fetcher.fetch_concepts(['dog']), list())
+        self.assertLess(time.perf_counter() - start_time, 10.0)
+        self.assertEqual(len(StubConceptNetHandler.requests_seen), 3)
+    # end test_retry_after_is_used
+
+    # Both forms of the Retry-After header are understood.
+    def test_parse_retry_after(self):
+        fetcher = ConceptNetFetcher(self.querier)
+        self.assertEqual(fetcher.parse_retry_after('7'), 7.0)
+        self.assertEqual(fetcher.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertEqual(fetcher.parse_retry_after(None), None)
+        self.assertEqual(fetcher.parse_retry_after('soon'), None)
+    # end test_parse_retry_after
+# end class TestConceptNetFetcher
+
+if __name__ == '__main__':
+    unittest.main()